@@ -9,6 +9,7 @@ from pathlib import Path
 
 from .core.daet import DAET
 from .core.expNote import ExpNote, Task, iter_notes, iter_xlsx, get_xlsx_dates
+from .core.noteCatalog import NoteCatalog, NoteHandle
 from .core.camConfig import CamGroup, CamConfig, Camera
 
 from .core.sync import syncVideos, VidSynchronizer, SyncConfig, SyncResult
@@ -15,6 +15,9 @@ from pathlib import Path
 from .expNote import ExpNote
 from .daet import DAET
 from .config import Config
+from .pipelineState import Stage, StageStatus, recordStage, hashInputs
+from .fileOp import materialize
+from .aniEngine import triangulateDaets, threadEnv
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -22,14 +25,7 @@ logger.setLevel(logging.DEBUG)
 dlc_postfix_pattern = re.compile(r'DLC_resnet\d+_[^_]+shuffle\d+_\d+(?:_filtered)?\.h5$')
 libs = Config.anipose_libs
 
-CLI_ENV = {**os.environ,
-        "XLA_PYTHON_CLIENT_PREALLOCATE": "false",
-        "XLA_PYTHON_CLIENT_ALLOCATOR": "platform",
-        "ANIPOSE_DISABLE_JAX_X64": "1",
-        "OMP_NUM_THREADS": "4",
-        "MKL_NUM_THREADS": "4",
-        "OPENBLAS_NUM_THREADS": "4",
-        "NUMBA_NUM_THREADS": "4"}
+CLI_ENV = {**os.environ, **threadEnv(4)}
 
 def getH5Rename(file_name:Path | str, stem_only:bool=False) -> str:
     '''get rid of dlc postfix'''
@@ -256,7 +252,7 @@ class AniposeProcessor:     #TODO will need to test behavior on duplicative runs
         for vid in daet_sync_root.glob('*.mp4'):
             logger.info(f'Copying {vid.name}')
             try:
-                shutil.copy(vid, daet_calib_root)
+                materialize(vid, daet_calib_root / vid.name, overwrite=True)
             except OSError as e:
                 logger.error(f'ssc copy failed {e}')
     
@@ -386,7 +382,7 @@ class AniposeProcessor:     #TODO will need to test behavior on duplicative runs
         for sf in subfolders:
             (daet_ani_root / sf).mkdir(exist_ok=True)
 
-        # copy h5
+        # copy h5 (linked where the share allows, see fileOp.materialize)
         for h5 in daet_dlc_root.glob('*.h5'):
             if 'filtered' in h5.name:
                 if not use_filtered:
@@ -400,7 +396,7 @@ class AniposeProcessor:     #TODO will need to test behavior on duplicative runs
             if not dst.exists():
                 logger.info(f'Copying h5: {h5.name}')
                 try:
-                    shutil.copy(h5, dst)
+                    materialize(h5, dst)
                 except OSError as e:
                     logger.error(f'setupSingleDaet: failed copying {h5} -> {daet_pose_2d_filtered}, err: {e}')
             else:
@@ -440,15 +436,20 @@ class AniposeProcessor:     #TODO will need to test behavior on duplicative runs
             result = subprocess.run(cmd, shell=True, check=True)
         if result.stderr:
             logger.error(result.stderr)
+        self.recordTriangulated()
     
-    def triangulate(self) -> bool:
-        '''directly calls anipose'''
+    def triangulate(self, parallel: bool = False, total_threads: int | None = None) -> bool:
+        '''directly calls anipose. parallel: one process per daet folder (aniEngine),
+        within total_threads (default Config.anipose_threads, 0 = all cores)'''
         try:
             from anipose import anipose, triangulate
         except ImportError as e:
             logger.error('Cannot find anipose installed, or dependency not intact')
             return False
         
+        if parallel:
+            return self.triangulateParallel(total_threads)
+
         logger.info('Triangulating all tasks')
         try:
             cfg = anipose.load_config(str(self.ani_root_path / 'config.toml'))
@@ -458,7 +459,37 @@ class AniposeProcessor:     #TODO will need to test behavior on duplicative runs
             logger.error(f'Failed triangulation: {e}')
             return False
         else:
+            self.recordTriangulated()
             return True
+
+    def triangulateParallel(self, total_threads: int | None = None) -> bool:
+        '''triangulate the set up daet folders in parallel processes, sharing the calibration'''
+        daet_dirs = [self.ani_root_path / str(d) for d in self.note.daets
+                     if not d.isCalib and (self.ani_root_path / str(d)).exists()]
+        logger.info(f'Triangulating {len(daet_dirs)} daets in parallel')
+        try:
+            results = triangulateDaets(self.ani_root_path / 'config.toml', daet_dirs, self.calib_file,
+                                       total_threads if total_threads is not None else Config.anipose_threads)
+        except Exception as e:
+            logger.error(f'Failed triangulation: {e}')
+            return False
+        self.recordTriangulated()
+        return all(results.values())
+
+    def recordTriangulated(self) -> None:
+        '''write the per-daet triangulation result of this model set to the pipeline state'''
+        for daet in self.note.daets:
+            daet_ani_root = self.ani_root_path / str(daet)
+            if daet.isCalib or not daet_ani_root.exists():
+                continue
+            inputs = list((daet_ani_root / 'pose-2d-filtered').glob('*.h5'))
+            csvs = list((daet_ani_root / 'pose-3d').glob('*.csv'))
+            if csvs:
+                recordStage(daet, Stage.ANIPOSE, StageStatus.DONE, model_set=self.model_set_name,
+                            input_hash=hashInputs(inputs), outputs=csvs)
+            else:
+                recordStage(daet, Stage.ANIPOSE, StageStatus.FAILED, model_set=self.model_set_name,
+                            input_hash=hashInputs(inputs), message='no pose-3d csv after triangulation')
         
     def makeVideos(self, start:float|None=None, end:float|None=None) -> None:
         '''label-3d + label-combined\n
@@ -499,7 +530,7 @@ class AniposeProcessor:     #TODO will need to test behavior on duplicative runs
             raise RuntimeError(f'label-combined failed: {result.stderr}')
 
     def copy_vid_to_daet(self, daet:DAET) -> None:
-        '''copy raw videos to anipose folder for this daet'''
+        '''copy raw videos to anipose folder for this daet (linked where possible)'''
         daet_sync_root = self.note.getDaetSyncRoot(daet)
         daet_ani_videos_raw = self.ani_root_path / str(daet) / 'videos-raw'
         daet_ani_videos_raw.mkdir(exist_ok=True, parents=True)
@@ -507,7 +538,7 @@ class AniposeProcessor:     #TODO will need to test behavior on duplicative runs
             logger.info(f'Copying {vid.name}')
             if not (daet_ani_videos_raw / vid.name).exists():
                 try:
-                    shutil.copy(vid, daet_ani_videos_raw)
+                    materialize(vid, daet_ani_videos_raw / vid.name)
                 except OSError as e:
                     logger.error(f'ssc copy failed {e}')
     
@@ -0,0 +1,203 @@
+'''
+in-process anipose triangulation, one DAET folder per worker process
+
+the CLI route (AniposeProcessor.triangulateCLI) activates a conda env through a
+windows shell and runs `anipose triangulate` over the whole model set serially.
+here each DAET folder under the model set root is triangulated on its own in a
+process pool (spawned, so the same on linux and windows), with anipose imported
+in the current env.
+
+- the calibration is loaded once and handed to each worker; anipose's
+  CameraGroup.load then returns it for any calibration.toml with the same content
+- a total thread budget (Config.anipose_threads, 'anipose-threads' in
+  amm-config.yaml, 0 = all cores) is split into processes x blas/numba threads
+- daemonic processes (eg. dask nanny workers) can't start a pool, there the
+  daets run one after another in the current process, on the whole thread
+  budget. the shared calibration is undone afterwards, the process lives on
+
+Usage eg
+    triangulateDaets(ani_root / 'config.toml', [ani_root / str(d) for d in daets],
+                     calib_file, total_threads=32)      # {daet_dir: success}
+'''
+
+import os
+import sys
+import hashlib
+import logging
+import multiprocessing as mp
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+ANI_THREADS_PER_DAET = 2    # blas/numba threads of one worker when there are more daets than cores
+
+_THREAD_VARS = ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS',
+                'NUMBA_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS')
+_JAX_ENV = {
+    'XLA_PYTHON_CLIENT_PREALLOCATE': 'false',
+    'XLA_PYTHON_CLIENT_ALLOCATOR': 'platform',
+    'ANIPOSE_DISABLE_JAX_X64': '1',
+}
+
+_calib: tuple[str, Any] | None = None   # (content hash, CameraGroup) shared in a worker
+
+
+def threadEnv(threads: int) -> dict[str, str]:
+    '''env for an anipose process limited to this many blas/numba threads'''
+    return {**_JAX_ENV, **{k: str(threads) for k in _THREAD_VARS}}
+
+
+def threadPlan(n_daets: int, total_threads: int | None = None,
+               per_daet: int = ANI_THREADS_PER_DAET) -> tuple[int, int]:
+    '''(processes, threads per process) that fit in total_threads (None/0 -> all cores)'''
+    total = total_threads or os.cpu_count() or 1
+    per = max(1, min(per_daet, total))
+    workers = max(1, min(n_daets, total // per))
+    return workers, max(per, total // workers)
+
+
+def aniposeAvailable() -> bool:
+    try:
+        import anipose, aniposelib     # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _fileSha(path: str | Path) -> str:
+    return hashlib.sha1(Path(path).read_bytes()).hexdigest()
+
+
+@contextmanager
+def _environ(env: dict[str, str]) -> Iterator[None]:
+    '''set env for processes spawned inside the block'''
+    old = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for k, v in old.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def _initWorker(calib_sha: str | None, cgroup: Any) -> None:
+    global _calib
+    from aniposelib.cameras import CameraGroup
+    _calib = (calib_sha, cgroup) if calib_sha else None
+    load = CameraGroup.load
+    if getattr(load, 'shared', False):
+        return
+
+    def sharedLoad(path):
+        if _calib and _fileSha(path) == _calib[0]:
+            return _calib[1]
+        return load(path)
+    sharedLoad.shared = True
+    CameraGroup.load = staticmethod(sharedLoad)
+
+
+@contextmanager
+def _sharedCalib(calib_sha: str | None, cgroup: Any) -> Iterator[None]:
+    '''_initWorker for the current process, undone on exit'''
+    global _calib
+    from aniposelib.cameras import CameraGroup
+    old_calib, old_load = _calib, vars(CameraGroup)['load']
+    _initWorker(calib_sha, cgroup)
+    try:
+        yield
+    finally:
+        _calib = old_calib
+        CameraGroup.load = old_load
+
+
+@contextmanager
+def _threadLimit(threads: int) -> Iterator[None]:
+    '''threadEnv in the current process: env for libraries loaded later,
+    threadpoolctl / numba (if there) for the ones already loaded'''
+    with ExitStack() as stack:
+        stack.enter_context(_environ(threadEnv(threads)))
+        try:
+            from threadpoolctl import threadpool_limits
+            stack.enter_context(threadpool_limits(threads))
+        except ImportError:
+            pass
+        numba = sys.modules.get('numba')
+        if numba is not None:
+            stack.callback(numba.set_num_threads, numba.get_num_threads())
+            numba.set_num_threads(min(threads, numba.config.NUMBA_NUM_THREADS))
+        yield
+
+
+@lru_cache(maxsize=4)
+def _loadConfig(config_path: str) -> dict:
+    from anipose import anipose
+    return anipose.load_config(config_path)
+
+
+def _triangulateDaet(config_path: str, daet_dir: str) -> tuple[str, bool, str]:
+    '''(daet_dir, success, error) in a worker'''
+    try:
+        from anipose import triangulate
+        triangulate.process_session(_loadConfig(config_path), daet_dir)
+    except Exception as e:
+        return daet_dir, False, f'{type(e).__name__}: {e}'
+    if not any((Path(daet_dir) / 'pose-3d').glob('*.csv')):
+        return daet_dir, False, 'no pose-3d csv after triangulation'
+    return daet_dir, True, ''
+
+
+def triangulateDaets(config_file: str | Path, daet_dirs: list[Path], calib_file: str | Path | None = None,
+                     total_threads: int | None = None) -> dict[Path, bool]:
+    '''
+    triangulate each daet folder (the anipose session dirs under the config's root)
+    in its own process. calib_file: the model set's calibration, loaded once and shared.
+    '''
+    if not daet_dirs:
+        return {}
+    if not aniposeAvailable():
+        raise ImportError('anipose / aniposelib not importable in this environment')
+
+    calib_sha, cgroup = None, None
+    if calib_file and Path(calib_file).exists():
+        from aniposelib.cameras import CameraGroup
+        calib_sha, cgroup = _fileSha(calib_file), CameraGroup.load(str(calib_file))
+
+    results: dict[Path, bool] = {}
+    if mp.current_process().daemon:
+        _, threads = threadPlan(1, total_threads)
+        logger.info(f'aniEngine: {len(daet_dirs)} daets serially on {threads} threads, '
+                    f'daemonic process can\'t have children')
+        with _threadLimit(threads), _sharedCalib(calib_sha, cgroup):
+            for d in daet_dirs:
+                _, ok, err = _triangulateDaet(str(config_file), str(d))
+                results[Path(d)] = _report(Path(d), ok, err)
+        return results
+
+    workers, threads = threadPlan(len(daet_dirs), total_threads)
+    logger.info(f'aniEngine: {len(daet_dirs)} daets on {workers} processes x {threads} threads')
+
+    with _environ(threadEnv(threads)), ProcessPoolExecutor(
+            max_workers=workers, mp_context=mp.get_context('spawn'),
+            initializer=_initWorker, initargs=(calib_sha, cgroup)) as pool:
+        futures = {pool.submit(_triangulateDaet, str(config_file), str(d)): Path(d) for d in daet_dirs}
+        for fut in as_completed(futures):
+            daet_dir = futures[fut]
+            try:
+                _, ok, err = fut.result()
+            except Exception as e:     # worker died, eg. BrokenProcessPool
+                ok, err = False, f'{type(e).__name__}: {e}'
+            results[daet_dir] = _report(daet_dir, ok, err)
+    return results
+
+
+def _report(daet_dir: Path, ok: bool, err: str) -> bool:
+    if not ok:
+        logger.error(f'aniEngine: failed {daet_dir.name}: {err}')
+    return ok
@@ -35,6 +35,8 @@ cfg_name_map = {
     'anipose-cfg-dir': 'anipose_cfg_dir',
     'anipose-cfgs': 'anipose_cfgs',
     'anipose-libs': 'anipose_libs',
+    'state-db': 'state_db',
+    'anipose-threads': 'anipose_threads',
 }
 cfg_name_map_rev = {v: k for k, v in cfg_name_map.items()}
 
@@ -128,6 +130,8 @@ class _Config:
     anipose_cfg_dir: Path
     anipose_cfgs: dict[str, str]
     anipose_libs: AniposeLibs
+    state_db: str = ''      # pipeline state sqlite file, empty -> ~/.ammonkey/pipeline_state.db
+    anipose_threads: int = 0    # total threads of in-process triangulation, 0 -> all cores
 
     def __post_init__(self):
         if self.anipose_cfg_dir.name == '**':
@@ -285,7 +289,9 @@ with open(cfg_path, 'r') as cfg:
                 anipose_env=cfg_data.get('anipose-conda-env', ''),
                 anipose_cfg_dir=Path(cfg_data.get('anipose-cfg-dir', '**')),
                 anipose_cfgs=cfg_data.get('anipose-cfgs', {}),
-                anipose_libs=AniposeLibs.from_dicts(cfg_data.get('anipose-libs', {}))
+                anipose_libs=AniposeLibs.from_dicts(cfg_data.get('anipose-libs', {})),
+                state_db=str(cfg_data.get('state-db') or ''),
+                anipose_threads=int(cfg_data.get('anipose-threads') or 0),
             )
         except Exception as e:
             lg.error(f'Unexpected error occurred when creating Config obj: {e}')
@@ -6,8 +6,13 @@ from __future__ import annotations
 from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum, auto
+from typing import Iterable
+import re
 import hashlib
+import threading
+import weakref
 
+import numpy as np
 import pandas as pd
 
 class Task(Enum):
@@ -33,13 +38,8 @@ class Task(Enum):
         if isinstance(daet_name, DAET):
             daet_name = daet_name.experiment
 
-        exp_str_lower = daet_name.lower()
-        for task, patterns in task_match.items():
-            if task == Task.ALL:
-                continue
-            if any(p for p in patterns if p in exp_str_lower):
-                return task
-        return None
+        m = _task_re.match(daet_name)
+        return Task[m.lastgroup] if m and m.lastgroup else None
 
 task_match = {  # all should be lowercase
     Task.BBT: ['bbt'],
@@ -50,9 +50,75 @@ task_match = {  # all should be lowercase
     Task.ALL: ['']
 }
 
+def _compileTaskRegex(patterns: dict[Task, list[str]]) -> re.Pattern[str]:
+    '''all of task_match as one regex, one empty named group per task.
+    each alternative looks ahead over the whole string, so the first task
+    in task_match order wins (not the leftmost hit), same as the old loop'''
+    alts = [
+        f"(?=.*?(?:{'|'.join(re.escape(p) for p in pats)}))(?P<{task.name}>)"
+        for task, pats in patterns.items()
+        if task != Task.ALL and pats
+    ]
+    return re.compile(r'\A(?:' + '|'.join(alts) + ')', re.IGNORECASE | re.DOTALL)
+
+_task_re = _compileTaskRegex(task_match)
+
+# dtype of task_type columns. categories follow the regex group order
+TASK_TYPE_DTYPE = pd.CategoricalDtype([Task[name] for name in _task_re.groupindex])
+
+def classify_tasks(experiments: Iterable[str] | pd.Series) -> pd.Series:
+    '''vectorized Task.match. categorical Series of Task, NaN where nothing matches.
+    each distinct experiment name is matched once'''
+    s = experiments if isinstance(experiments, pd.Series) else pd.Series(list(experiments), dtype=object)
+    codes, uniques = pd.factorize(s.astype(str))
+    hits = pd.Series(uniques, dtype=object).str.extract(_task_re).notna().to_numpy()
+    uniq_codes = np.where(hits.any(axis=1), hits.argmax(axis=1), -1)
+    return pd.Series(pd.Categorical.from_codes(uniq_codes[codes], dtype=TASK_TYPE_DTYPE),
+                     index=s.index, name='task_type')
+
+def daet_table(daets: Iterable[str] | pd.Series) -> pd.DataFrame:
+    '''
+    bulk DAET.fromString for year-wide tables, without building DAET objects.
+    columns: daet, date, animal, experiment, task, task_type (categorical of Task).
+    raises ValueError listing (up to 5) strings that are not DAETs
+    '''
+    s = pd.Series(list(daets), dtype=object).astype(str)
+    # same split as fromString: first two and last '-'
+    df = s.str.extract(r'^(?P<date>[^-]*)-(?P<animal>[^-]*)-(?P<experiment>.*)-(?P<task>[^-]*)$')
+    bad = df['date'].isna()
+    if bad.any():
+        raise ValueError(f'Invalid DAET format: {s[bad].head(5).tolist()}')
+    df.insert(0, 'daet', s)
+    df['task_type'] = classify_tasks(df['experiment'])
+    return df
+
+def daet_frame(daets: Iterable[DAET]) -> pd.DataFrame:
+    '''
+    daet_table for DAET objects, read off their fields instead of re-splitting str(daet).
+    same columns, task_type from the DAETs' own classification
+    '''
+    daets = list(daets)
+    df = pd.DataFrame({
+        'daet': [str(d) for d in daets],
+        'date': [d.date for d in daets],
+        'animal': [d.animal for d in daets],
+        'experiment': [d.experiment for d in daets],
+        'task': [d.task for d in daets],
+    }, dtype=object)
+    df['task_type'] = pd.Categorical([d.task_type for d in daets], dtype=TASK_TYPE_DTYPE)
+    return df
+
+# equal DAETs from fromString/fromRow share one object, dropped once nothing refers to it
+_interned: weakref.WeakValueDictionary[tuple[str, str, str, str], DAET] = weakref.WeakValueDictionary()
+_intern_lock = threading.Lock()
+
 @dataclass(frozen=True)  # hashable
 class DAET:
     """Date-Animal-Experiment-Task identifier"""
+    # slots: no per-instance dict. the _ slots are derived once in __post_init__
+    __slots__ = ('date', 'animal', 'experiment', 'task',
+                 '_hash', '_str', '_task_type', '_is_calib', '__weakref__')
+
     date: str  # YYYYMMDD format
     animal: str
     experiment: str
@@ -64,17 +130,27 @@ class DAET:
             datetime.strptime(self.date, '%Y%m%d')
         except ValueError:
             raise ValueError(f"Invalid date format: {self.date}. Expected YYYYMMDD")
+        setattr_ = object.__setattr__     # frozen
+        # md5 rather than hash(): stable across processes (no PYTHONHASHSEED salt)
+        key = f"{self.date!r}-{self.animal!r}-{self.experiment!r}-{self.task!r}"
+        setattr_(self, '_hash', int(hashlib.md5(key.encode()).hexdigest(), 16))
+        setattr_(self, '_str', f"{self.date}-{self.animal}-{self.experiment}-{self.task}")
+        setattr_(self, '_task_type', Task.match(self.experiment))
+        setattr_(self, '_is_calib', 'calib' in self.experiment.lower())
     
     def __str__(self) -> str:
-        return f"{self.date}-{self.animal}-{self.experiment}-{self.task}"
+        return self._str
     
     def __repr__(self) -> str:
         return f"DAET('{self}')"
     
     def __eq__(self, other):
+        if self is other:
+            return True
         if not isinstance(other, DAET):
             return NotImplemented
         return (
+            self._hash == other._hash and
             self.date == other.date and
             self.animal == other.animal and
             self.experiment == other.experiment and
@@ -82,8 +158,24 @@ class DAET:
         )
 
     def __hash__(self):
-        key = f"{self.date!r}-{self.animal!r}-{self.experiment!r}-{self.task!r}"
-        return int(hashlib.md5(key.encode()).hexdigest(), 16)
+        return self._hash
+
+    def __reduce__(self):
+        # rebuild through intern on unpickle, so copies from other processes share the local object
+        return (DAET.intern, (self.date, self.animal, self.experiment, self.task))
+
+    @classmethod
+    def intern(cls, date: str, animal: str, experiment: str, task: str) -> 'DAET':
+        """the shared DAET for these fields, created on first request"""
+        key = (date, animal, experiment, task)
+        daet = _interned.get(key)
+        if daet is None:
+            with _intern_lock:
+                daet = _interned.get(key)
+                if daet is None:
+                    daet = cls(*key)
+                    _interned[key] = daet
+        return daet
     
     @property
     def d(self) -> str:
@@ -115,7 +207,7 @@ class DAET:
             raise ValueError(f"Invalid DAET format: {daet_str}")
         else: #4
             parts = p
-        return cls(*parts)
+        return cls.intern(*parts)
     
     @classmethod 
     def fromRow(cls, row: pd.Series, date: str, animal: str) -> 'DAET':
@@ -127,7 +219,7 @@ class DAET:
             s = str(task)
         if animal.lower() == 'pici':
             s = str(task)       # this is historical problem.
-        return cls(date, animal, str(row['Experiment']).strip(), s.strip())
+        return cls.intern(date, animal, str(row['Experiment']).strip(), s.strip())
     
     @classmethod
     def isDaet(cls, s: str) -> bool:
@@ -145,15 +237,8 @@ class DAET:
     
     @property
     def isCalib(self) -> bool:
-        return 'calib' in self.experiment.lower()
+        return self._is_calib
     
     @property
     def task_type(self) -> Task | None:
-        for task, pattern in task_match.items():
-            if task == Task.ALL:
-                continue
-            else:
-                if any(p for p in pattern if p in self.experiment.lower()):
-                    return task
-                
-        return None
\ No newline at end of file
+        return self._task_type
\ No newline at end of file
@@ -5,20 +5,23 @@ DLC module
 import logging
 import re, json
 from socket import gethostname
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field, replace
 from pathlib import Path
-import shutil
 from datetime import datetime
 from hashlib import md5
 from collections.abc import Callable
 from functools import partial
+from typing import NamedTuple
 
 from .expNote import ExpNote, Task
 from .camConfig import CamGroup
 from .daet import DAET
 from .dlcCollector import mergeDlcOutput, getDLCMergedFolderName
+from .dlcManifest import SkipManifest
+from .fileOp import materialize
 from ..utils.log import Wood
 from .config import Config
+from .pipelineState import Stage, StageStatus, recordStage, isStageDone, hashInputs, hashValue
 
 logger = logging.getLogger(__name__)
 ready: bool = False
@@ -46,6 +49,7 @@ class DLCModel:
     trainset: int = 95
     shuffle: int = 1
     short: str | None = None
+    run_date: str | None = field(default=None, compare=False)  # yyyymmdd of the output folder, None = today
 
     @property
     def md5(self) -> int:
@@ -66,17 +70,15 @@ class DLCModel:
         '''how it appears in the output filenames of dlc'''
         return f"{self.name}shuffle{self.shuffle}"
     
-    @property
-    def first_run_date(self) -> str:
-        '''updated once for one model instance to keep track of date, to avoid cross day splitting'''
-        return ''
+    def pinned(self, run_date: str) -> 'DLCModel':
+        '''same model with the output folder date fixed, so a run crossing midnight isn't cut in two'''
+        return replace(self, run_date=run_date)
 
-    #FIXME here date should be assigned/overridden beforehand to avoid cutting one set into two
     @property
     def final_folder_name(self) -> str:
         if not self.short:
             logger.warning(f'Model {self.name} has no short name, output folder name might be wrong')
-        return f"{self.easy_name}-{datetime.now().strftime('%Y%m%d')} [{self.md5_short}]"
+        return f"{self.easy_name}-{self.run_date or datetime.now().strftime('%Y%m%d')} [{self.md5_short}]"
     
     @property
     def base_path(self) -> Path:
@@ -92,6 +94,16 @@ class DLCModel:
     def is_available(self) -> bool:
         return self.cfg_path.exists() and self.iter_path.exists() and self.model_path.exists()
 
+    @property
+    def snapshot(self) -> int | None:
+        '''latest trained snapshot iteration, the one DLC uses with snapshotindex -1'''
+        iters = [
+            int(m.group(1))
+            for f in self.model_path.glob('snapshot-*.index')
+            if (m := re.search(r'snapshot-(\d+)\.index', f.name))
+        ]
+        return max(iters) if iters else None
+
     def __repr__(self):
         return f"DLCModel pointer ({self.id_str})"
     
@@ -107,7 +119,8 @@ class DLCModel:
             iteration=d.get('iteration', 0),
             trainset=d.get('trainset', 95),
             shuffle=d.get('shuffle', 1),
-            short=d.get('short')
+            short=d.get('short'),
+            run_date=d.get('run_date'),
         )
     
     def toDict(self):
@@ -117,7 +130,8 @@ class DLCModel:
             'iteration': self.iteration,
             'trainset': self.trainset,
             'shuffle': self.shuffle,
-            'short': self.short
+            'short': self.short,
+            'run_date': self.run_date,
         }
     
     def information(self) -> list[str]:
@@ -129,12 +143,7 @@ class DLCModel:
         info.append(f"model folder: {str(self.model_path)}\n\tExist {self.model_path.exists()}")
         
         if self.model_path.exists():
-            iters = [ # :)
-                int(m.group(1)) 
-                for f in self.model_path.glob('snapshot-*.index')
-                if (m := re.search(r'snapshot-(\d+)\.index', f.name))
-            ]       
-            info.append(f'max training iteration: {max(iters)}')
+            info.append(f'max training iteration: {self.snapshot}')
         if self.iter_path.exists():
             sib = [sub.name.split('trainset')[-1] for sub in self.iter_path.glob(f'*trainset*')]
             info.append('Siblings: \n\t' + ', \n\t'.join(sib))
@@ -143,28 +152,29 @@ class DLCModel:
 
     def runOnce(self, vid_path: Path | str, override_exist:bool=True) -> bool:
         """run DLC analysis on single video directory"""
+        return self.runMany([vid_path], override_exist, raise_errors=True).get(Path(vid_path), False)
+
+    def runMany(self, vid_paths: list[Path | str], override_exist: bool = True,
+                raise_errors: bool = False) -> dict[Path, bool]:
+        """run DLC analysis on several video directories with a single analyze_videos
+        call, so the model is loaded once for all of them. returns success per directory"""
+        vid_paths = [Path(p) for p in vid_paths]
         if not ready or deeplabcut is None:
             logger.error('deeplabcut is called before successful import')
-            return False
+            return {p: False for p in vid_paths}
         if not self.is_available:
             logger.error('model not valid')
-            return False
-
-        vid_path = Path(vid_path)
-        if not vid_path.exists():
-            logger.error(f'DLCModel.runOnce: Folder not found {vid_path}')
-            return False
+            return {p: False for p in vid_paths}
 
-        skip_file = vid_path / '.skipDLC'
-        if skip_file.exists() and not override_exist:
-            logger.info(f'Skipped processed folder as marked {vid_path.stem}')
-            return True
+        results, todo = self.planRuns(vid_paths, override_exist)
+        if not todo:
+            return results
 
         try:
             # analyze videos
             deeplabcut.analyze_videos(
                 str(self.cfg_path),
-                [str(vid_path)], 
+                [str(v) for run in todo for v in run.videos], 
                 videotype='mp4',           
                 trainingsetindex=0,
                 shuffle=self.shuffle,
@@ -172,39 +182,128 @@ class DLCModel:
                 auto_track=False,
                 engine=deeplabcut.Engine.TF,
             )
-            
-            # filter predictions
-            deeplabcut.filterpredictions(
-                str(self.cfg_path), 
-                str(vid_path), 
-                shuffle=self.shuffle,
-                save_as_csv=True,
-                videotype='mp4',
-                filtertype="median",
-            )
-            
-            # mark as processed
-            skip_file.touch()
-            logger.info(f'DLC analysis completed for {vid_path.stem}')
+        except Exception as e:
+            for run in todo:
+                results[run.vid_path] = self.failRun(run, e)
+            if raise_errors:
+                raise e
+            return results
 
-            self.pee(vid_path)
+        for run in todo:
+            try:
+                self.filterPredictions(run.videos)
+                results[run.vid_path] = self.finishRun(run)
+            except Exception as e:
+                results[run.vid_path] = self.failRun(run, e)
+                if raise_errors:
+                    raise e
 
-            return True
-            
-        except Exception as e:
-            logger.error(f'DLC analysis failed for {vid_path}: {e}')
-            raise e
-            return False
+        return results
+
+    def planRuns(self, vid_paths: list[Path], override_exist: bool = True
+                 ) -> tuple[dict[Path, bool], list['DLCRun']]:
+        """split directories into already settled ones (missing or skipped, with their result)
+        and runs to do, which are recorded as running. a run only holds the videos the skip
+        manifest doesn't have as analyzed by this model (all of them with override_exist);
+        outputs left from an earlier version of a changed video are removed first"""
+        results: dict[Path, bool] = {}
+        todo: list[DLCRun] = []
+        for vid_path in vid_paths:
+            if not vid_path.exists():
+                logger.error(f'DLCModel.runOnce: Folder not found {vid_path}')
+                results[vid_path] = False
+                continue
+
+            daet = vid_path.parent.name if DAET.isDaet(vid_path.parent.name) else None
+            run_key = self.stateKey(vid_path.name)
+            input_hash = hashValue([self.md5, hashInputs(vid_path.glob('*.mp4'))])
+            if daet and not override_exist and isStageDone(daet, Stage.DLC_RUN, run_key, input_hash,
+                                                           root=vid_path.parent):
+                logger.info(f'Skipped processed folder as recorded {vid_path.stem}')
+                results[vid_path] = True
+                continue
+
+            manifest = SkipManifest.load(vid_path)
+            if override_exist:
+                videos = sorted(vid_path.glob('*.mp4'))
+            else:
+                videos = self.pendingVideos(vid_path, manifest)
+                if not videos:
+                    logger.info(f'Skipped processed folder as marked {vid_path.stem}')
+                    results[vid_path] = True
+                    continue
+            for video in videos:
+                for stale in manifest.staleOutputs(self, video):
+                    logger.warning(f'Removing DLC output of changed video: {stale.name}')
+                    stale.unlink(missing_ok=True)
+
+            if daet:
+                recordStage(daet, Stage.DLC_RUN, StageStatus.RUNNING, model_set=run_key, input_hash=input_hash)
+            todo.append(DLCRun(vid_path, daet, run_key, input_hash, tuple(videos)))
+        return results, todo
+
+    def filterPredictions(self, videos: list[Path] | tuple[Path, ...]) -> None:
+        deeplabcut.filterpredictions(
+            str(self.cfg_path), 
+            [str(v) for v in videos], 
+            shuffle=self.shuffle,
+            save_as_csv=True,
+            videotype='mp4',
+            filtertype="median",
+        )
+
+    def finishRun(self, run: 'DLCRun') -> bool:
+        """mark an analyzed (and filtered) directory as processed, collect outputs and record it"""
+        (run.vid_path / '.skipDLC').touch()     # legacy marker, still read by older tools
+        SkipManifest.load(run.vid_path).record(self, run.videos, self.snapshot)
+        logger.info(f'DLC analysis completed for {run.vid_path.stem}')
+
+        self.pee(run.vid_path)
+        if run.daet:
+            recordStage(run.daet, Stage.DLC_RUN, StageStatus.DONE, model_set=run.run_key,
+                        input_hash=run.input_hash, outputs=[self._getPeedTree(run.vid_path)])
+        return True
+
+    def failRun(self, run: 'DLCRun', e: Exception) -> bool:
+        logger.error(f'DLC analysis failed for {run.vid_path}: {e}')
+        if run.daet:
+            recordStage(run.daet, Stage.DLC_RUN, StageStatus.FAILED, model_set=run.run_key, message=str(e))
+        return False
         
-    def should_skip(self, skip_file: Path) -> bool:
-        '''in the future: 
-        actually check skip content and see whether this model should skip this video
-         because relying on dlc itself to skip is very slow'''
-        return skip_file.exists()
+    def stateKey(self, group: str) -> str:
+        '''model_set key of a single-model run in the pipeline state, stable across run dates'''
+        return f'{group}/{self.easy_name} [{self.md5_short}]'
+
+    def should_skip(self, vid_path: Path) -> bool:
+        '''whether the skip manifest has this video (or all videos of this folder) analyzed
+        by this model, with the current snapshot. a .skipDLC path stands for its folder'''
+        vid_path = Path(vid_path)
+        if vid_path.name == '.skipDLC':
+            vid_path = vid_path.parent
+        if vid_path.is_file():
+            return SkipManifest.load(vid_path.parent).isDone(self, vid_path, self.snapshot)
+        return not self.pendingVideos(vid_path)
+
+    def pendingVideos(self, vid_path: Path, manifest: SkipManifest | None = None) -> list[Path]:
+        '''videos of the folder this model still has to analyze'''
+        manifest = manifest or SkipManifest.load(vid_path)
+        snapshot = self.snapshot
+        return [v for v in sorted(vid_path.glob('*.mp4')) if not manifest.isDone(self, v, snapshot)]
 
     def _getPeedTree(self, vid_path:Path) -> Path:
         vid_root = vid_path.parent if vid_path.is_file() else vid_path
         return vid_root.parent / "DLC" / "separate" / self.final_folder_name
+
+    def latestPeedTree(self, vid_path: Path) -> Path | None:
+        '''newest existing output folder of this model for the video dir, of any run date'''
+        separate = self._getPeedTree(vid_path).parent
+        prefix, suffix = f'{self.easy_name}-', f' [{self.md5_short}]'
+        try:
+            names = [d.name for d in separate.iterdir()
+                     if d.is_dir() and d.name.startswith(prefix) and d.name.endswith(suffix)]
+        except OSError:
+            return None
+        return separate / max(names) if names else None
     
     def pee(self, vid_path:Path) -> None:
         # collect files for isolation
@@ -219,7 +318,7 @@ class DLCModel:
                 if new_path.exists():
                     logger.warning(f'File already exists in DLC output folder, skipping: {new_path}')
                     continue
-                shutil.copy2(sub, new_path)
+                materialize(sub, new_path, modes=('hardlink', 'reflink', 'copy'))    # no symlink, keep it isolated
                 # sub.rename(new_path)
                 file_list.append(sub.name+'\n')
         
@@ -250,10 +349,19 @@ class DLCModel:
         with open(jfile, 'w') as f:
             json.dump(j, f, indent=4)
 
+class DLCRun(NamedTuple):
+    '''one video directory to analyze with one model'''
+    vid_path: Path
+    daet: str | None
+    run_key: str            # model_set in the pipeline state
+    input_hash: str
+    videos: tuple[Path, ...] = ()   # the ones to analyze
+
 class DLCProcessor:
-    def __init__(self, note: ExpNote, model_dict: dict[CamGroup, DLCModel]):
+    def __init__(self, note: ExpNote, model_dict: dict[CamGroup, DLCModel], run_date: str | None = None):
+        '''run_date: yyyymmdd for the output folders, fixed when the work is planned'''
         self.note = note
-        self.model_dict = model_dict
+        self.model_dict = {g: m.pinned(run_date) for g, m in model_dict.items()} if run_date else model_dict
         self.data_path = note.data_path
         self.video_extension = note.video_extension
         self.wood = Wood(self.data_path / 'SynchronizedVideos')
@@ -292,7 +400,6 @@ class DLCProcessor:
         success = True
  
         # process each camera group       
-        trees: list[Path] = []
         for group, model in self.model_dict.items():
             group_path = sync_root_path / group.value  # e.g. L or R
             if group_path.exists():
@@ -300,12 +407,47 @@ class DLCProcessor:
                     success = False
             else:
                 logger.warning(f'Group path not found: {group_path}')
-            
-            trees.append(model._getPeedTree(group_path))
 
-        # merge outputs
+        return self.mergeSingleDaet(daet, success)
+
+    def workUnits(self, daet: DAET) -> list[tuple[DLCModel, Path]]:
+        """(model, cam group video dir) pairs this processor runs for daet. none for calibs"""
+        if daet.isCalib:
+            return []
+        sync_root = self.note.getDaetSyncRoot(daet)
+        return [(model, sync_root / group.value) for group, model in self.model_dict.items()]
+
+    def outputTrees(self, daet: DAET, ran: dict[Path, Path] | None = None) -> list[Path] | None:
+        """per-group output folders to merge: the one a run reported (ran: {vid dir: tree}),
+        else this run's, else the newest earlier one. None if a group has none"""
+        trees = []
+        for model, vid_dir in self.workUnits(daet):
+            tree = (ran or {}).get(vid_dir) or model._getPeedTree(vid_dir)
+            if not tree.exists():
+                tree = model.latestPeedTree(vid_dir)
+            if tree is None:
+                return None
+            trees.append(tree)
+        return trees
+
+    def mergeSingleDaet(self, daet: DAET, success: bool = True, trees: list[Path] | None = None) -> bool:
+        """merge the per-group outputs of daet and record the result.
+        success=False records a failed run without merging. trees: see outputTrees"""
         if success:
+            trees = trees or self.outputTrees(daet)
+            if not trees:
+                logger.error(f'DLC processor: no DLC output to merge for {daet}')
+                success = False
+
+        # merge outputs
+        if success and trees:
             mergeDlcOutput(*trees)
+            merged = getDLCMergedFolderName(*trees)
+            recordStage(daet, Stage.DLC, StageStatus.DONE, model_set=merged,
+                        outputs=[self.note.getDaetDlcRoot(daet) / merged])
+        else:
+            recordStage(daet, Stage.DLC, StageStatus.FAILED, model_set=self.final_dlc_folder_name,
+                        message='DLC run failed on at least one cam group')
         
         return success
 
@@ -2,7 +2,6 @@
 an adaptor transferring dlc output to anipose
 '''
 
-import shutil
 import re
 import json
 import logging
@@ -12,13 +11,16 @@ from .ani import AniposeProcessor
 from .expNote import ExpNote
 from .statusChecker import StatusChecker
 from .config import Config
+from .pipelineState import Stage, StageStatus, queryState
+from .fileOp import materialize
 
 logger = logging.getLogger(__name__)
 
-def mergeDlcOutput(*folders:Path) -> int:
+def mergeDlcOutput(*folders:Path, filtered_only: bool = False) -> int:
     '''
     combines multiple dlc output folders like TS-L-yyyymmdd [xxxx].
     Assumes folder is {daet}/DLC/separate/{named_after_model}
+    filtered_only: leave out the unfiltered h5, which setupSingleDaet(use_filtered=False) needs
     '''
     nef = next((f for f in folders if not f.exists()), None)
     if nef:
@@ -46,7 +48,7 @@ def mergeDlcOutput(*folders:Path) -> int:
         j['dlc_info'] = folder_info_dict
 
         # copy h5 coords
-        j['files'] = copyH5(f, dst)
+        j['files'] = copyH5(f, dst, filtered_only)
         
         record.append(j)
 
@@ -60,12 +62,12 @@ def copyH5(
     src: Path, dst: Path, 
     filtered_only: bool = True, 
 ) -> list[str]:
-    '''copies h5 files in folder src to dst. Returns names of file copied'''
+    '''copies (links where possible) h5 files in folder src to dst. Returns names of file copied'''
     file_list = []
     search_pattern = '*_filtered.h5' if filtered_only else '*.h5'
-    for f in src.glob('*.h5'):
+    for f in src.glob(search_pattern):
         try:
-            shutil.copy(f, dst)
+            materialize(f, dst / f.name, overwrite=True)
             file_list.append(f.name)
         except OSError as e:
             logger.error(f'copyH5: failed {f.name} - {e}')
@@ -172,12 +174,18 @@ def isAniProcessed(ani_path: Path, sync_root_path: Path, ap: AniposeProcessor|No
     '''0: totally not; 1: fully processed (csv_count==daet_count); -1: partly processed'''
     if not ani_path.exists():
         return False
+    recorded = {r.daet for r in queryState(stage=Stage.ANIPOSE, status=StageStatus.DONE,
+                                           model_set=ani_path.name) or []
+                if r.under(ani_path) and not r.missing()}
     process_stat: dict[str, bool] = {}
     for daet_folder in ani_path.glob('*'):
         if not daet_folder.is_dir(): 
             continue
         if not daet_folder.name or not DAET.isDaet(daet_folder.name):
             continue
+        if daet_folder.name in recorded:
+            process_stat[daet_folder.name] = True
+            continue
         csv_folder = daet_folder / 'pose-3d'
         for f in csv_folder.glob('*.csv'):
             process_stat[daet_folder.name] = True
@@ -0,0 +1,151 @@
+'''
+SkipManifest: which DLC model analyzed which video of a video folder
+
+kept as .dlcManifest.json next to the videos and updated after each successful
+run (DLCModel.finishRun):
+
+    {"ver": 1, "models": {"<model md5 hex>": {
+        "model": {...}, "snapshot": 1000,
+        "videos": {"x.mp4": {"size": .., "mtime_ns": .., "phash": "..",
+                             "outputs": ["xDLC_...h5", ...], "finished": ".."}}}}}
+
+a video counts as done for a model when its entry still matches the file (size
+and mtime, or the partial content hash when only the mtime moved, eg. after a
+copy), the model has no newer snapshot and the recorded h5 are still there.
+that is one read of the manifest plus stats per folder, instead of listing the
+outputs or letting DLC load the model only to skip.
+
+folders from before the manifest fall back to looking for the model's h5 per video.
+'''
+
+import os
+import json
+import hashlib
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+
+if TYPE_CHECKING:
+    from .dlc import DLCModel
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '.dlcManifest.json'
+MANIFEST_VER = 1
+PHASH_BYTES = 1 << 16   # read from each end of a video for the partial hash
+
+
+def partialHash(path: str | Path) -> str:
+    '''size + first and last PHASH_BYTES of the file'''
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        size = f.seek(0, os.SEEK_END)
+        h.update(str(size).encode())
+        f.seek(0)
+        h.update(f.read(PHASH_BYTES))
+        if size > PHASH_BYTES:
+            f.seek(max(PHASH_BYTES, size - PHASH_BYTES))
+            h.update(f.read(PHASH_BYTES))
+    return h.hexdigest()[:16]
+
+
+def _modelKey(model: 'DLCModel') -> str:
+    return f'{model.md5:032x}'
+
+
+class SkipManifest:
+    def __init__(self, vid_dir: str | Path, data: dict | None = None):
+        self.vid_dir = Path(vid_dir)
+        self.data = data if data is not None else {'ver': MANIFEST_VER, 'models': {}}
+        self._names: set[str] | None = None     # folder listing for the legacy fallback
+
+    @property
+    def path(self) -> Path:
+        return self.vid_dir / MANIFEST_NAME
+
+    @classmethod
+    def load(cls, vid_dir: str | Path) -> 'SkipManifest':
+        '''missing or unreadable manifests load empty'''
+        path = Path(vid_dir) / MANIFEST_NAME
+        try:
+            data = json.loads(path.read_bytes())
+        except FileNotFoundError:
+            return cls(vid_dir)
+        except (OSError, ValueError) as e:
+            logger.warning(f'SkipManifest: ignoring unreadable {path}: {e}')
+            return cls(vid_dir)
+        if data.get('ver') != MANIFEST_VER:
+            return cls(vid_dir)
+        return cls(vid_dir, data)
+
+    def _video(self, model: 'DLCModel', video: Path) -> tuple[dict, dict] | None:
+        '''(model entry, video entry) if recorded'''
+        entry = self.data['models'].get(_modelKey(model))
+        if entry is None or video.name not in entry['videos']:
+            return None
+        return entry, entry['videos'][video.name]
+
+    @staticmethod
+    def _sameInput(rec: dict, video: Path) -> bool:
+        try:
+            st = video.stat()
+        except OSError:
+            return False
+        if st.st_size != rec['size']:
+            return False
+        return st.st_mtime_ns == rec['mtime_ns'] or partialHash(video) == rec['phash']
+
+    def _hasOutput(self, model: 'DLCModel', video: Path) -> bool:
+        if self._names is None:
+            try:
+                self._names = set(os.listdir(self.vid_dir))
+            except OSError:
+                self._names = set()
+        prefix = f'{video.stem}DLC'
+        return any(n.startswith(prefix) and model.id_output in n and n.endswith('.h5')
+                   for n in self._names)
+
+    def isDone(self, model: 'DLCModel', video: Path, snapshot: int | None = None) -> bool:
+        '''whether model has analyzed this exact video. snapshot: the model's current one'''
+        hit = self._video(model, video)
+        if hit is None:
+            return self._hasOutput(model, video)
+        entry, rec = hit
+        if snapshot is not None and entry.get('snapshot') not in (None, snapshot):
+            return False
+        if not self._sameInput(rec, video):
+            return False
+        h5 = [o for o in rec['outputs'] if o.endswith('.h5')]
+        return bool(h5) and all((self.vid_dir / o).exists() for o in h5)
+
+    def staleOutputs(self, model: 'DLCModel', video: Path) -> list[Path]:
+        '''recorded outputs of model for a video that has changed since'''
+        hit = self._video(model, video)
+        if hit is None or self._sameInput(hit[1], video):
+            return []
+        return [self.vid_dir / o for o in hit[1]['outputs']]
+
+    def record(self, model: 'DLCModel', videos: Iterable[Path], snapshot: int | None = None) -> None:
+        '''add videos as analyzed by model, with the outputs found next to them now'''
+        fresh = SkipManifest.load(self.vid_dir)     # another model may have written meanwhile
+        entry = fresh.data['models'].setdefault(_modelKey(model), {'videos': {}})
+        entry['model'] = model.toDict()
+        if entry.get('snapshot') != snapshot:
+            entry['videos'] = {}
+        entry['snapshot'] = snapshot
+
+        finished = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        for video in videos:
+            st = video.stat()
+            outputs = sorted(p.name for p in self.vid_dir.glob(f'{video.stem}DLC*')
+                             if model.id_output in p.name)
+            entry['videos'][video.name] = {
+                'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'phash': partialHash(video),
+                'outputs': outputs, 'finished': finished,
+            }
+
+        tmp = self.path.with_name(f'{MANIFEST_NAME}.{os.getpid()}.tmp')
+        tmp.write_text(json.dumps(fresh.data, indent=1))
+        os.replace(tmp, self.path)
+        self.data, self._names = fresh.data, None
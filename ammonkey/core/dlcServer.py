@@ -0,0 +1,245 @@
+'''
+DLCServer: warm DLC inference for a long-lived (GPU) worker
+
+analyze_videos rebuilds the tf graph and restores the snapshot on every call,
+which takes longer than the inference itself on short clips (BBT, Brinkman).
+the server keeps the sessions of the last few models open, LRU by DLCModel.md5,
+and runs video-dir jobs from a local queue on a single thread, so a session is
+only ever used by the thread that loaded it.
+
+outputs are the same as DLCModel.runMany: the DLC h5/csv (+ filtered) next to
+the videos, the skip manifest, pee() into DLC/separate and a DLC_RUN state row.
+only videos the manifest doesn't have for the model are analyzed.
+
+backends: anything with load(model) -> session, analyze(session, model, videos)
+and release(session). TFBackend is DLC's tensorflow engine (what runMany uses),
+on 'gpu' or 'cpu'.
+
+Usage eg
+    server = getServer()
+    server.submit(model, vid_dir).result()      # True / False
+    server.run(model, [dir_l, dir_r])           # {dir: success}
+'''
+
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Protocol
+
+import pandas as pd
+
+from . import dlc
+from .dlc import DLCModel
+
+logger = logging.getLogger(__name__)
+
+SERVER_MODELS = 2       # sessions kept loaded, each holds its weights in (gpu) memory
+SERVER_DEVICE = 'gpu'   # device of the backend getServer() creates
+
+_server: 'DLCServer | None' = None
+_server_lock = threading.Lock()
+
+
+class DLCBackend(Protocol):
+    def load(self, model: DLCModel) -> Any: ...
+    def analyze(self, session: Any, model: DLCModel, videos: list[Path]) -> None: ...
+    def release(self, session: Any) -> None: ...
+
+
+@dataclass
+class _TFSession:
+    cfg: dict
+    dlc_cfg: dict
+    sess: Any
+    inputs: Any
+    outputs: Any
+    scorer: str
+    scorer_legacy: str
+    train_fraction: float
+    pdindex: pd.MultiIndex
+
+
+class TFBackend:
+    '''
+    DLC tensorflow engine with the session kept open. mirrors what analyze_videos
+    does for trainingsetindex 0 and the model's shuffle, so output names match runMany.
+    device 'cpu' hides the gpus from tf, which only works before tf touched them.
+    '''
+    def __init__(self, device: str = 'gpu', batch_size: int | None = None):
+        if device not in ('gpu', 'cpu'):
+            raise ValueError(f'Unknown device {device}, expected gpu or cpu')
+        self.device = device
+        self.batch_size = batch_size
+        self._device_set = False
+
+    def _setDevice(self) -> None:
+        if self._device_set:
+            return
+        if self.device == 'cpu':
+            import tensorflow as tf
+            try:
+                tf.config.set_visible_devices([], 'GPU')
+            except RuntimeError as e:   # gpus already initialized in this process
+                logger.warning(f'TFBackend: cannot hide gpus, {e}')
+        self._device_set = True
+
+    def load(self, model: DLCModel) -> _TFSession:
+        if not dlc.ready and not dlc.initDlc():
+            raise RuntimeError('Failed to initialize DeepLabCut')
+        from deeplabcut.utils import auxiliaryfunctions
+        from deeplabcut.pose_estimation_tensorflow.config import load_config
+        from deeplabcut.pose_estimation_tensorflow.core import predict
+        self._setDevice()
+
+        cfg = auxiliaryfunctions.read_config(str(model.cfg_path))
+        train_fraction = cfg['TrainingFraction'][0]
+        dlc_cfg = load_config(str(model.model_path.parent / 'test' / 'pose_cfg.yaml'))
+
+        snapshots = sorted((f.stem for f in model.model_path.glob('snapshot-*.index')),
+                           key=lambda s: int(s.rsplit('-', 1)[-1]))
+        if not snapshots:
+            raise FileNotFoundError(f'No snapshot in {model.model_path}')
+        idx = cfg.get('snapshotindex', -1)
+        snapshot = snapshots[-1 if idx == 'all' else idx]
+        dlc_cfg['init_weights'] = str(model.model_path / snapshot)
+        dlc_cfg['batch_size'] = self.batch_size or cfg['batch_size']
+
+        scorer, scorer_legacy = auxiliaryfunctions.get_scorer_name(
+            cfg, model.shuffle, train_fraction, trainingsiterations=snapshot.rsplit('-', 1)[-1])
+        sess, inputs, outputs = predict.setup_pose_prediction(dlc_cfg)
+        pdindex = pd.MultiIndex.from_product(
+            [[scorer], dlc_cfg['all_joints_names'], ['x', 'y', 'likelihood']],
+            names=['scorer', 'bodyparts', 'coords'])
+        logger.info(f'TFBackend: loaded {model.easy_name} ({snapshot}) on {self.device}')
+        return _TFSession(cfg, dlc_cfg, sess, inputs, outputs, scorer, scorer_legacy,
+                          train_fraction, pdindex)
+
+    def analyze(self, session: _TFSession, model: DLCModel, videos: list[Path]) -> None:
+        from deeplabcut.pose_estimation_tensorflow.predict_videos import AnalyzeVideo
+        s = session
+        for video in videos:
+            AnalyzeVideo(str(video), s.scorer, s.scorer_legacy, s.train_fraction, s.cfg, s.dlc_cfg,
+                         s.sess, s.inputs, s.outputs, s.pdindex, save_as_csv=True,
+                         TFGPUinference=False)
+        model.filterPredictions(videos)
+
+    def release(self, session: _TFSession) -> None:
+        session.sess.close()
+
+
+@dataclass
+class _Job:
+    model: DLCModel
+    vid_path: Path
+    override_exist: bool
+    future: Future = field(default_factory=Future)
+
+
+class DLCServer:
+    '''serves DLC jobs with warm sessions, see module doc'''
+    def __init__(self, backend: DLCBackend | None = None, max_models: int = SERVER_MODELS):
+        self.backend: DLCBackend = backend if backend is not None else TFBackend(SERVER_DEVICE)
+        self.max_models = max(1, max_models)
+        self.loads = 0      # sessions loaded so far
+        self._sessions: OrderedDict[int, Any] = OrderedDict()   # md5 -> session, oldest first
+        self._jobs: queue.Queue[_Job | None] = queue.Queue()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> list[int]:
+        '''md5 of the models with a session, least recently used first'''
+        return list(self._sessions)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> 'DLCServer':
+        with self._lock:
+            if not self.running:
+                self._thread = threading.Thread(target=self._serve, name='dlc-server', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, wait: bool = True) -> None:
+        '''finish queued jobs, then release all sessions'''
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if thread is None:
+                return
+            self._jobs.put(None)
+        if wait:
+            thread.join()
+
+    def submit(self, model: DLCModel, vid_path: Path | str, override_exist: bool = False) -> Future:
+        '''queue one video dir, the future resolves to its success'''
+        job = _Job(model, Path(vid_path), override_exist)
+        self.start()
+        self._jobs.put(job)
+        return job.future
+
+    def run(self, model: DLCModel, vid_paths: list[Path | str],
+            override_exist: bool = False) -> dict[Path, bool]:
+        '''queue the dirs and wait for all of them'''
+        futures = {Path(p): self.submit(model, p, override_exist) for p in vid_paths}
+        return {p: f.result() for p, f in futures.items()}
+
+    def _serve(self) -> None:
+        while (job := self._jobs.get()) is not None:
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(self._process(job))
+            except BaseException as e:
+                job.future.set_exception(e)
+        while self._sessions:
+            self._release(*self._sessions.popitem(last=False))
+
+    def _process(self, job: _Job) -> bool:
+        model = job.model
+        if not model.is_available:
+            logger.error(f'DLCServer: model not valid {model}')
+            return False
+        results, todo = model.planRuns([job.vid_path], job.override_exist)
+        if not todo:
+            return results.get(job.vid_path, False)
+
+        run = todo[0]
+        try:
+            self.backend.analyze(self._session(model), model, list(run.videos))
+            return model.finishRun(run)
+        except Exception as e:
+            return model.failRun(run, e)
+
+    def _session(self, model: DLCModel) -> Any:
+        key = model.md5
+        if key in self._sessions:
+            self._sessions.move_to_end(key)
+            return self._sessions[key]
+        while len(self._sessions) >= self.max_models:
+            self._release(*self._sessions.popitem(last=False))
+        session = self.backend.load(model)
+        self._sessions[key] = session
+        self.loads += 1
+        return session
+
+    def _release(self, key: int, session: Any) -> None:
+        try:
+            self.backend.release(session)
+        except Exception as e:
+            logger.warning(f'DLCServer: failed to release session {key:x}: {e}')
+
+
+def getServer() -> DLCServer:
+    '''process-wide server on SERVER_DEVICE, started on first submit'''
+    global _server
+    if _server is None:
+        with _server_lock:
+            if _server is None:
+                _server = DLCServer()
+    return _server
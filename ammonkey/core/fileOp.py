@@ -2,8 +2,9 @@
 File operations centered
 '''
 
-import os, logging, platform, sys
+import os, errno, shutil, logging, platform, sys
 from pathlib import Path
+from typing import Callable, Iterable
 
 try:
     import win32com.client
@@ -81,3 +82,77 @@ def twoWayShortcuts(path1:str, path2:str) -> None:
         print(f"Shortcut created: {shortcut2_path} → {path1}")
     finally:
         pythoncom.CoUninitialize()  # clean up
+
+# === materialize: a file's content at a second path, without copying where possible ===
+
+MATERIALIZE_ORDER = ('hardlink', 'reflink', 'symlink', 'copy')
+_FICLONE = 0x40049409   # linux ioctl, clones extents on btrfs / xfs
+_UNSUPPORTED = {errno.EXDEV, errno.EPERM, errno.ENOTSUP, errno.EOPNOTSUPP,
+                errno.ENOSYS, errno.EINVAL, errno.ENOTTY}
+_unsupported: set[tuple[tuple[int, int], str]] = set()   # ((src dev, dst dev), mode) that were refused
+
+def _hardlink(src: Path, dst: Path) -> None:
+    os.link(src, dst)
+
+def _reflink(src: Path, dst: Path) -> None:
+    '''clone, else copy_file_range (in-kernel, server-side on smb/nfs mounts)'''
+    if not hasattr(os, 'copy_file_range'):
+        raise OSError(errno.ENOTSUP, 'copy_file_range not available')
+    with open(src, 'rb') as fs, open(dst, 'xb') as fd:
+        try:
+            import fcntl
+            fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+        except OSError:
+            left = os.fstat(fs.fileno()).st_size
+            while left > 0:
+                n = os.copy_file_range(fs.fileno(), fd.fileno(), left)
+                if n == 0:
+                    raise OSError(errno.EIO, 'copy_file_range stopped early')
+                left -= n
+    shutil.copystat(src, dst)
+
+def _symlink(src: Path, dst: Path) -> None:
+    os.symlink(os.path.abspath(src), dst)
+
+def _copy(src: Path, dst: Path) -> None:
+    shutil.copy2(src, dst)
+
+MATERIALIZERS: dict[str, Callable[[Path, Path], None]] = {
+    'hardlink': _hardlink,
+    'reflink': _reflink,
+    'symlink': _symlink,
+    'copy': _copy,
+}
+
+def materialize(src: Path | str, dst: Path | str, modes: Iterable[str] = MATERIALIZE_ORDER,
+                overwrite: bool = False) -> str:
+    '''
+    put the content of file src at dst, trying modes in order (see MATERIALIZERS).
+    a mode the filesystem refused isn't tried again for the same (src, dst) filesystem pair.
+    returns the mode used. links share content with src: replace dst (overwrite=True
+    unlinks it first), never write into it.
+    '''
+    src, dst = Path(src), Path(dst)
+    if dst.exists() or dst.is_symlink():
+        if not overwrite:
+            raise FileExistsError(errno.EEXIST, 'materialize: destination exists', str(dst))
+        dst.unlink()
+
+    pair = (os.stat(src).st_dev, os.stat(dst.parent).st_dev)
+    err: OSError | None = None
+    for mode in modes:
+        if (pair, mode) in _unsupported:
+            continue
+        try:
+            MATERIALIZERS[mode](src, dst)
+            return mode
+        except (FileNotFoundError, FileExistsError):
+            raise
+        except OSError as e:
+            err = e
+            if dst.exists() or dst.is_symlink():    # partial clone / copy
+                dst.unlink()
+            if e.errno in _UNSUPPORTED:
+                _unsupported.add((pair, mode))
+                logger.debug(f'materialize: {mode} unsupported for {src.parent} -> {dst.parent}: {e}')
+    raise err or OSError(errno.ENOTSUP, f'materialize: no usable mode in {modes}', str(dst))
@@ -6,6 +6,8 @@ import logging
 lg = logging.getLogger(__name__)
 
 from .expNote import ExpNote
+from .daet import DAET
+from .pipelineState import Stage, StageStatus, recordStage
 
 def violentCollect(ani_path: Path|str, clean_path: Path|str) -> bool:
     '''
@@ -26,13 +28,19 @@ def violentCollect(ani_path: Path|str, clean_path: Path|str) -> bool:
     dst.mkdir(exist_ok=True)
 
     csv_list: list[str] = []
+    collected: dict[str, list[Path]] = {}     # daet -> csvs now in dst, for the state db
     for csv in ani_path.rglob('*.csv'):
         csv_list.append(str(csv))
         dst_file = dst / csv.name
+        if csv.parent.name == 'pose-3d' and DAET.isDaet(csv.parent.parent.name):
+            collected.setdefault(csv.parent.parent.name, []).append(dst_file)
         if dst_file.exists():
             # raise FileExistsError(f'violentCollect: refused to overwrite already-collected csv: {dst_file}')
             continue
         shutil.copy(csv, dst_file)
+
+    for daet, files in collected.items():
+        recordStage(daet, Stage.COLLECT, StageStatus.DONE, model_set=ani_path.name, outputs=files)
     
     log = dst / 'scent.log'
     log.touch()
@@ -0,0 +1,218 @@
+'''
+NoteCatalog: parallel, lazy discovery of experiment notes across an archive
+
+scans DATA_RAW/<animal>/yyyy/mm/<yyyymmdd> with a thread pool (each listdir
+is a network round trip, so they overlap well), and hands out NoteHandles
+that only build the ExpNote on first access. loading goes through ExpNote's
+parsed-note cache, so repeat scans skip Excel parsing.
+
+Usage eg
+    cat = NoteCatalog(r'P:/.../DATA_RAW/Pici', start='2025', end='202503')
+    for note in cat.iter_notes():        # concurrent loads, yielded in date order
+        ...
+    handles = cat.only({'20250310'})     # narrow without rescanning
+'''
+
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .expNote import ExpNote
+from .camConfig import CamConfig
+
+logger = logging.getLogger(__name__)
+
+SCAN_WORKERS = 8
+LOAD_WORKERS = 4
+_RE_DATE = re.compile(r'^20\d{2}(0[1-9]|1[0-2])(0[1-9]|[12]\d|3[01])$')
+
+DateLimit = str | int | None
+
+
+def _normalize_limit(val: str | int, is_upper: bool) -> int:
+    '''2025 / 202503 / 20250310 -> yyyymmdd int, padded to cover the whole period'''
+    s = str(val).strip()
+    pad = '9' if is_upper else '0'
+    if len(s) == 4:
+        return int(s + pad * 4)
+    if len(s) == 6:
+        return int(s + pad * 2)
+    return int(s[:8])
+
+
+@dataclass
+class NoteHandle:
+    '''one date folder with a note. the ExpNote is built on first .note access'''
+    path: Path              # date folder
+    xlsx: Path
+    animal: str
+    date: str
+    cam_config: CamConfig | None = None
+    _note: ExpNote | None = field(default=None, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def note(self) -> ExpNote:
+        if self._note is None:
+            with self._lock:
+                if self._note is None:
+                    self._note = ExpNote(self.path, cam_config=self.cam_config)  #type: ignore
+        return self._note
+
+    @property
+    def loaded(self) -> bool:
+        return self._note is not None
+
+    def release(self) -> None:
+        '''drop the loaded note to free memory, it reloads (from cache) on next access'''
+        self._note = None
+
+
+class NoteCatalog:
+    '''
+    all notes of one animal, optionally limited to a date range.
+    animal_dir: DATA_RAW/<animal>. a year folder also works (range = that year).
+    start / end: 'yyyy', 'yyyymm' or 'yyyymmdd', inclusive.
+    '''
+    def __init__(self, animal_dir: str | Path, start: DateLimit = None, end: DateLimit = None,
+                 cam_config: CamConfig | None = None, max_workers: int = SCAN_WORKERS):
+        animal_dir = Path(animal_dir)
+        if animal_dir.name.isdigit() and len(animal_dir.name) == 4:
+            start = start or animal_dir.name
+            end = end or animal_dir.name
+            animal_dir = animal_dir.parent
+        self.animal_dir = animal_dir
+        self.animal = animal_dir.name
+        self.start = _normalize_limit(start, False) if start is not None else None
+        self.end = _normalize_limit(end, True) if end is not None else None
+        self.cam_config = cam_config
+        self.max_workers = max_workers
+        self._handles: list[NoteHandle] | None = None
+
+    def __repr__(self) -> str:
+        return f'NoteCatalog({self.animal} {self.start}-{self.end})'
+
+    # === scanning ===
+    @property
+    def handles(self) -> list[NoteHandle]:
+        if self._handles is None:
+            self._handles = self._scan()
+        return self._handles
+
+    def __iter__(self) -> Iterator[NoteHandle]:
+        return iter(self.handles)
+
+    def __len__(self) -> int:
+        return len(self.handles)
+
+    @property
+    def dates(self) -> list[str]:
+        return [h.date for h in self.handles]
+
+    def _inRange(self, yyyymmdd: int) -> bool:
+        return (self.start is None or yyyymmdd >= self.start) and (self.end is None or yyyymmdd <= self.end)
+
+    @staticmethod
+    def _listDirs(path: str) -> list[str]:
+        try:
+            with os.scandir(path) as it:
+                return [e.name for e in it if e.is_dir()]
+        except OSError as e:
+            logger.warning(f'NoteCatalog: cannot list {path}: {e}')
+            return []
+
+    def _findXlsx(self, day_dir: str, date: str) -> str | None:
+        name = f'{self.animal}_{date}.xlsx'.lower()
+        try:
+            with os.scandir(day_dir) as it:
+                for e in it:
+                    if e.name.lower() == name and e.is_file():
+                        return e.path
+        except OSError as e:
+            logger.warning(f'NoteCatalog: cannot list {day_dir}: {e}')
+        return None
+
+    def _scan(self) -> list[NoteHandle]:
+        root = str(self.animal_dir)
+        years = [y for y in self._listDirs(root) if y.isdigit() and len(y) == 4
+                 and (self.start is None or int(y) >= self.start // 10000)
+                 and (self.end is None or int(y) <= self.end // 10000)]
+        month_dirs = [os.path.join(root, y, m) for y in years
+                      for m in self._listDirs(os.path.join(root, y)) if m.isdigit()]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            day_lists = pool.map(self._listDirs, month_dirs)
+            days = [(os.path.join(md, d), d) for md, ds in zip(month_dirs, day_lists) for d in ds
+                    if _RE_DATE.match(d) and self._inRange(int(d))]
+            xlsxs = pool.map(lambda dd: self._findXlsx(*dd), days)
+            found = list(zip(days, xlsxs))
+
+        handles = []
+        for (day_dir, date), xlsx in found:
+            if xlsx is None:
+                logger.warning(f'No note found under {date}')
+                continue
+            handles.append(NoteHandle(Path(day_dir), Path(xlsx), self.animal, date, self.cam_config))
+        handles.sort(key=lambda h: h.date)
+        logger.debug(f'{self}: {len(handles)} notes')
+        return handles
+
+    def refresh(self) -> None:
+        '''forget the scan, next access rescans'''
+        self._handles = None
+
+    # === narrowing, no rescan ===
+    def _derive(self, handles: list[NoteHandle]) -> 'NoteCatalog':
+        new = NoteCatalog.__new__(NoteCatalog)
+        new.__dict__.update(self.__dict__)
+        new._handles = handles
+        return new
+
+    def between(self, start: DateLimit = None, end: DateLimit = None) -> 'NoteCatalog':
+        lo = _normalize_limit(start, False) if start is not None else None
+        hi = _normalize_limit(end, True) if end is not None else None
+        new = self._derive([h for h in self.handles
+                            if (lo is None or int(h.date) >= lo) and (hi is None or int(h.date) <= hi)])
+        new.start = max(filter(None, (self.start, lo)), default=None)
+        new.end = min(filter(None, (self.end, hi)), default=None)
+        return new
+
+    def only(self, dates: Iterable[str]) -> 'NoteCatalog':
+        wanted = set(dates)
+        return self._derive([h for h in self.handles if h.date in wanted])
+
+    # === loading ===
+    def iter_notes(self, max_workers: int = LOAD_WORKERS, prefetch: int = 8,
+                   keep: bool = False) -> Iterator[ExpNote]:
+        '''
+        load notes concurrently, yield them in date order. at most prefetch
+        notes are in flight or waiting. notes that fail to load are logged and
+        skipped, like iter_notes. keep=False releases each handle once yielded.
+        '''
+        handles = self.handles
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            pending: deque[tuple[NoteHandle, Future]] = deque()
+            it = iter(handles)
+            for h in it:
+                pending.append((h, pool.submit(lambda h=h: h.note)))
+                if len(pending) >= prefetch:
+                    break
+            while pending:
+                h, fut = pending.popleft()
+                nxt = next(it, None)
+                if nxt is not None:
+                    pending.append((nxt, pool.submit(lambda h=nxt: h.note)))
+                try:
+                    note = fut.result()
+                except Exception as e:
+                    logger.error(f'Loading xlsx failed {h.date}: {e}')
+                    continue
+                if not keep:
+                    h.release()
+                yield note
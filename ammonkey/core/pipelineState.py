@@ -0,0 +1,370 @@
+'''
+PipelineState: persistent per-DAET processing state in a local SQLite file
+
+each stage that finishes (or fails) on a DAET writes one row keyed by
+(daet, stage, model_set): status, timestamps, an input hash and its outputs.
+status checks then become one indexed query per note/date/animal instead of
+globbing marker files and outputs over the network.
+
+the db is a cache in front of the filesystem, never an override: the marker
+files and outputs stay the source of truth. rows are keyed by the daet alone,
+so readers only take a done row for the data root they look at when its
+recorded outputs lie under that root and are still there (StageRecord.under,
+.missing). a missing row means "unknown, go look".
+
+db location: Config.state_db ('state-db' in amm-config.yaml), falls back to
+~/.ammonkey/pipeline_state.db. sqlite over SMB is unreliable with concurrent
+writers, keep it on a local disk unless only one machine writes.
+
+Usage eg
+    state = getState()
+    state.markDone(daet, Stage.SYNC, outputs=[sync_root])
+    state.isDone(daet, Stage.SYNC)
+    recs = state.query(animal='Pici', date='20250310', stage=Stage.DLC)
+'''
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from enum import Enum
+from pathlib import Path
+from dataclasses import dataclass
+from socket import gethostname
+from typing import Iterable
+
+from .daet import DAET
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STATE_DB = Path.home() / '.ammonkey' / 'pipeline_state.db'
+STATE_ENABLED = True    # global switch, writers become no-ops when False
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS stage_state (
+    daet        TEXT NOT NULL,
+    stage       TEXT NOT NULL,
+    model_set   TEXT NOT NULL DEFAULT '',
+    animal      TEXT NOT NULL,
+    date        TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    started     REAL,
+    finished    REAL,
+    input_hash  TEXT,
+    outputs     TEXT,
+    host        TEXT,
+    message     TEXT,
+    PRIMARY KEY (daet, stage, model_set)
+);
+CREATE INDEX IF NOT EXISTS idx_stage_state_date ON stage_state (animal, date, stage);
+CREATE INDEX IF NOT EXISTS idx_stage_state_stage ON stage_state (stage, status, model_set);
+'''
+
+
+class Stage(Enum):
+    SYNC_DETECT = 'sync_detect'     # LED/audio detection, sync config written
+    SYNC = 'sync'                   # trimmed videos written
+    DLC_RUN = 'dlc_run'             # one DLC model on one cam group, model_set = separate folder name
+    DLC = 'dlc'                     # merged DLC output, model_set = merged folder name
+    ANIPOSE = 'anipose'             # pose-3d csv, model_set = anipose model set
+    COLLECT = 'collect'             # csv collected into clean/
+
+
+class StageStatus(Enum):
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+
+@dataclass(frozen=True)
+class StageRecord:
+    daet: str
+    stage: Stage
+    model_set: str
+    animal: str
+    date: str
+    status: StageStatus
+    started: float | None
+    finished: float | None
+    input_hash: str | None
+    outputs: list[str]
+    host: str | None
+    message: str | None
+
+    @property
+    def done(self) -> bool:
+        return self.status == StageStatus.DONE
+
+    def under(self, root: str | Path) -> bool:
+        '''all recorded outputs lie under root, ie. the row is about this copy of the data'''
+        if not self.outputs:
+            return False
+        base = os.path.normcase(os.path.abspath(root))
+        try:
+            return all(os.path.commonpath([base, os.path.normcase(os.path.abspath(o))]) == base
+                       for o in self.outputs)
+        except ValueError:      # other drive
+            return False
+
+    def missing(self) -> list[str]:
+        '''recorded outputs that are gone from disk'''
+        return [o for o in self.outputs if not os.path.exists(o)]
+
+    @classmethod
+    def fromRow(cls, row: sqlite3.Row) -> 'StageRecord':
+        return cls(
+            daet=row['daet'],
+            stage=Stage(row['stage']),
+            model_set=row['model_set'],
+            animal=row['animal'],
+            date=row['date'],
+            status=StageStatus(row['status']),
+            started=row['started'],
+            finished=row['finished'],
+            input_hash=row['input_hash'],
+            outputs=json.loads(row['outputs']) if row['outputs'] else [],
+            host=row['host'],
+            message=row['message'],
+        )
+
+
+def hashInputs(paths: Iterable[str | Path]) -> str:
+    '''
+    cheap fingerprint of input files: name, size and mtime, no content read.
+    missing files hash as missing, so a later appearance changes the hash.
+    '''
+    h = hashlib.sha1()
+    for p in sorted(str(p) for p in paths):
+        try:
+            st = os.stat(p)
+            h.update(f'{os.path.basename(p)}|{st.st_size}|{st.st_mtime_ns}\n'.encode())
+        except OSError:
+            h.update(f'{os.path.basename(p)}|missing\n'.encode())
+    return h.hexdigest()[:16]
+
+
+def hashValue(obj) -> str:
+    '''fingerprint of a json-able value, eg. a sync config or model dict'''
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _daetKey(daet: DAET | str) -> tuple[str, str, str]:
+    '''(daet_str, animal, date)'''
+    if not isinstance(daet, DAET):
+        daet = DAET.fromString(str(daet))
+    return str(daet), daet.animal, daet.date
+
+
+class PipelineState:
+    '''
+    thin wrapper over the sqlite file. one connection per thread, WAL mode so
+    readers don't block the (short) writes.
+    '''
+    def __init__(self, db_path: str | Path | None = None):
+        self.db_path = Path(db_path) if db_path else defaultDbPath()
+        self._local = threading.local()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript(_SCHEMA)
+
+    def __repr__(self) -> str:
+        return f'PipelineState({self.db_path})'
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # === writing ===
+    def record(self, daet: DAET | str, stage: Stage, status: StageStatus,
+               model_set: str = '', input_hash: str | None = None,
+               outputs: Iterable[str | Path] | None = None, message: str = '') -> None:
+        '''insert or replace the row. RUNNING sets started, DONE/FAILED set finished'''
+        daet_str, animal, date = _daetKey(daet)
+        now = time.time()
+        started = now if status == StageStatus.RUNNING else None
+        finished = None if status == StageStatus.RUNNING else now
+        outs = json.dumps([str(o) for o in outputs]) if outputs is not None else None
+        with self._conn() as conn:
+            conn.execute(
+                '''INSERT INTO stage_state
+                   (daet, stage, model_set, animal, date, status, started, finished,
+                    input_hash, outputs, host, message)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (daet, stage, model_set) DO UPDATE SET
+                    status = excluded.status,
+                    started = COALESCE(excluded.started, stage_state.started),
+                    finished = excluded.finished,
+                    input_hash = COALESCE(excluded.input_hash, stage_state.input_hash),
+                    outputs = COALESCE(excluded.outputs, stage_state.outputs),
+                    host = excluded.host,
+                    message = excluded.message''',
+                (daet_str, stage.value, model_set, animal, date, status.value, started,
+                 finished, input_hash, outs, gethostname(), message),
+            )
+
+    def markRunning(self, daet: DAET | str, stage: Stage, model_set: str = '',
+                    input_hash: str | None = None) -> None:
+        self.record(daet, stage, StageStatus.RUNNING, model_set, input_hash)
+
+    def markDone(self, daet: DAET | str, stage: Stage, model_set: str = '',
+                 input_hash: str | None = None, outputs: Iterable[str | Path] | None = None,
+                 message: str = '') -> None:
+        self.record(daet, stage, StageStatus.DONE, model_set, input_hash, outputs, message)
+
+    def markFailed(self, daet: DAET | str, stage: Stage, model_set: str = '',
+                   message: str = '') -> None:
+        self.record(daet, stage, StageStatus.FAILED, model_set, message=message)
+
+    def forget(self, daet: DAET | str, stage: Stage | None = None, model_set: str | None = None) -> int:
+        '''drop rows of a daet (optionally one stage / model set). returns rows removed'''
+        sql = 'DELETE FROM stage_state WHERE daet = ?'
+        args: list = [_daetKey(daet)[0]]
+        if stage is not None:
+            sql += ' AND stage = ?'
+            args.append(stage.value)
+        if model_set is not None:
+            sql += ' AND model_set = ?'
+            args.append(model_set)
+        with self._conn() as conn:
+            return conn.execute(sql, args).rowcount
+
+    # === reading ===
+    def get(self, daet: DAET | str, stage: Stage, model_set: str = '') -> StageRecord | None:
+        row = self._conn().execute(
+            'SELECT * FROM stage_state WHERE daet = ? AND stage = ? AND model_set = ?',
+            (_daetKey(daet)[0], stage.value, model_set),
+        ).fetchone()
+        return StageRecord.fromRow(row) if row else None
+
+    def isDone(self, daet: DAET | str, stage: Stage, model_set: str = '',
+               input_hash: str | None = None) -> bool:
+        '''done, and if input_hash is given, done on the same inputs'''
+        rec = self.get(daet, stage, model_set)
+        if rec is None or not rec.done:
+            return False
+        return input_hash is None or rec.input_hash == input_hash
+
+    def query(self, animal: str | None = None, date: str | None = None,
+              stage: Stage | None = None, status: StageStatus | None = None,
+              model_set: str | None = None, daets: Iterable[DAET | str] | None = None,
+              model_prefix: str | None = None) -> list[StageRecord]:
+        '''all matching rows, ordered by daet'''
+        clauses, args = [], []
+        for col, val in (('animal', animal), ('date', date), ('model_set', model_set)):
+            if val is not None:
+                clauses.append(f'{col} = ?')
+                args.append(val)
+        if stage is not None:
+            clauses.append('stage = ?')
+            args.append(stage.value)
+        if status is not None:
+            clauses.append('status = ?')
+            args.append(status.value)
+        if model_prefix is not None:
+            clauses.append("model_set LIKE ? ESCAPE '\\'")
+            args.append(model_prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if daets is not None:
+            names = [str(d) for d in daets]
+            if not names:
+                return []
+            clauses.append(f'daet IN ({",".join("?" * len(names))})')
+            args.extend(names)
+        sql = 'SELECT * FROM stage_state'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY daet, stage, model_set'
+        return [StageRecord.fromRow(r) for r in self._conn().execute(sql, args)]
+
+    def doneDaets(self, stage: Stage, model_set: str | None = None, **filters) -> set[str]:
+        '''daet strings with a done row for the stage'''
+        return {r.daet for r in self.query(stage=stage, status=StageStatus.DONE,
+                                           model_set=model_set, **filters)}
+
+
+def defaultDbPath() -> Path:
+    configured = getattr(Config, 'state_db', '')
+    return Path(configured) if configured else DEFAULT_STATE_DB
+
+
+_state: PipelineState | None = None
+_state_lock = threading.Lock()
+
+
+def getState() -> PipelineState:
+    '''process-wide PipelineState on the configured db'''
+    global _state
+    if _state is None:
+        with _state_lock:
+            if _state is None:
+                _state = PipelineState()
+    return _state
+
+
+def recordStage(daet: DAET | str, stage: Stage, status: StageStatus, **kwargs) -> None:
+    '''
+    writer hook for processing code: a broken or locked state db must never
+    fail the processing step itself, so errors are only logged.
+    '''
+    if not STATE_ENABLED:
+        return
+    try:
+        getState().record(daet, stage, status, **kwargs)
+    except Exception as e:
+        logger.warning(f'PipelineState: failed recording {daet} {stage.value} {status.value}: {e}')
+
+
+def isStageDone(daet: DAET | str, stage: Stage, model_set: str = '',
+                input_hash: str | None = None, root: str | Path | None = None) -> bool:
+    '''
+    reader hook, False when the state db is disabled or unreadable.
+    root: only a row whose recorded outputs lie under root and still exist counts
+    '''
+    if not STATE_ENABLED:
+        return False
+    try:
+        rec = getState().get(daet, stage, model_set)
+    except Exception as e:
+        logger.warning(f'PipelineState: lookup failed {daet} {stage.value}: {e}')
+        return False
+    if rec is None or not rec.done or (input_hash is not None and rec.input_hash != input_hash):
+        return False
+    return root is None or (rec.under(root) and not rec.missing())
+
+
+def isStageStale(daet: DAET | str, stage: Stage, root: str | Path, model_set: str = '') -> bool:
+    '''recorded done under root but some recorded output is gone. False when unknown'''
+    if not STATE_ENABLED:
+        return False
+    try:
+        rec = getState().get(daet, stage, model_set)
+    except Exception as e:
+        logger.warning(f'PipelineState: lookup failed {daet} {stage.value}: {e}')
+        return False
+    return rec is not None and rec.done and rec.under(root) and bool(rec.missing())
+
+
+def queryState(**filters) -> list[StageRecord] | None:
+    '''reader hook, None when the state db is disabled or unreadable (caller falls back to files)'''
+    if not STATE_ENABLED:
+        return None
+    try:
+        return getState().query(**filters)
+    except Exception as e:
+        logger.warning(f'PipelineState: query failed {filters}: {e}')
+        return None
@@ -1,14 +1,135 @@
 '''
 StatusChecker object that retains an ExpNote and allows for easy processing status checks
+checks run on an in-memory tree of SynchronizedVideos/ and anipose/, built with one
+scandir walk per root. done rows in the pipeline state db only count when their recorded
+outputs are in that tree, so they shortcut the checks but never override the files.
+refresh() only relists directories whose mtime changed.
 '''
 
+import os
+import logging
 from pathlib import Path
 from dataclasses import dataclass, field
 from ammonkey.core.expNote import ExpNote
 from ammonkey.core.daet import DAET
 from ammonkey.core.camConfig import CamConfig
+from ammonkey.core.pipelineState import Stage, StageRecord, queryState
+
+logger = logging.getLogger(__name__)
 
 DLC_SEPARATE_DIR = 'separate'
+SYNC_TREE_DEPTH = 3     # <daet>/<group | DLC>/<model set>
+ANI_TREE_DEPTH = 4      # <model set>/<daet>/<pose-3d | videos-*>/files
+
+@dataclass
+class _DirNode:
+    '''one listed directory. dirs keyed by lowercase name, like the (windows) filesystem'''
+    path: str
+    mtime_ns: int = -1
+    files: list[str] = field(default_factory=list)
+    dirs: dict[str, '_DirNode'] = field(default_factory=dict)
+
+    def child(self, name: str) -> '_DirNode | None':
+        return self.dirs.get(name.lower())
+
+    def filesWith(self, ext: str) -> list[str]:
+        ext = ext.lower()
+        return [f for f in self.files if f.lower().endswith(ext)]
+
+    @property
+    def name(self) -> str:
+        return os.path.basename(self.path)
+
+
+class _DirTree:
+    '''
+    directory tree under root, down to depth levels (files of the deepest level
+    are listed too). a missing root gives an empty tree.
+    '''
+    def __init__(self, root: str | Path, depth: int):
+        self.root = str(root)
+        self.depth = depth
+        self.node: _DirNode | None = None
+        self.listed = 0     # directories listed by the last walk/refresh, for diagnostics
+        self.refresh()
+
+    def refresh(self) -> int:
+        '''relist directories whose mtime changed (all of them on the first call). returns count'''
+        self.listed = 0
+        self.node = self._update(self.node, self.root, self.depth)
+        return self.listed
+
+    def _update(self, node: _DirNode | None, path: str, depth: int) -> _DirNode | None:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        if node is None or node.mtime_ns != mtime:
+            node = self._list(node, path, mtime)
+        if depth > 1:
+            for name, child in list(node.dirs.items()):
+                updated = self._update(child, child.path, depth - 1)
+                if updated is None:
+                    del node.dirs[name]
+                else:
+                    node.dirs[name] = updated
+        return node
+
+    def _list(self, old: _DirNode | None, path: str, mtime: int) -> _DirNode:
+        self.listed += 1
+        node = _DirNode(path, mtime)
+        try:
+            with os.scandir(path) as it:
+                for e in it:
+                    try:
+                        is_dir = e.is_dir()
+                    except OSError:
+                        continue
+                    if is_dir:
+                        prev = old.dirs.get(e.name.lower()) if old else None
+                        node.dirs[e.name.lower()] = prev if prev else _DirNode(e.path)
+                    else:
+                        node.files.append(e.name)
+        except OSError as e:
+            logger.warning(f'StatusChecker: cannot list {path}: {e}')
+        return node
+
+    def get(self, *parts: str) -> _DirNode | None:
+        node = self.node
+        for p in parts:
+            if node is None:
+                return None
+            node = node.child(p)
+        return node
+
+    def has(self, path: str | Path) -> bool:
+        '''path is under root and in the listing, as a file or directory'''
+        try:
+            rel = os.path.relpath(path, self.root)
+        except ValueError:      # other drive
+            return False
+        parts = Path(rel).parts
+        if not parts or parts[0] == '..' or len(parts) > self.depth:
+            return False
+        node = self.get(*parts[:-1])
+        if node is None:
+            return False
+        return node.child(parts[-1]) is not None or parts[-1].lower() in (f.lower() for f in node.files)
+
+    def mtimes(self) -> dict[str, int]:
+        '''{path: mtime_ns} of every listed directory, the root as -1 when missing'''
+        out: dict[str, int] = {}
+        stack = [self.node] if self.node else []
+        while stack:
+            node = stack.pop()
+            if node.mtime_ns < 0:   # below depth, never listed
+                continue
+            out[node.path] = node.mtime_ns
+            stack.extend(node.dirs.values())
+        if self.node is None:
+            out[self.root] = -1
+        return out
+
 
 @dataclass
 class StatusChecker:
@@ -17,11 +138,57 @@ class StatusChecker:
     idk how to make it flexible, so just hardcoded checking steps per current workflow.
     '''
     note: ExpNote
+    use_state: bool = True      # use done records in the pipeline state db whose outputs are on disk
 
     def __post_init__(self):
+        self.sync_tree = _DirTree(self.note.sync_path, SYNC_TREE_DEPTH)
+        self.ani_tree = _DirTree(self.note.getAniRoot(), ANI_TREE_DEPTH)
+        self._reindex()
+
+    def refresh(self, note: ExpNote | None = None) -> None:
+        '''
+        pick up changes on disk, relisting only directories whose mtime changed.
+        note: swap in another view of the same day (e.g. a filtered note)
+        '''
+        if note is not None and note.data_path != self.note.data_path:
+            raise ValueError(f'StatusChecker.refresh: {note} is not the same day as {self.note}')
+        if note is not None:
+            self.note = note
+        self.sync_tree.refresh()
+        self.ani_tree.refresh()
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self.state = self._index_state()
         self.dlc_msn = self._index_dlc_model_sets()
         self.ani_msn = self._index_ani_model_sets()
-    
+
+    def _index_state(self) -> dict[tuple[str, Stage], list[StageRecord]]:
+        '''
+        done records of this note whose outputs are all in the trees, one query.
+        {(daet_str, stage): [records]}
+        '''
+        if not self.use_state:
+            return {}
+        trees = {Stage.SYNC: self.sync_tree, Stage.DLC: self.sync_tree, Stage.ANIPOSE: self.ani_tree}
+        recs = queryState(animal=self.note.animal, date=self.note.date) or []
+        state: dict[tuple[str, Stage], list[StageRecord]] = {}
+        for r in recs:
+            tree = trees.get(r.stage)
+            if r.done and tree is not None and r.outputs and all(tree.has(o) for o in r.outputs):
+                state.setdefault((r.daet, r.stage), []).append(r)
+        return state
+
+    def _state_sets(self, daet: DAET, stage: Stage) -> list[str]:
+        return [r.model_set for r in self.state.get((str(daet), stage), [])]
+
+    def _state_done(self, daet: DAET, stage: Stage) -> bool:
+        return (str(daet), stage) in self.state
+
+    def dir_mtimes(self) -> dict[str, int]:
+        '''mtimes of all directories the checks are based on, to tell whether a cached result is stale'''
+        return {**self.sync_tree.mtimes(), **self.ani_tree.mtimes()}
+
     def check_sync_single_daet(self, daet: DAET) -> tuple[bool, str]:
         '''
         check if sync processing is complete for a single daet
@@ -29,75 +196,75 @@ class StatusChecker:
 
         if not daet in self.note.daets:
             raise ValueError(f'DAET {daet} not in ExpNote {self.note.animal} {self.note.date}')
-        
+
+        if self._state_done(daet, Stage.SYNC):
+            return True, '--'
+
         # redirect calib daet
         if daet.isCalib:
             return self.check_sync_calib(daet)
-        
-        sync_dir = self.note.getDaetSyncRoot(daet)
-        sub_dirs = self.note.getDaetSyncVidDirs(daet)
+
         groups = self.note.cam_config.evolved_groups
-        sub_dirs = {g: d for g, d in zip(groups, sub_dirs)}
 
         # get {group1: [cam1, cam2], group2: ... etc}
         cam_grouping = {
             g: [cam.name for cam in self.note.cam_config.cams if cam.group == g]
             for g in self.note.cam_config.evolved_groups
         }
-        
+
         status_texts = []
         stat = True
-        for grp, sub_dir in sub_dirs.items():
-            if not sub_dir.exists():
-                status_texts.append(f'Sync dir missing {sub_dir.name}')
+        for grp in groups:
+            sub_node = self.sync_tree.get(str(daet), grp.value)
+            if sub_node is None:
+                status_texts.append(f'Sync dir missing {grp.value}')
                 stat = False
                 continue
-            
-            files = list(sub_dir.glob('*.mp4'))
+
+            files = sub_node.filesWith('.mp4')
             if not files:
-                status_texts.append(f'No video files found in {sub_dir.name}')
+                status_texts.append(f'No video files found in {grp.value}')
                 stat = False
                 continue
 
             # Check if all cameras in the group have a corresponding video file
             for cam_name in cam_grouping[grp]:
-                for i, f in enumerate(files):
-                    fn = f.name
+                for i, fn in enumerate(files):
                     if cam_name.lower() in fn.lower() and str(daet).lower() in fn.lower():
                         files.pop(i)
                         break
-                else: 
+                else:
                     status_texts.append(f'{grp}::{cam_name} video not found')
                     stat = False
-            
+
             if files:   # not all consumed, then must be sth strange in the dir.
                 status_texts.append(
-                    f'{grp} unexpected videos found: {", ".join([f.name for f in files])}'
+                    f'{grp} unexpected videos found: {", ".join(files)}'
                 )
 
         stat_text = ', '.join(status_texts) if status_texts else '--'
         return stat, stat_text
-    
+
     def check_sync_calib(self, daet: DAET) -> tuple[bool, str]:
         '''
         check if sync processing is complete for a single daet, calib daet specific
         '''
         if not daet.isCalib:
             raise ValueError(f'DAET {daet} is not a calibration DAET')
-        sync_dir = self.note.getDaetSyncRoot(daet)
-        if not sync_dir.exists():
-            return False, f'Sync dir missing {sync_dir.name}'
-        
+        sync_node = self.sync_tree.get(str(daet))
+        if sync_node is None:
+            return False, f'Sync dir missing {daet}'
+
         cam_names = [cam.name for cam in self.note.cam_config.cams]
 
-        files = list(sync_dir.glob('*.mp4'))
+        files = sync_node.filesWith('.mp4')
         if not files:
-            return False, f'No video files found in {sync_dir.name}'
-        
+            return False, f'No video files found in {daet}'
+
         stat = True
         status_texts = []
         for cam_name in cam_names:
-            if not any(cam_name in file.name for file in files):
+            if not any(cam_name in f for f in files):
                 status_texts.append(f'Calib::{cam_name} video not found')
                 stat = False
         stat_text = '\n'.join(status_texts) if status_texts else '--'
@@ -113,75 +280,81 @@ class StatusChecker:
             results[daet] = (stat, text)
 
         return results
-    
+
     # DLC checker
-    def _index_dlc_model_sets(self) -> dict[DAET, str]:
+    def _index_dlc_model_sets(self) -> dict[DAET, list[str]]:
         '''
         list DLC model sets under the note's DLC directory
         '''
         msn = {}
         for daet in self.note.daets:
-            dlc_root = self.note.getDaetDlcRoot(daet)
-            if not dlc_root.exists():
+            if (recorded := self._state_sets(daet, Stage.DLC)):
+                msn[daet] = recorded
+                continue
+            dlc_node = self.sync_tree.get(str(daet), 'DLC')
+            if dlc_node is None:
                 msn[daet] = []
                 continue
-            model_sets = [
-                p.name for p in dlc_root.glob('*') 
-                if p.is_dir() and p.name.lower() != DLC_SEPARATE_DIR
+            msn[daet] = [
+                d.name for d in dlc_node.dirs.values()
+                if d.name.lower() != DLC_SEPARATE_DIR
             ]
-            msn[daet] = model_sets
 
         return msn
-    
+
     def check_dlc_single_daet(self, daet: DAET) -> tuple[bool, str]:
         if (msn:=self.dlc_msn.get(daet)):
             return True, ', '.join(msn)
         return False, 'No combined DLC results found'
-    
+
     def check_dlc_all_daets(self) -> dict[DAET, tuple[bool, str]]:
         results = {}
         for daet in self.note.daets:
             stat, text = self.check_dlc_single_daet(daet)
             results[daet] = (stat, text)
         return results
-    
+
     # anipose checker
     def _index_ani_model_sets(self) -> dict[str, list[DAET]]:
-        ani_root = self.note.getAniRoot()
-        if not ani_root.exists():
+        ani_node = self.ani_tree.node
+        if ani_node is None:
             return {}
-        model_sets = [
-            p.name for p in ani_root.glob('*') 
-            if p.is_dir() and p.name[-4:].isnumeric()   #TODO implement better MS matching logic
-        ]
         ms_dict = {}
-        for ms in model_sets:
+        for ms_node in ani_node.dirs.values():
+            if not ms_node.name[-4:].isnumeric():     #TODO implement better MS matching logic
+                continue
             daet_list = []
-            for daet_folder in (ani_root / ms).glob('*'):
-                if not daet_folder.is_dir():
-                    continue
+            for daet_node in ms_node.dirs.values():
                 try:
-                    daet = DAET.fromString(daet_folder.name)
+                    daet = DAET.fromString(daet_node.name)
                     daet_list.append(daet)
                 except ValueError:
                     continue
-            ms_dict[ms] = daet_list
+            ms_dict[ms_node.name] = daet_list
         return ms_dict
-    
+
+    def _ani_finished(self, daet: DAET, ms: str) -> bool:
+        csv_node = self.ani_tree.get(ms, str(daet), 'pose-3d')
+        return bool(csv_node and csv_node.filesWith('.csv'))
+
+    def ani_sets_single_daet(self, daet: DAET) -> dict[str, bool]:
+        '''{model set: finished} of every anipose model set that has this daet'''
+        sets = {ms: self._ani_finished(daet, ms)
+                for ms, daet_list in self.ani_msn.items() if daet in daet_list}
+        sets.update({ms: True for ms in self._state_sets(daet, Stage.ANIPOSE)})
+        return sets
+
     def check_ani_single_daet(self, daet: DAET) -> tuple[bool, str]:
-        def really_finished(daet: DAET, ms: str) -> bool:
-            csv_folder = self.note.getAniRoot() / ms / str(daet) / 'pose-3d'
-            for f in csv_folder.glob('*.csv'):
-                return True
-            return False
-        
+        if (recorded := self._state_sets(daet, Stage.ANIPOSE)):
+            return True, ', '.join(recorded)
+
         found_sets = []
         wip_sets = []
         if not self.ani_msn:
             return False, 'Empty anipose root dir'
         for ms, daet_list in self.ani_msn.items():
             if daet in daet_list:
-                if really_finished(daet, ms):
+                if self._ani_finished(daet, ms):
                     found_sets.append(ms)
                 else:
                     wip_sets.append(ms)
@@ -199,17 +372,21 @@ class StatusChecker:
             stat, text = self.check_ani_single_daet(daet)
             results[daet] = (stat, text)
         return results
-    
+
     # anipose video status checker:
     # label-3d and label-combined
+    def _daet_video(self, vid_node: _DirNode, daet_name: str) -> str | None:
+        for f in vid_node.filesWith('.mp4'):
+            if daet_name.lower() in f.lower():
+                return f
+        return None
+
     def check_ani_vid_3d_single_daet_single_ms(self, daet: DAET, model_set: str) -> tuple[bool, str]:
-        ani_root = self.note.getAniRoot()
-        vid_3d_dir = ani_root / model_set / str(daet) / 'videos-3d'
-        if not vid_3d_dir.exists():
+        vid_3d_node = self.ani_tree.get(model_set, str(daet), 'videos-3d')
+        if vid_3d_node is None:
             return False, f'No videos-3d dir'
-        for f in vid_3d_dir.glob('*.mp4'):
-            if str(daet).lower() in f.name.lower():
-                return True, f.name
+        if (f := self._daet_video(vid_3d_node, str(daet))):
+            return True, f
         return False, 'videos-3d dir exists but no match video found'
 
     def check_ani_vid_3d_all_daets_single_ms(self, model_set: str) -> dict[DAET, tuple[bool, str]]:
@@ -220,16 +397,14 @@ class StatusChecker:
         return results
 
     def check_ani_vid_combined_single_daet_single_ms(self, daet: DAET, model_set: str) -> tuple[bool, str]:
-        ani_root = self.note.getAniRoot()
-        daet_root = ani_root / model_set / str(daet)
-        if not daet_root.exists():
+        daet_node = self.ani_tree.get(model_set, str(daet))
+        if daet_node is None:
             return False, f'No DAET dir'
-        vid_combined_dir = daet_root / 'videos-combined'
-        if not vid_combined_dir.exists():
+        vid_combined_node = daet_node.child('videos-combined')
+        if vid_combined_node is None:
             return False, f'No videos-combined dir'
-        for f in vid_combined_dir.glob('*.mp4'):
-            if str(daet).lower() in f.name.lower():
-                return True, f.name
+        if (f := self._daet_video(vid_combined_node, str(daet))):
+            return True, f
         return False, 'videos-combined dir exists but no match video found'
 
     def check_ani_vid_combined_all_daets_single_ms(self, model_set: str) -> dict[DAET, tuple[bool, str]]:
@@ -238,41 +413,35 @@ class StatusChecker:
             stat, text = self.check_ani_vid_combined_single_daet_single_ms(daet, model_set)
             results[daet] = (stat, text)
         return results
-    
+
     def check_ani_vid_3d_all_ms(self) -> dict[str, bool]:
         results = {}
         for ms in self.ani_msn.keys():
             res = self.check_ani_vid_3d_all_daets_single_ms(ms)
             results[ms] = all([r[0] for r in res.values()])
         return results
-    
+
     def check_ani_vid_combined_all_ms(self) -> dict[str, bool]:
         results = {}
         for ms in self.ani_msn.keys():
             res = self.check_ani_vid_combined_all_daets_single_ms(ms)
             results[ms] = all([r[0] for r in res.values()])
         return results
-    
+
     def check_ani_vid_combined_simple_all_ms(self) -> dict[str, bool]:
         results = {}
-        ani_root = self.note.getAniRoot()
         for ms in self.ani_msn.keys():
-            ms_dir = ani_root / ms
+            ms_node = self.ani_tree.get(ms)
             results[ms] = True
-            for daet_dir in ms_dir.glob('*'):
-                if not DAET.isDaet(daet_dir.name):
+            if ms_node is None:
+                continue
+            for daet_node in ms_node.dirs.values():
+                if not DAET.isDaet(daet_node.name):
                     continue
-                if DAET.fromString(daet_dir.name).isCalib:
+                if DAET.fromString(daet_node.name).isCalib:
                     continue
-                vid_combined_dir = daet_dir / 'videos-combined'
-                if not vid_combined_dir.exists():
-                    results[ms] = False
-                    break
-                for f in vid_combined_dir.glob('*.mp4'):
-                    if str(daet_dir.name).lower() in f.name.lower():
-                        results[ms] = True
-                        break
-                else:
+                vid_combined_node = daet_node.child('videos-combined')
+                if vid_combined_node is None or not self._daet_video(vid_combined_node, daet_node.name):
                     results[ms] = False
                     break
 
@@ -12,6 +12,7 @@ from pathlib import Path
 from dataclasses import dataclass, field
 from typing import Optional, Sequence
 import warnings
+from concurrent.futures import ProcessPoolExecutor
 
 from ..utils import VidSyncLED as SyncLED
 from ..utils import vid_sync_aud_new as SyncAud
@@ -23,6 +24,7 @@ from .fileOp import dataSetup
 from .daet import DAET
 from .config import Config
 from .sync_worker import process_videos
+from .pipelineState import Stage, StageStatus, recordStage, queryState, hashInputs, hashValue
 
 logger = logging.getLogger(__name__)
 
@@ -34,14 +36,21 @@ class SyncConfig:
     audio_fps: float = 119.88
     audio_sample_rate: int = 48000
     audio_save_duration: int = 10
+    audio_max_lag_sec: float | None = None  # bound on camera start offset (s). None = full-length xcorr
     
     # LED sync settings
     led_threshold: int = 175
+    led_engine: str = 'cv2'     # key of VidSyncLED.LED_ENGINES. 'ffpipe' = ROI-only pipe, not yet checked on real clips
+    led_workers: int = 1        # >1: detect all cameras (and DAETs in syncAll) in a process pool
     cross_validation_threshold: int = 5  # max tolerable error between audio and LED
     
     # video settings
     video_extension: str = 'mp4'
     output_size: list[int] = field(default_factory=lambda: [1920, 1080])
+    encode_mode: str = 'sequential'   # sync_worker.process_videos mode: sequential | concurrent | multi
+    encode_nvenc_jobs: int = 2        # concurrent mode: max NVENC sessions. 0 = cpu only (concurrent and multi)
+    encode_cpu_jobs: int = 2          # concurrent mode: max libx264 jobs
+    trim_stream_copy: bool = False    # -c copy cameras starting on a keyframe with no resize, else encode
     
     # processing flags
     override_existing: bool = False
@@ -161,10 +170,18 @@ class VidSynchronizer:
                         logger.error(f"Failed processing {k}: Audio sync failed criteria")
                         audio_results.pop(k)
 
+                # LED detection for all targets at once when running a pool
+                led_prefetch: dict[DAET, list[int | None]] = {}
+                if self._useLEDPool():
+                    led_prefetch = self._detectLEDStartsMany({
+                        daet: (self._getVideoPaths(daet), self.notes.getVidSetIdx(daet))
+                        for daet in detection_daets
+                    })
+
                 # LED sync and cross-validation for detection targets
                 for daet in detection_daets:
                     try:
-                        result = self._runLEDSync(daet, audio_results.get(daet, []))
+                        result = self._runLEDSync(daet, audio_results.get(daet, []), led_prefetch.get(daet))
                         results.append(result)
                     except Exception as e:
                         self.wood.logger.error(f"Failed processing {daet}: {e}")
@@ -208,6 +225,7 @@ class VidSynchronizer:
                         fps=self.config.audio_fps,
                         duration=self.config.audio_test_duration,
                         start=0,
+                        max_lag_sec=self.config.audio_max_lag_sec,
                         manual_fallback=True,
                     )
                     
@@ -236,8 +254,10 @@ class VidSynchronizer:
         
         return audio_results
     
-    def _runLEDSync(self, daet: DAET, audio_starts: list[int]) -> SyncResult:
-        """**single** DAET LED detection and cross-validation"""
+    def _runLEDSync(self, daet: DAET, audio_starts: list[int], 
+                    led_starts: list[int | None] | None = None) -> SyncResult:
+        """**single** DAET LED detection and cross-validation.
+        led_starts: already detected starts (e.g. from a pooled batch), skips detection"""
         try:
             sync_folder = self._getSyncFolder(daet)
             sync_folder.mkdir(parents=True, exist_ok=True)
@@ -254,7 +274,8 @@ class VidSynchronizer:
                 )
             
             # LED detection
-            led_starts = self._detectLEDStarts(daet, vid_paths, vid_set)
+            if led_starts is None:
+                led_starts = self._detectLEDStarts(daet, vid_paths, vid_set)
             
             # cross-validation
             corrected_starts, validation_status, message = self._crossValidate(
@@ -280,6 +301,11 @@ class VidSynchronizer:
                 config_path = self._createSyncConfig(daet, vid_paths, vid_set, corrected_starts)
                 # mark as processed
                 (sync_folder / '.skipDet').touch()
+                recordStage(daet, Stage.SYNC_DETECT, StageStatus.DONE,
+                            input_hash=hashInputs(vid_paths), outputs=[config_path],
+                            message=str(message or ''))
+            else:
+                recordStage(daet, Stage.SYNC_DETECT, StageStatus.FAILED, message=str(message or ''))
             
             return SyncResult(
                 daet=daet,
@@ -292,6 +318,7 @@ class VidSynchronizer:
             )
             
         except Exception as e:
+            recordStage(daet, Stage.SYNC_DETECT, StageStatus.FAILED, message=f'LED detection error: {e}')
             return SyncResult(
                 daet=daet, led_starts=[], audio_starts=audio_starts,    #type:ignore
                 corrected_starts=[], status='failed',
@@ -301,55 +328,128 @@ class VidSynchronizer:
     def _detectLEDStarts(self, daet: DAET, vid_paths: list[Path], vid_set: list[int | None]) -> list[int | None]:
         """Detect LED start frames for each camera"""
         logger.info(f'Detecting LED for {daet}')
-        led_starts = []
+        results = self._detectLEDStartsMany({daet: (vid_paths, vid_set)})
+        if daet not in results:
+            raise RuntimeError(f'LED detection setup failed for {daet}')
+        return results[daet]
+
+    def _useLEDPool(self) -> bool:
+        if self.config.led_workers <= 1:
+            return False
+        if self.config.led_engine not in SyncLED.LED_SCANS:
+            logger.warning(f'no pooled scan for LED engine {self.config.led_engine}, running serially')
+            return False
+        return True
+
+    def _planLEDJobs(self, daet: DAET, vid_paths: list[Path], vid_set: list[int | None]) -> list[int | None | tuple]:
+        """per camera: a final value (None = problematic, -1 = calib) or the engine args to run"""
+        plan: list[int | None | tuple] = []
         row = self.notes.getRow(daet)
         is_calib = row['is_calib'] if row is not None else False
         
         for cam_idx, (vid_path, vid_id) in enumerate(zip(vid_paths, vid_set)):
             if vid_id is None or not vid_path.exists():
-                led_starts.append(None)
+                plan.append(None)
                 continue
                 
             cam_num = cam_idx + 1
             if cam_num not in self.cam_config.rois:
                 self.wood.logger.warning(f"No ROI config for cam{cam_num}, skipping LED detection")
-                led_starts.append(None)
+                plan.append(None)
                 continue
             
-            try:
-                if is_calib:
-                    # skip LED detection for calibration
-                    led_starts.append(-1)
-                else:
-                    roi = self.cam_config.rois[cam_num]
-                    led_color = self.cam_config.cams_dict[cam_num].led_color.value
-                    if led_color is None:
-                        logger.error(f'Wrong LED color!! {led_color}')
-                        continue
-
-                    sync_detection_path = self._getSyncDetectionPath()
-    
-                    logger.debug(f'Starting detection {str(vid_path)=}, {roi=}, {self.config.led_threshold=}, \
-                        {led_color=}, {str(sync_detection_path)=}')
-                    
-                    with warnings.catch_warnings():
-                        warnings.filterwarnings(
-                            "ignore", 
-                            message="Starting a Matplotlib GUI outside of the main thread"
-                        )
-                        start_frame = SyncLED.find_start_frame(
-                            str(vid_path), roi, self.config.led_threshold, 
-                            led_color, str(sync_detection_path)
-                        )
+            if is_calib:
+                # skip LED detection for calibration
+                plan.append(-1)
+                continue
 
-                    led_starts.append(start_frame)
-                    logger.info(f'Detection found LED on frame {start_frame}')
-                    
+            try:
+                roi = self.cam_config.rois[cam_num]
+                led_color = self.cam_config.cams_dict[cam_num].led_color.value
             except Exception as e:
                 self.wood.logger.warning(f"LED detection failed for {daet} cam{cam_num}: {e}")
-                led_starts.append(None)  # problematic detection
+                plan.append(None)
+                continue
+            if led_color is None:
+                logger.error(f'Wrong LED color!! {led_color}')
+                plan.append(None)
+                continue
+
+            plan.append((str(vid_path), roi, self.config.led_threshold, led_color))
         
-        return led_starts
+        return plan
+
+    def _detectLEDStartsMany(self, vid_sets: dict[DAET, tuple[list[Path], list[int | None]]]) -> dict[DAET, list[int | None]]:
+        """LED start frames for several DAETs. results keep camera order, a failed camera gives None.
+        in pool mode detection runs in worker processes and the diagnostics are drawn here."""
+        plans: dict[DAET, list] = {}
+        for daet, (vid_paths, vid_set) in vid_sets.items():
+            try:
+                plans[daet] = self._planLEDJobs(daet, vid_paths, vid_set)
+            except Exception as e:
+                self.wood.logger.warning(f"LED detection setup failed for {daet}: {e}")
+
+        sync_detection_path = str(self._getSyncDetectionPath())
+        results: dict[DAET, list[int | None]] = {}
+
+        if not self._useLEDPool():
+            find_start_frame = SyncLED.LED_ENGINES[self.config.led_engine]
+            for daet, plan in plans.items():
+                led_starts = []
+                for cam_idx, job in enumerate(plan):
+                    if not isinstance(job, tuple):
+                        led_starts.append(job)
+                        continue
+                    logger.debug(f'Starting detection {job=}, {sync_detection_path=}')
+                    try:
+                        with warnings.catch_warnings():
+                            warnings.filterwarnings(
+                                "ignore", 
+                                message="Starting a Matplotlib GUI outside of the main thread"
+                            )
+                            start_frame = find_start_frame(*job, sync_detection_path)
+                        led_starts.append(start_frame)
+                        logger.info(f'Detection found LED on frame {start_frame}')
+                    except Exception as e:
+                        self.wood.logger.warning(f"LED detection failed for {daet} cam{cam_idx + 1}: {e}")
+                        led_starts.append(None)  # problematic detection
+                results[daet] = led_starts
+            return results
+
+        n_jobs = sum(isinstance(job, tuple) for plan in plans.values() for job in plan)
+        logger.info(f'Detecting LED for {len(plans)} entries, {n_jobs} videos on {self.config.led_workers} workers')
+        with ProcessPoolExecutor(max_workers=self.config.led_workers) as pool:
+            futures = {
+                (daet, cam_idx): pool.submit(SyncLED.led_pool_job, Config.ffmpeg_path, Config.ffprobe_path,
+                                             self.config.led_engine, *job)
+                for daet, plan in plans.items()
+                for cam_idx, job in enumerate(plan) if isinstance(job, tuple)
+            }
+            for daet, plan in plans.items():
+                led_starts = []
+                for cam_idx, job in enumerate(plan):
+                    if not isinstance(job, tuple):
+                        led_starts.append(job)
+                        continue
+                    try:
+                        start, max_values, onset = futures[(daet, cam_idx)].result()
+                        if start is None:
+                            led_starts.append(-1)
+                            continue
+                        path, roi, threshold, led_color = job
+                        try:
+                            SyncLED.save_detection_result(path, tuple(roi), threshold, led_color,
+                                                          max_values, start, sync_detection_path, onset)
+                        except Exception as e:
+                            logger.warning(f'LED detection plot not saved for {daet} cam{cam_idx + 1}: {e}')
+                        led_starts.append(start + 1)
+                        logger.info(f'Detection found LED on frame {start + 1}')
+                    except Exception as e:
+                        self.wood.logger.warning(f"LED detection failed for {daet} cam{cam_idx + 1}: {e}")
+                        led_starts.append(None)  # problematic detection
+                results[daet] = led_starts
+
+        return results
     
     def _crossValidate(self, led_starts: list[int | None], 
                     audio_starts: list[int]) -> tuple[list[int | None]| None, Optional[int], str]:
@@ -525,12 +625,13 @@ class VidSynchronizer:
             return
             
         with self.wood.log('VideoSync', f'{len(daets)} entries'):
+            stale = self._stateStale(Stage.SYNC)
             for daet in daets:
                 try:
                     sync_folder = self._getSyncFolder(daet)
                     skip_sync_file = sync_folder / '.skipSync'
                     
-                    if skip_sync_file.exists() and not self.config.override_existing:
+                    if not self.config.override_existing and skip_sync_file.exists() and str(daet) not in stale:
                         self.wood.logger.info(f"Skipping sync: {daet} (already synced)")
                         continue
                     
@@ -547,35 +648,48 @@ class VidSynchronizer:
                         config = json.load(f)
                     
                     # SyncLED.process_videos(config)
-                    process_videos(config, animal=daet.animal)
+                    process_videos(
+                        config, animal=daet.animal,
+                        mode=self.config.encode_mode,
+                        max_nvenc=self.config.encode_nvenc_jobs,
+                        max_cpu=self.config.encode_cpu_jobs,
+                        stream_copy=self.config.trim_stream_copy,
+                    )
                     skip_sync_file.touch()
+                    recordStage(daet, Stage.SYNC, StageStatus.DONE,
+                                input_hash=hashValue(config), outputs=syncOutputs(config))
                     
                     self.wood.logger.info(f"Synced: {daet}")
                     
                 except Exception as e:
                     self.wood.logger.error(f"Failed syncing {daet}: {e}")
+                    recordStage(daet, Stage.SYNC, StageStatus.FAILED, message=str(e))
 
     # === Helper Methods ===
-    def _getTargetDaets(self, task: Task, skip_existing: bool) -> list[DAET]:
-        """Get DAETs that need processing"""
+    def _getTargetDaets(self, task: Task, skip_existing: bool,
+                        daets: list[DAET] | None = None) -> list[DAET]:
+        """Get DAETs that need processing. daets: check only these instead of the note's"""
         # filter by task
-        if task == Task.ALL:
+        if daets is not None:
+            candidates = daets
+        elif task == Task.ALL:
             candidates = self.notes.getValidDaets(min_videos=2)
         else:
             task_df = self.notes.filterByTask(task)
-            candidates = [daet for daet in task_df['daet'].tolist() 
-                        if daet in self.notes.getValidDaets(min_videos=2)]
+            valid = set(self.notes.getValidDaets(min_videos=2))
+            candidates = [daet for daet in task_df['daet'].tolist() if daet in valid]
         
         if not skip_existing:
             return candidates
             
-        # filter out entries that need detection (no .skipDet file)
+        # filter out entries that need detection (no .skipDet file, or recorded outputs gone)
+        stale = self._stateStale(Stage.SYNC_DETECT)
         target_daets = []
         for daet in candidates:
             sync_folder = self._getSyncFolder(daet)
             skip_det_file = sync_folder / '.skipDet'
             
-            if skip_det_file.exists() and not self.config.override_existing:
+            if not self.config.override_existing and skip_det_file.exists() and str(daet) not in stale:
                 self.wood.logger.info(f"Skipping detection for: {daet} (already detected)")
             else:
                 target_daets.append(daet)
@@ -589,20 +703,30 @@ class VidSynchronizer:
             candidates = self.notes.getValidDaets(min_videos=2)
         else:
             task_df = self.notes.filterByTask(task)
-            candidates: list[DAET] = [daet for daet in task_df['daet'].tolist() 
-                                      if daet in self.notes.getValidDaets(min_videos=2)]
+            valid = set(self.notes.getValidDaets(min_videos=2))
+            candidates: list[DAET] = [daet for daet in task_df['daet'].tolist() if daet in valid]
         
+        stale = self._stateStale(Stage.SYNC_DETECT)
         detected_daets: list[DAET] = []
         for daet in candidates:
             sync_folder = self._getSyncFolder(daet)
             skip_det_file = sync_folder / '.skipDet'
             
-            if skip_det_file.exists():
+            if skip_det_file.exists() and str(daet) not in stale:
                 # has detection results
                 detected_daets.append(daet)
         
         return detected_daets
     
+    def _stateStale(self, stage: Stage) -> set[str]:
+        '''daets of this note recorded done for stage under this data root, whose
+        recorded outputs are gone since. the marker files decide the rest, a db row
+        never skips anything on its own'''
+        recs = queryState(animal=self.notes.animal, date=self.notes.date,
+                          stage=stage, status=StageStatus.DONE) or []
+        root = self.notes.data_path
+        return {r.daet for r in recs if r.under(root) and r.missing()}
+
     def _getSyncFolder(self, daet: DAET) -> Path:
         return self.notes.getDaetSyncRoot(daet)
     
@@ -657,4 +781,10 @@ def syncVideos(notes: ExpNote, cam_cfg: CamConfig|None = None,
     # run sync detection
     results = synchronizer.syncAll(task)
     
-    return results
\ No newline at end of file
+    return results
+
+
+def syncOutputs(config: dict) -> list[Path]:
+    '''trimmed video paths a sync config writes'''
+    output_dir = Path(config.get('output_dir', 'output'))
+    return [output_dir / v['output_name'] for v in config.get('videos', [])]
\ No newline at end of file
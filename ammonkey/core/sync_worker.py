@@ -9,12 +9,19 @@ Usage eg
     from sync_worker import process_videos
     process_videos(sync_cfg)                     # use defaults
     process_videos(sync_cfg, animal='pepe')      # use vid-quality override for pepe
+    process_videos(sync_cfg, mode='concurrent', max_nvenc=2, max_cpu=4)
+    process_videos(sync_cfg, mode='multi')       # one ffmpeg decode per camera set
+    process_videos(sync_cfg, stream_copy=True)   # -c copy where start frame is a keyframe
 """
 
-import os, subprocess, time, logging
+import os, json, subprocess, time, logging, threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Callable
 
 from .config import Config
+from ..utils import vid_meta
 
 lg = logging.getLogger(__name__)
 
@@ -81,27 +88,71 @@ def _validate_flags(flags: list) -> None:
 # ---------------------------------------------------------------------------
 # probe
 # ---------------------------------------------------------------------------
-def get_video_info(path: str) -> tuple[int, float]:
+def get_video_info(path: str, use_cache: bool = True) -> tuple[int, float]:
+    """(nb_frames, fps), via the persistent metadata cache"""
+    return vid_meta.get_video_info(path, Config.ffprobe_path, use_cache)
+
+
+def _probe_keyframe(path: str, start_frame: int, fps: float) -> tuple[tuple[int, int], float | None]:
+    """
+    (width, height) of the first video stream, and the time of start_frame
+    relative to stream start if that frame is a keyframe, else None.
+    only packets around start_frame are read, nothing is decoded.
+    """
+    t = start_frame / fps
     cmd = [
         Config.ffprobe_path, '-v', 'error',
         '-select_streams', 'v:0',
-        '-show_entries', 'stream=nb_frames,r_frame_rate',
-        '-of', 'csv=p=0',
+        '-read_intervals', f'{max(0.0, t - 1):.6f}%+2',
+        '-show_entries', 'stream=width,height,start_time:packet=pts_time,flags',
+        '-of', 'json',
         path,
     ]
     try:
-        frame_rate, nb_frames = subprocess.check_output(cmd).decode().strip().split(',')
-        if nb_frames == 'N/A':
-            raise NotImplementedError(f"nb_frames returns N/A for {path}")
-        fps = eval(frame_rate)
-        return int(nb_frames), fps
+        info = json.loads(subprocess.check_output(cmd))
+        stream = info['streams'][0]
+        size = (int(stream['width']), int(stream['height']))
+        start = stream.get('start_time')
+        t0 = float(start) if start not in (None, '', 'N/A') else 0.0
     except Exception as e:
         raise RuntimeError(f"ffprobe failed on {path}: {e}")
 
+    for pkt in info.get('packets', []):
+        if 'K' not in pkt.get('flags', '') or pkt.get('pts_time') in (None, 'N/A'):
+            continue
+        rel = float(pkt['pts_time']) - t0
+        if abs(rel * fps - start_frame) < 0.5:
+            return size, rel
+    return size, None
+
 
 # ---------------------------------------------------------------------------
 # command builder
 # ---------------------------------------------------------------------------
+def _enc_flags(gpu: bool, quality_override: list | None) -> tuple[list[str], bool]:
+    """resolve + validate encoding flags. returns (flags, is_nvenc)"""
+    if quality_override is not None:
+        enc_flags = [str(f) for f in quality_override]
+        # keep faststart if override doesn't specify movflags
+        if '-movflags' not in enc_flags:
+            enc_flags += ['-movflags', '+faststart']
+    else:
+        enc_flags = list(_GPU_DEFAULTS if gpu else _CPU_DEFAULTS)
+
+    _validate_flags(enc_flags)
+
+    # pick vf based on actual codec, not the gpu hint
+    pairs = _parse_flag_pairs(enc_flags)
+    codec = pairs.get('-c:v', '')
+    return enc_flags, 'nvenc' in codec
+
+
+def _scale_filter(is_nvenc: bool, output_size: tuple[int, int]) -> str:
+    if is_nvenc:
+        return f"hwupload_cuda,scale_cuda={output_size[0]}:{output_size[1]}"
+    return f"scale={output_size[0]}:{output_size[1]}"
+
+
 def _build_cmd(
     input_path: str,
     output_path: str,
@@ -118,25 +169,8 @@ def _build_cmd(
         ['-c:v', 'h264_nvenc', '-cq', '19', '-maxrate', '40M', '-bufsize', '80M']
         Replaces the entire encoding section. Must include -c:v.
     """
-    if quality_override is not None:
-        enc_flags = [str(f) for f in quality_override]
-        # keep faststart if override doesn't specify movflags
-        if '-movflags' not in enc_flags:
-            enc_flags += ['-movflags', '+faststart']
-    else:
-        enc_flags = list(_GPU_DEFAULTS if gpu else _CPU_DEFAULTS)
-
-    _validate_flags(enc_flags)
-
-    # pick vf based on actual codec, not the gpu hint
-    pairs = _parse_flag_pairs(enc_flags)
-    codec = pairs.get('-c:v', '')
-    is_nvenc = 'nvenc' in codec
-
-    if is_nvenc:
-        vf = f"hwupload_cuda,scale_cuda={output_size[0]}:{output_size[1]}"
-    else:
-        vf = f"scale={output_size[0]}:{output_size[1]}"
+    enc_flags, is_nvenc = _enc_flags(gpu, quality_override)
+    vf = _scale_filter(is_nvenc, output_size)
 
     cmd = [
         Config.ffmpeg_path,
@@ -151,6 +185,250 @@ def _build_cmd(
     return cmd
 
 
+def _build_copy_cmd(
+    input_path: str,
+    output_path: str,
+    key_time: float,
+    output_frames: int,
+) -> list[str]:
+    """
+    stream copy trim. only frame exact when key_time is a keyframe: input
+    seek lands on the last keyframe at or before -ss, hence the small nudge
+    past key_time to survive rounding.
+    """
+    return [
+        Config.ffmpeg_path,
+        '-y',
+        '-ss', f'{key_time + 1e-4:.6f}',
+        '-i', input_path,
+        '-map', '0:v:0', '-map', '0:a?',
+        '-frames:v', str(output_frames),
+        '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero',
+        '-movflags', '+faststart',
+        str(output_path),
+    ]
+
+
+def _build_multi_cmd(
+    jobs: list[dict],
+    output_frames: int,
+    output_size: tuple[int, int],
+    gpu: bool,
+    quality_override: list | None = None,
+) -> list[str]:
+    """
+    One ffmpeg for a whole camera set: every input is decoded once, trimmed
+    with trim=start_frame (frame exact) and encoded to its own output.
+    jobs: dicts with input_path, output_path, start_frame, fps.
+    Audio is kept like in _build_cmd: each input's audio (if any) is cut with
+    atrim over the same span as its video, output seeking would also cut the
+    already trimmed video.
+    """
+    enc_flags, is_nvenc = _enc_flags(gpu, quality_override)
+    vf = _scale_filter(is_nvenc, output_size)
+
+    cmd = [Config.ffmpeg_path, '-y', '-nostdin']
+    for j in jobs:
+        cmd += ['-i', j['input_path']]
+    # end_frame in the graph, not -frames:v per output: an output closing early
+    # would stall the shared graph and truncate the others
+    graph = ';'.join(
+        f"[{i}:v]trim=start_frame={j['start_frame']}:end_frame={j['start_frame'] + output_frames},"
+        f"setpts=PTS-STARTPTS,{vf}[v{i}]"
+        for i, j in enumerate(jobs)
+    )
+    cmd += ['-filter_complex', graph]
+    for i, j in enumerate(jobs):
+        # trim drops the stream frame rate; without -r the encoder falls back to 25 fps and drops frames
+        start, duration = j['start_frame'] / j['fps'], output_frames / j['fps']
+        cmd += ['-map', f'[v{i}]', '-r', f"{j['fps']:.6f}",
+                '-map', f'{i}:a?', '-af', f'atrim=start={start:.6f}:duration={duration:.6f},asetpts=PTS-STARTPTS',
+                *enc_flags, str(j['output_path'])]
+    return cmd
+
+
+# ---------------------------------------------------------------------------
+# runners
+# ---------------------------------------------------------------------------
+class _Cancelled(RuntimeError):
+    """camera skipped because another camera of the set already failed"""
+
+
+def _partial_path(output_path: str | Path) -> Path:
+    """temp name in the same folder, keeps the extension so ffmpeg picks the muxer"""
+    p = Path(output_path)
+    return p.with_name(f'{p.stem}.partial{p.suffix}')
+
+
+def _run_logged(cmd: list[str], tag: str,
+                on_start: Callable[[subprocess.Popen], None] | None = None) -> None:
+    """run ffmpeg, streaming its stderr to the log line by line. raises on non zero exit"""
+    proc = subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE, text=True, errors='replace',   # text mode also splits \r progress lines
+    )
+    if on_start is not None:
+        on_start(proc)
+    tail: deque[str] = deque(maxlen=5)
+    assert proc.stderr is not None
+    for line in proc.stderr:
+        line = line.rstrip()
+        if line:
+            tail.append(line)
+            lg.debug(f'[{tag}] {line}')
+    rc = proc.wait()
+    if rc != 0:
+        raise RuntimeError(f"ffmpeg exited {rc} for {tag}: {' | '.join(tail)}")
+
+
+def _try_stream_copy(
+    input_path: str,
+    output_path: str | Path,
+    start_frame: int,
+    fps: float,
+    output_frames: int,
+    output_size: tuple[int, int],
+) -> bool:
+    """
+    fast path: stream copy when no resize is needed and start_frame is a
+    keyframe. the result is checked with ffprobe; anything unexpected removes
+    the output and returns False so the caller encodes as usual.
+    """
+    name = os.path.basename(input_path)
+    try:
+        size, key_time = _probe_keyframe(input_path, start_frame, fps)
+        if size != tuple(output_size):
+            lg.debug(f"{name}: {size[0]}x{size[1]} needs scaling, no stream copy")
+            return False
+        if key_time is None:
+            lg.debug(f"{name}: start frame {start_frame} is not a keyframe, no stream copy")
+            return False
+        subprocess.run(_build_copy_cmd(input_path, str(output_path), key_time, output_frames),
+                       check=True, stdin=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        n_frames, _ = get_video_info(str(output_path), use_cache=False)
+        if n_frames != output_frames:
+            raise RuntimeError(f"got {n_frames} frames, expected {output_frames}")
+    except Exception as e:
+        lg.warning(f"Stream copy failed for {name}: {e}, encoding instead")
+        Path(output_path).unlink(missing_ok=True)
+        return False
+    lg.info(f"Stream copied -> {Path(output_path).stem}")
+    return True
+
+
+def _commit_outputs(partials: dict[Path, Path]) -> None:
+    for tmp, final in partials.items():
+        os.replace(tmp, final)
+
+
+def _discard_outputs(partials: dict[Path, Path]) -> None:
+    for tmp in partials:
+        try:
+            tmp.unlink(missing_ok=True)
+        except OSError as e:
+            lg.warning(f"Could not remove partial output {tmp}: {e}")
+
+
+def _encode_concurrent(jobs: list[dict], max_nvenc: int, max_cpu: int) -> None:
+    """
+    encode all cameras at once, at most max_nvenc NVENC sessions and max_cpu
+    libx264/x265 jobs in flight. each camera tries gpu then cpu like the
+    sequential path; max_nvenc 0 means no gpu, everything runs on the cpu slots.
+    atomic: outputs are written to .partial files and only renamed once every
+    camera succeeded; the first failure kills the rest.
+    """
+    if max_nvenc <= 0:
+        nvenc_only = [Path(j['output_path']).stem for j in jobs if _enc_flags(False, j['quality_override'])[1]]
+        if nvenc_only:
+            raise ValueError(f"max_nvenc is 0 but the quality override encodes with nvenc: {nvenc_only}")
+    nv_slots = threading.BoundedSemaphore(max_nvenc) if max_nvenc > 0 else None
+    cpu_slots = threading.BoundedSemaphore(max(1, max_cpu))
+    abort = threading.Event()
+    procs: list[subprocess.Popen] = []
+    procs_lock = threading.Lock()
+    partials = {_partial_path(j['output_path']): Path(j['output_path']) for j in jobs}
+
+    def _track(proc: subprocess.Popen) -> None:
+        with procs_lock:
+            procs.append(proc)
+            if abort.is_set():
+                proc.kill()
+
+    def _one(job: dict) -> None:
+        tag = Path(job['output_path']).stem
+        args = {**job, 'output_path': str(_partial_path(job['output_path']))}
+        attempts = [True, False] if max_nvenc > 0 else [False]
+        for gpu in attempts:
+            if abort.is_set():
+                raise _Cancelled(tag)
+            cmd = _build_cmd(**args, gpu=gpu)       #type: ignore
+            _, is_nvenc = _enc_flags(gpu, job['quality_override'])
+            slots = nv_slots if is_nvenc and nv_slots is not None else cpu_slots
+            try:
+                with slots:
+                    lg.info(f"Trimming -> {tag} ({'nvenc' if is_nvenc else 'cpu'})")
+                    _run_logged(cmd, tag, on_start=_track)
+                return
+            except Exception as e:
+                if abort.is_set():
+                    raise _Cancelled(tag)
+                if gpu:
+                    lg.warning(f"nvenc failed for {tag}: {e}, falling back to cpu")
+                    continue
+                raise RuntimeError(f"ffmpeg failed for {job['input_path']}: {e}")
+
+    errors: list[Exception] = []
+    with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = [pool.submit(_one, j) for j in jobs]
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+            except Exception as e:
+                errors.append(e)
+                if not abort.is_set():
+                    abort.set()
+                    with procs_lock:
+                        for p in procs:
+                            if p.poll() is None:
+                                p.kill()
+
+    if errors:
+        _discard_outputs(partials)
+        # first real error, not the cancellations it caused
+        raise next((e for e in errors if not isinstance(e, _Cancelled)), errors[0])
+    _commit_outputs(partials)
+
+
+def _encode_multi(jobs: list[dict], output_frames: int, output_size: tuple[int, int],
+                  quality_override: list | None, max_nvenc: int = 2) -> None:
+    """
+    single ffmpeg process for all cameras, gpu then cpu. max_nvenc 0 means no
+    gpu, straight to the cpu command. atomic like _encode_concurrent
+    """
+    if max_nvenc <= 0 and _enc_flags(False, quality_override)[1]:
+        raise ValueError(f"max_nvenc is 0 but the quality override encodes with nvenc: {quality_override}")
+    partials = {_partial_path(j['output_path']): Path(j['output_path']) for j in jobs}
+    tmp_jobs = [{**j, 'output_path': str(_partial_path(j['output_path']))} for j in jobs]
+    tag = f"{len(jobs)} outputs"
+    attempts = [True, False] if max_nvenc > 0 else [False]
+    try:
+        for gpu in attempts:
+            cmd = _build_multi_cmd(tmp_jobs, output_frames, output_size, gpu, quality_override)
+            try:
+                lg.info(f"Trimming -> {tag} (single process, {'nvenc' if gpu else 'cpu'})")
+                _run_logged(cmd, tag)
+                break
+            except Exception as e:
+                if not gpu:
+                    raise
+                lg.warning(f"nvenc failed: {e}, falling back to cpu")
+    except Exception as e:
+        _discard_outputs(partials)
+        raise RuntimeError(f"ffmpeg failed for camera set: {e}")
+    _commit_outputs(partials)
+
+
 # ---------------------------------------------------------------------------
 # pipeline
 # ---------------------------------------------------------------------------
@@ -159,6 +437,10 @@ def process_videos(
     *,
     animal: str | None = None,
     debug: bool = False,
+    mode: str = 'sequential',
+    max_nvenc: int = 2,
+    max_cpu: int = 2,
+    stream_copy: bool = False,
 ) -> None:
     """
     Trim & encode synchronized videos. All start frames must already be known.
@@ -171,7 +453,19 @@ def process_videos(
 
     animal: if provided, looks up Config.vid_quality[animal] for encoding overrides.
             Per-run cfg["ffmpeg"] takes priority over per-animal vid_quality.
+    mode:   'sequential'  one camera after another (original behaviour)
+            'concurrent'  up to max_nvenc NVENC + max_cpu cpu encodes at once
+            'multi'       one ffmpeg decodes every input once, writes all outputs.
+            concurrent and multi are atomic: all outputs or none.
+    max_nvenc: NVENC session limit for concurrent mode. 0 = no gpu in concurrent
+            and multi mode (an nvenc quality override is rejected then).
+    max_cpu:   software encode limit for concurrent mode.
+    stream_copy: try -c copy first for cameras whose start frame is a keyframe
+            and whose size already matches output_size. verified with ffprobe,
+            falls back to the encode of the chosen mode.
     """
+    if mode not in ('sequential', 'concurrent', 'multi'):
+        raise ValueError(f"Unknown process_videos mode '{mode}'")
     t0 = time.time()
     os.makedirs(cfg.get('output_dir', 'output'), exist_ok=True)
 
@@ -187,8 +481,14 @@ def process_videos(
 
     # --- probe all videos -----------------------------------------------------
     meta: list[dict] = []
+    probed = vid_meta.probe_many([vc['path'] for vc in cfg['videos']], Config.ffprobe_path)
     for vc in cfg['videos']:
-        total_frames, fps = get_video_info(vc['path'])
+        info = probed[str(vc['path'])]
+        if isinstance(info, Exception):
+            raise info
+        if info.frames is None:
+            raise RuntimeError(f"ffprobe failed on {vc['path']}: nb_frames returns N/A")
+        total_frames, fps = info.frames, info.fps
         lg.info(f"Probed {os.path.basename(vc['path'])}: {total_frames} frames @ {fps} fps")
 
         start_frame = int(vc['start'])
@@ -210,7 +510,61 @@ def process_videos(
     if output_frames <= 0:
         raise ValueError("Start frames are beyond the end of the videos. Check detection results.")
 
+    # --- stream copy fast path -------------------------------------------------
+    copied: dict[Path, Path] = {}
+    if stream_copy and not debug:
+        remaining = []
+        for m in meta:
+            out_path = Path(cfg.get('output_dir', 'output')) / m['output_name']
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = _partial_path(out_path)
+            if _try_stream_copy(m['path'], tmp, m['start_frame'], m['fps'],
+                                output_frames, tuple(cfg['output_size'])):  #type: ignore
+                copied[tmp] = out_path
+            else:
+                remaining.append(m)
+        meta = remaining
+        # sequential is not atomic anyway; concurrent/multi commit with the encodes
+        if mode == 'sequential' or not meta:
+            _commit_outputs(copied)
+            copied = {}
+
     # --- encode ---------------------------------------------------------------
+    if mode != 'sequential':
+        if not meta:
+            return
+        jobs = []
+        for m in meta:
+            out_path = Path(cfg.get('output_dir', 'output')) / m['output_name']
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            jobs.append(dict(
+                input_path=m['path'],
+                output_path=str(out_path),
+                start_time=m['start_frame'] / m['fps'],
+                output_frames=output_frames,
+                output_size=tuple(cfg['output_size']),
+                quality_override=quality_override,
+            ))
+        if debug:
+            lg.debug(f"[dry run] would encode {len(jobs)} videos ({mode})")
+            return
+
+        try:
+            if mode == 'concurrent':
+                _encode_concurrent(jobs, max_nvenc, max_cpu)
+            else:
+                multi_jobs = [{**j, 'start_frame': m['start_frame'], 'fps': m['fps']} for j, m in zip(jobs, meta)]
+                _encode_multi(multi_jobs, output_frames, tuple(cfg['output_size']),  #type: ignore
+                              quality_override, max_nvenc)
+        except Exception:
+            _discard_outputs(copied)
+            raise
+        _commit_outputs(copied)
+
+        elapsed = time.time() - t0
+        lg.info(f"Elapsed: {int(elapsed // 60)}m {round(elapsed % 60, 1)}s")
+        return
+
     for m in meta:
         out_path = Path(cfg.get('output_dir', 'output')) / m['output_name']
         out_path.parent.mkdir(parents=True, exist_ok=True)
@@ -9,10 +9,13 @@ from dask.distributed import get_worker
 from .dask_task import DaskTask, DaskType, NoteCache
 from ..core.daet import DAET, Task
 from ..core.expNote import ExpNote
-from ..core.dlc import dp_factory, initDlc
-from ..core.sync import VidSynchronizer, SyncConfig
+from ..core.dlc import DLCModel, dp_factory, initDlc
+from ..core.dlcServer import getServer
+from ..core.sync import VidSynchronizer, SyncConfig, syncOutputs
 from ..core.ani import AniposeProcessor
+from ..core.aniEngine import aniposeAvailable
 from ..core.dlcCollector import getUnprocessedDlcData
+from ..core.pipelineState import Stage, StageStatus, recordStage, isStageStale, hashValue
 from ..utils import VidSyncLED as SyncLED
 
 lg = logging.getLogger(__name__)
@@ -21,14 +24,16 @@ lg.debug('test')
 # worker-level caching
 _worker_cache: dict[str, Any] = {}
 
-def execute_task(task: DaskTask) -> dict:
-    """main task dispatcher on worker"""
+def execute_task(task: DaskTask, deps: tuple = ()) -> dict:
+    """main task dispatcher on worker. deps: results of the task's dependencies"""
     lg.info(f'exec_task: {task.id}')
     try:
         # dispatch to specific executor
         executors = {
             DaskType.DLC_BATCH: execute_dlc_batch,
             DaskType.DLC_SINGLE: execute_dlc_single,
+            DaskType.DLC_BUNDLE: execute_dlc_bundle,
+            DaskType.DLC_MERGE: execute_dlc_merge,
             DaskType.SYNC_DETECT: execute_sync_detect,
             DaskType.SYNC_VIDEO: execute_sync_video,
             DaskType.ANI_CALIBRATE: execute_ani_calibrate,
@@ -45,7 +50,7 @@ def execute_task(task: DaskTask) -> dict:
                 'message': f'Unknown task type: {task.type}'
             }
         
-        result = executor(task)
+        result = executor(task, deps) if task.type == DaskType.DLC_MERGE else executor(task)
         result['task_id'] = task.id
         result['status'] = result.get('status', 'success')
         return result
@@ -128,6 +133,63 @@ def execute_dlc_single(task: DaskTask) -> dict:
         'success': success
     }
 
+def execute_dlc_bundle(task: DaskTask) -> dict:
+    """run all units of one model on this worker's warm DLC server (model loaded once
+    per worker), or through a single analyze_videos call with params warm=False"""
+    _ensure_dlc_initialized()
+
+    model = DLCModel.fromDict(task.params['model'])
+    units = task.params['units']
+    lg.info(f'exec_dlc_bundle: {model.easy_name} on {len(units)} video dirs')
+    vid_paths = [u['vid_path'] for u in units]
+    override = task.params.get('override', False)
+    if task.params.get('warm', True):
+        results = getServer().run(model, vid_paths, override_exist=override)
+    else:
+        results = model.runMany(vid_paths, override_exist=override)
+    _worker_cache.setdefault('warm_models', set()).add(task.params['model_key'])
+
+    ran = [{**u, 'success': bool(results.get(Path(u['vid_path']))),
+            'tree': str(model._getPeedTree(Path(u['vid_path'])))} for u in units]
+    failed = [f"{u['daet']} {Path(u['vid_path']).name}" for u in ran if not u['success']]
+    try:
+        worker = get_worker().address
+    except ValueError:  # not on a worker, eg. run inline
+        worker = None
+
+    return {
+        'model': model.easy_name,
+        'model_key': task.params['model_key'],
+        'worker': worker,
+        'units': len(units),
+        'successful': len(units) - len(failed),
+        'failed': failed,
+        'ran': ran,
+    }
+
+def execute_dlc_merge(task: DaskTask, deps: tuple = ()) -> dict:
+    """merge cam group outputs of the bundled daets of one note.
+    deps: results of the bundles, a daet merges only if all its bundled units succeeded"""
+    note = _get_note(task)
+    processor = dp_factory[task.params['processor_type']](note, run_date=task.params.get('run_date'))
+
+    reported = {u['vid_path']: u for r in deps if isinstance(r, dict) for u in r.get('ran', [])}
+    bundled = task.params.get('bundled', {})
+
+    results = {}
+    for daet in task.get_daets():
+        units = [reported.get(v) for v in bundled.get(str(daet), [])]
+        success = all(u is not None and u['success'] for u in units)   # None: bundle errored
+        trees = processor.outputTrees(daet, {Path(u['vid_path']): Path(u['tree']) for u in units if u})
+        results[daet] = processor.mergeSingleDaet(daet, success, trees)
+
+    return {
+        'daets_processed': len(results),
+        'successful': sum(results.values()),
+        'failed': [str(d) for d, success in results.items() if not success],
+        'dlc_folder': processor.final_dlc_folder_name
+    }
+
 # === Sync Executors ===
 
 def execute_sync_detect(task: DaskTask) -> dict:
@@ -144,7 +206,7 @@ def execute_sync_detect(task: DaskTask) -> dict:
     if rois:
         synchronizer.cam_config.rois = rois
     
-    daets_to_detect = synchronizer._getTargetDaets(task=Task.ALL, skip_existing=True)
+    daets_to_detect = synchronizer._getTargetDaets(task=Task.ALL, skip_existing=True, daets=daets)
     lg.debug('Det Target: ' + str([f'{d.experiment}-{d.task}' for d in daets_to_detect]))
     detected_daets = [d for d in daets if not d in daets_to_detect]
 
@@ -201,9 +263,10 @@ def execute_sync_video(task: DaskTask) -> dict:
             'message': 'No sync config found'
         }
     
-    # test for existence of .skipSync
+    # test for existence of .skipSync, unless the recorded outputs are gone since
+    stale = isStageStale(daet, Stage.SYNC, note.data_path)
     for f in config_files:
-        if (f.parent / '.skipSync').exists():
+        if (f.parent / '.skipSync').exists() and not stale:
             return {
                 'daet': str(daet),
                 'success': True,
@@ -217,12 +280,15 @@ def execute_sync_video(task: DaskTask) -> dict:
     try:
         SyncLED.process_videos(config)
         (sync_folder / '.skipSync').touch()
+        recordStage(daet, Stage.SYNC, StageStatus.DONE,
+                    input_hash=hashValue(config), outputs=syncOutputs(config))
         
         return {
             'daet': str(daet),
             'success': True
         }
     except Exception as e:
+        recordStage(daet, Stage.SYNC, StageStatus.FAILED, message=str(e))
         return {
             'daet': str(daet),
             'success': False,
@@ -252,14 +318,19 @@ def execute_ani_calibrate(task: DaskTask) -> dict:
     }
 
 def execute_ani_triangulate(task: DaskTask) -> dict:
-    """execute anipose triangulation"""
+    """execute anipose triangulation: in-process, one process per daet, when anipose is
+    importable here (params native=False forces the CLI). params threads: total budget"""
     note = _get_note(task)
     model_set = task.params['model_set']
     
     ap = AniposeProcessor(note, model_set)
     ap.batchSetup()
     
-    success = ap.triangulateCLI()
+    if task.params.get('native', True) and aniposeAvailable():
+        success = ap.triangulate(parallel=True, total_threads=task.params.get('threads'))
+    else:
+        ap.triangulateCLI()     # raises on failure
+        success = True
     
     return {
         'model_set': model_set,
@@ -9,14 +9,33 @@ import os
 from .dask_task import DaskTask, DaskType, NoteCache
 from ..core.expNote import ExpNote
 from ..core.daet import DAET
-from ..core.dlcCollector import getUnprocessedDlcData
+from ..core.dlc import DLCModel, DLCProcessor, dp_factory
+from ..core.dlcCollector import getUnprocessedDlcData, getDLCMergedFolderName
+from ..core.pipelineState import Stage, StageStatus, queryState
 
 lg = logging.getLogger(__name__)
 
+def _state_done(note: ExpNote, stage: Stage, model_prefix: str | None = None) -> set[str]:
+    """daets of the note recorded done for stage in the pipeline state db,
+    with the recorded outputs still there under the note's data root"""
+    recs = queryState(animal=note.animal, date=note.date, stage=stage,
+                      status=StageStatus.DONE, model_prefix=model_prefix) or []
+    return {r.daet for r in recs if r.under(note.data_path) and not r.missing()}
+
 def create_dlc_tasks(note: ExpNote, processor_type: str, 
                      daets: list[DAET] | None = None,
-                     batch_mode: bool = True) -> list[DaskTask]:
-    """create dlc processing tasks"""
+                     batch_mode: bool = True,
+                     skip_done: bool = False) -> list[DaskTask]:
+    """create dlc processing tasks.
+    skip_done: leave out daets with a merged output of this combo in the state db"""
+    if skip_done:
+        done = _state_done(note, Stage.DLC, model_prefix=f'{processor_type}-')
+        daets = [d for d in (daets or note.getValidDaets(min_videos=2, skip_void=True))
+                 if str(d) not in done]
+        if not daets:
+            lg.info(f'dask_factory: all daets of {note} have {processor_type} results')
+            return []
+
     cache = init_note_cache_dir(note)
     cache_path = cache.save_note(note)
     
@@ -52,34 +71,150 @@ def create_dlc_tasks(note: ExpNote, processor_type: str,
     
     return tasks
 
-def create_sync_pipeline(note: ExpNote, daets: list[DAET] | None = None, rois: dict[int, list[int]]|None = None) -> list[DaskTask]:
-    """create full sync pipeline (detection + video processing)"""
-    cache = init_note_cache_dir(note)
-    cache_path = cache.save_note(note)
-    
+def model_key(model: DLCModel) -> str:
+    """stable id of a dlc model, used to route its bundles to one gpu worker"""
+    return f'{model.md5:032x}'[:16]
+
+def _has_merged(processor: DLCProcessor, daet: DAET) -> bool:
+    """daet already has the merged folder of the newest outputs of each model"""
+    trees = processor.outputTrees(daet)
+    return bool(trees) and (processor.note.getDaetDlcRoot(daet) / getDLCMergedFolderName(*trees)).exists()
+
+def create_dlc_bundles(notes: list[ExpNote], processor_type: str,
+                       daets: list[DAET] | None = None,
+                       units_per_task: int = 0,
+                       skip_done: bool = True) -> list[DaskTask]:
+    """dlc tasks across notes and dates, grouped by model.
+    one DLC_BUNDLE per model holds all of its (model, video dir) units and runs them
+    through one analyze_videos call; units_per_task > 0 splits that into chunks.
+    one DLC_MERGE per note merges the cam groups once the bundles it needs are done, for
+    daets that had units bundled or have no merged output yet.
+    daets: only these (from any note). skip_done: as in create_dlc_tasks, and units whose
+    videos are all analyzed by their model (skip manifest) are left out.
+    the output folder date is fixed here, so bundles and merges running past midnight agree"""
+    run_date = datetime.now().strftime('%Y%m%d')
+    models: dict[str, DLCModel] = {}
+    units: dict[str, list[dict]] = {}   # model key -> [{'daet', 'vid_path'}]
+    merges: list[tuple[ExpNote, dict[DAET, list[str]]]] = []   # note, {daet: its bundled vid dirs}
+    wanted = set(daets) if daets is not None else None
+
+    for note in notes:
+        note_daets = [d for d in note.getValidDaets(min_videos=2, skip_void=True)
+                      if wanted is None or d in wanted]
+        if skip_done:
+            done = _state_done(note, Stage.DLC, model_prefix=f'{processor_type}-')
+            note_daets = [d for d in note_daets if str(d) not in done]
+
+        try:
+            processor = dp_factory[processor_type](note, run_date=run_date)
+        except FileNotFoundError as e:     # nothing synced yet
+            lg.warning(f'dask_factory: skipped {note}: {e}')
+            continue
+        to_merge: dict[DAET, list[str]] = {}
+        for daet in note_daets:
+            work = processor.workUnits(daet)
+            if not work:
+                continue
+            bundled = []
+            for model, vid_dir in work:
+                if skip_done and vid_dir.exists() and model.should_skip(vid_dir):
+                    continue    # the skip manifest has every video of it
+                key = model_key(model)
+                models[key] = model
+                units.setdefault(key, []).append({'daet': str(daet), 'vid_path': str(vid_dir)})
+                bundled.append(str(vid_dir))
+            if bundled or not _has_merged(processor, daet):
+                to_merge[daet] = bundled
+        if to_merge:
+            merges.append((note, to_merge))
+
+    tasks: list[DaskTask] = []
+    bundled: dict[str, list[str]] = {}  # daet -> bundle ids
+    for key, model_units in units.items():
+        model_units.sort(key=lambda u: u['vid_path'])
+        size = units_per_task if units_per_task > 0 else len(model_units)
+        for i in range(0, len(model_units), size):
+            chunk = model_units[i:i + size]
+            task = hashed_task(DaskTask(
+                id=f"dlc_bundle_{models[key].easy_name}_{i // size}",
+                type=DaskType.DLC_BUNDLE,
+                params={'model': models[key].toDict(), 'model_key': key, 'units': chunk},
+                priority=2
+            ), chunk)
+            tasks.append(task)
+            for u in chunk:
+                bundled.setdefault(u['daet'], []).append(task.id)
+
+    for note, to_merge in merges:
+        cache = init_note_cache_dir(note)
+        merge_task = DaskTask(
+            id=f"dlc_merge_{note.animal}_{note.date}_{processor_type}",
+            type=DaskType.DLC_MERGE,
+            params={'processor_type': processor_type, 'run_date': run_date,
+                    'bundled': {str(d): v for d, v in to_merge.items()}},
+            dependencies=list(dict.fromkeys(tid for d in to_merge for tid in bundled.get(str(d), []))),
+            priority=3
+        )
+        merge_task.set_note(note, cache.save_note(note))
+        merge_task.add_daets(list(to_merge))
+        tasks.append(merge_task)
+
+    lg.info(f'dask_factory: {len(units)} models, {sum(map(len, units.values()))} dlc units '
+            f'over {len(merges)} notes')
+    return tasks
+
+def create_sync_pipeline(note: ExpNote, daets: list[DAET] | None = None, rois: dict[int, list[int]]|None = None,
+                         skip_done: bool = False, per_daet: bool = True) -> list[DaskTask]:
+    """create full sync pipeline (detection + video processing).
+    skip_done: per the state db and markers, synced daets get no tasks, detected ones only the video task
+    per_daet: one detection task per daet, each video task waits only for its own daet.
+        False gives one detection task for the whole note"""
     if daets is None:
         daets = note.getValidDaets(min_videos=2)
+
+    detected: set[str] = set()
+    if skip_done:   # the markers still have to be there, as in VidSynchronizer
+        synced = {d for d in _state_done(note, Stage.SYNC)
+                  if (note.sync_path / d / '.skipSync').exists()}
+        detected = {d for d in _state_done(note, Stage.SYNC_DETECT)
+                    if (note.sync_path / d / '.skipDet').exists()}
+        daets = [d for d in daets if str(d) not in synced]
+        if not daets:
+            lg.info(f'dask_factory: all daets of {note} are synced')
+            return []
+
+    cache = init_note_cache_dir(note)
+    cache_path = cache.save_note(note)
     
     tasks = []
     
-    # phase 1: combined detection task (audio + LED + cross-validation)
-    detect_task = DaskTask(
-        id=f"sync_detect_{note.animal}_{note.date}",
-        type=DaskType.SYNC_DETECT,
-        priority=1
-    )
-    detect_task.set_note(note, cache_path)
-    detect_task.add_daets(daets)
-    if rois:
-        detect_task.params["rois"] = rois
-    tasks.append(detect_task)
+    # phase 1: detection tasks (audio + LED + cross-validation), spread over cpu workers
+    to_detect = [d for d in daets if str(d) not in detected]
+    if per_daet:
+        detect_groups = [(f"sync_detect_{str(d)}", [d]) for d in to_detect]
+    else:
+        detect_groups = [(f"sync_detect_{note.animal}_{note.date}", to_detect)] if to_detect else []
+
+    detect_ids: dict[DAET, str] = {}
+    for task_id, group in detect_groups:
+        detect_task = DaskTask(
+            id=task_id,
+            type=DaskType.SYNC_DETECT,
+            priority=1
+        )
+        detect_task.set_note(note, cache_path)
+        detect_task.add_daets(group)
+        if rois:
+            detect_task.params["rois"] = rois
+        tasks.append(detect_task)
+        detect_ids.update((d, task_id) for d in group)
     
-    # phase 2: video sync per daet (gpu-heavy)
+    # phase 2: video sync per daet (gpu-heavy), starts once its daet is detected
     for daet in daets:
         video_task = DaskTask(
             id=f"sync_video_{str(daet)}",
             type=DaskType.SYNC_VIDEO,
-            dependencies=[detect_task.id],
+            dependencies=[detect_ids[daet]] if daet in detect_ids else [],
             priority=4
         )
         video_task.set_note(note, cache_path)
@@ -155,26 +290,29 @@ def create_full_pipeline(
         processor_type: str,
         daets: list[DAET] | None = None,
         rois: dict[int, list[int]]|None = None,
+        skip_done: bool = False,
 ) -> list[DaskTask]:
     """create complete processing pipeline: sync -> dlc -> anipose"""
     all_tasks = []
     
     # 1. sync pipeline
-    sync_tasks = create_sync_pipeline(note, daets, rois)
+    sync_tasks = create_sync_pipeline(note, daets, rois, skip_done=skip_done)
     all_tasks.extend(sync_tasks)
     
-    # get last sync task id for dependency
-    if sync_tasks:
-        last_sync_id = sync_tasks[-1].id
-    else:
+    if not sync_tasks and not skip_done:
         lg.error('dask_factory: Sync task is empty')
         return []
     
-    # 2. dlc tasks (depend on sync)
+    # 2. dlc tasks (depend on the sync tasks of their own daet)
     dlc_tasks = create_dlc_tasks(note, processor_type, daets, batch_mode=False)
     if sync_tasks:
+        sync_ids: dict[str, list[str]] = {}
+        for t in sync_tasks:
+            for d in t.daet_dicts:
+                sync_ids.setdefault(str(DAET.intern(**d)), []).append(t.id)
         for task in dlc_tasks:
-            task.dependencies.extend([t.id for t in sync_tasks])
+            deps = [tid for d in task.get_daets() for tid in sync_ids.get(str(d), [])]
+            task.dependencies.extend(deps if task.daet_dicts else [t.id for t in sync_tasks])
     all_tasks.extend(dlc_tasks)
     
     # 3. anipose tasks (depend on dlc)
@@ -217,6 +355,6 @@ def init_note_cache_dir(note: ExpNote) -> NoteCache:
     if not cache_dir.exists():
         cache_dir.mkdir()
         lg.debug(f'New note cache dir: {cache_dir}')
-    if os.name == 'nt':
-        os.system(f'attrib +H "{cache_dir}"')
+        if os.name == 'nt':
+            os.system(f'attrib +H "{cache_dir}"')
     return NoteCache(cache_dir)
\ No newline at end of file
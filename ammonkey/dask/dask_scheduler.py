@@ -5,6 +5,7 @@ It:
   • logs worker resources (no client-side tagging)
   • wires dependencies via `depends_on` (no pre-wait)
   • passes priority/resources to the scheduler
+  • routes DLC_BUNDLE tasks to the gpu worker that has their model warm (soft pin)
   • tracks timings and basic stats
   • provides the same methods/attributes as before
 """
@@ -15,7 +16,7 @@ import logging
 import time
 from typing import Any, Callable
 from dataclasses import dataclass, field
-from collections import defaultdict
+from collections import Counter, defaultdict
 
 import dask
 from dask.distributed import Client, as_completed
@@ -25,6 +26,17 @@ from .dask_task import DaskTask, DaskType
 logger = logging.getLogger(__name__)
 
 
+def _flat_resources(res: dict) -> dict:
+    """Flatten nested resources (LocalCluster format): {0: {'cpu': 1}, 1: {'gpu': 1}} -> {'cpu': 1, 'gpu': 1}"""
+    if not any(isinstance(v, dict) for v in res.values()):
+        return res
+    flat_res = {}
+    for nested in res.values():
+        if isinstance(nested, dict):
+            flat_res.update(nested)
+    return flat_res
+
+
 @dataclass
 class TaskStats:
     """statistics for a task type"""
@@ -66,6 +78,7 @@ class DaskScheduler:
         self.futures: dict[str, Any] = {}
         self.stats: dict[DaskType, TaskStats] = defaultdict(TaskStats)
         self._start_times: dict[str, float] = {}  # task_id -> submit time
+        self.model_workers: dict[str, str] = {}  # dlc model key -> gpu worker that has it warm
 
         if auto_setup:
             self.setup_workers()
@@ -78,17 +91,7 @@ class DaskScheduler:
         cpu_workers = 0
 
         for addr, w in info.items():
-            res = w.get('resources', {})
-            
-            # Check if resources are nested (LocalCluster format)
-            if any(isinstance(v, dict) for v in res.values()):
-                # Flatten nested resources: {0: {'cpu': 1}, 1: {'gpu': 1}} -> {'cpu': 1, 'gpu': 1}
-                flat_res = {}
-                for nested in res.values():
-                    if isinstance(nested, dict):
-                        flat_res.update(nested)
-                res = flat_res
-                logger.debug(res)
+            res = _flat_resources(w.get('resources', {}))
             
             if res.get('gpu', 0) >= 1:
                 gpu_workers += 1
@@ -103,21 +106,28 @@ class DaskScheduler:
 
     def _has_resource(self, key: str) -> bool:
         """Check if any worker has the specified resource"""
+        return bool(self._workers_with(key))
+
+    def _workers_with(self, key: str) -> list[str]:
         info = self.client.scheduler_info().get('workers', {})
-        for w in info.values():
-            res = w.get('resources', {})
-            
-            # Handle nested resources
-            if any(isinstance(v, dict) for v in res.values()):
-                for nested in res.values():
-                    if isinstance(nested, dict) and nested.get(key, 0) >= 1:
-                        return True
-            
-            # Check direct resources
-            if res.get(key, 0) >= 1:
-                return True
-        
-        return False
+        return [addr for addr, w in info.items() if _flat_resources(w.get('resources', {})).get(key, 0) >= 1]
+
+    def _model_affinity(self, task: DaskTask) -> dict:
+        """submit kwargs pinning a DLC_BUNDLE to the gpu worker that ran its model last,
+        or else to the gpu worker with the fewest models, so one model's bundles queue
+        on one worker and different models spread out. other workers may still steal"""
+        key = task.params.get('model_key')
+        if task.type != DaskType.DLC_BUNDLE or not key:
+            return {}
+        workers = self._workers_with('gpu')
+        if not workers:
+            return {}
+        addr = self.model_workers.get(key)
+        if addr not in workers:
+            load = Counter(a for a in self.model_workers.values() if a in workers)
+            addr = min(workers, key=lambda w: load[w])
+            self.model_workers[key] = addr
+        return {'workers': [addr], 'allow_other_workers': True}
     # ---------------------------------- submit -----------------------------------
     def submit_task(self, task: DaskTask) -> str:
         """submit single task (thin wrapper)"""
@@ -132,8 +142,8 @@ class DaskScheduler:
         """
         logger.debug(tasks)
         from .dask_executors import execute_task  # local import to avoid worker-side imports here
-        def _after(*_deps, task):
-            return execute_task(task)
+        def _after(*deps, task):
+            return execute_task(task, deps)
 
         submitted_futures: dict[str, Any] = {}
 
@@ -163,6 +173,7 @@ class DaskScheduler:
                     'retries': 1,
                     'priority': getattr(task, 'priority', 0),
                     'pure': False,
+                    **self._model_affinity(task),
                 }
 
                 fut = self.client.submit(
@@ -225,6 +236,10 @@ class DaskScheduler:
                         else:
                             self.stats[task.type].failed += 1
 
+                    # the worker that actually ran the bundle has the model warm now
+                    if result.get("model_key") and result.get("worker"):
+                        self.model_workers[result["model_key"]] = result["worker"]
+
                     results.append(result)
                     if callback:
                         callback(result_tid, result)
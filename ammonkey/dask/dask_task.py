@@ -1,22 +1,37 @@
 """dask task definitions and serialization"""
 
+import hashlib
+import logging
+import mmap
+import os
 import pickle
 from enum import Enum
 from dataclasses import dataclass, field
 from typing import Any
 from pathlib import Path
 
-from ..core.daet import DAET
+import msgpack     # comes with dask.distributed
+import pandas as pd
+
+from ..core.camConfig import CamConfig, CamGroup
+from ..core.daet import DAET, classify_tasks
 from ..core.expNote import ExpNote
 
+lg = logging.getLogger(__name__)
+
+SNAPSHOT_VER = 1    # bump when the snapshot layout changes, old files just stop matching
+SNAPSHOT_EXT = '.note'
+
 class DaskType(Enum):
     # gpu-heavy tasks
     DLC_BATCH = "dlc_batch"
     DLC_SINGLE = "dlc_single"  
+    DLC_BUNDLE = "dlc_bundle"  # many (model, video dir) units of one model, any notes
     SYNC_VIDEO = "sync_video"  # SyncLED.process_videos
     
     # cpu-heavy tasks
     SYNC_DETECT = "sync_detect"  # combined detection + cross-validation
+    DLC_MERGE = "dlc_merge"  # merge cam group outputs of a note after its bundles
     ANI_CALIBRATE = "ani_calibrate"
     ANI_TRIANGULATE = "ani_triangulate"
     ANI_FULL = "ani_full"  # calibrate + triangulate pipeline
@@ -27,6 +42,7 @@ class DaskType(Enum):
 REQUIRES_GPU = [
             DaskType.DLC_BATCH, 
             DaskType.DLC_SINGLE,
+            DaskType.DLC_BUNDLE,
             DaskType.SYNC_VIDEO
         ]
 
@@ -73,37 +89,110 @@ class DaskTask:
     
     def get_daets(self) -> list[DAET]:
         """reconstruct daets from serialized form"""
-        return [DAET(**d) for d in self.daet_dicts]
+        return [DAET.intern(**d) for d in self.daet_dicts]
+
+# xlsx path -> ((size, mtime_ns), sha256), so repeated saves don't re-read the note
+_xlsx_sha: dict[str, tuple[tuple[int, int], str]] = {}
+
+def _file_sha(path: Path) -> str:
+    st = os.stat(path)
+    stamp = (st.st_size, st.st_mtime_ns)
+    hit = _xlsx_sha.get(str(path))
+    if hit is None or hit[0] != stamp:
+        hit = (stamp, hashlib.sha256(Path(path).read_bytes()).hexdigest())
+        _xlsx_sha[str(path)] = hit
+    return hit[1]
+
+def note_key(note: ExpNote) -> str:
+    """stable content key of a note: source xlsx, the rows kept (daets, covers views
+    and filtered copies), cam config and parse settings"""
+    h = hashlib.sha256()
+    for part in (str(SNAPSHOT_VER), _file_sha(note.xlsx_path), repr(note.cam_config),
+                 note.video_extension, repr(note.skip_markers), str(note.data_path),
+                 *(str(d) for d in note.daets)):
+        h.update(part.encode())
+        h.update(b'\0')
+    return h.hexdigest()[:20]
+
+def encode_note(note: ExpNote) -> bytes:
+    """compact snapshot: the columns workers read, as lists, plus the daets as field lists"""
+    df = note.df
+    cols = ['Experiment', 'Task', *(h for h in note.cam_headers if h in df.columns), 'is_void', 'is_calib']
+    cc = note.cam_config
+    payload = {
+        'ver': SNAPSHOT_VER,
+        'path': str(note.path), 'data_path': str(note.data_path),
+        'animal': note.animal, 'date': note.date,
+        'header_key': note.header_key, 'skip_markers': list(note.skip_markers),
+        'video_extension': note.video_extension,
+        'cam_config': {
+            'groups': {i: g.value for i, g in cc.groups.items()},
+            'rois': {i: list(r) for i, r in cc.rois.items()},
+            'led_colors': dict(cc.led_colors),
+            'headers_in_note': dict(cc.headers_in_note),
+            'enabled_cameras': list(cc.enabled_cameras),
+        },
+        'cols': {c: df[c].tolist() for c in cols},
+        'daets': [[d.date, d.animal, d.experiment, d.task] for d in df['daet']],
+    }
+    return msgpack.packb(payload, default=str)     # odd cells (times etc.) as text
+
+def decode_note(data: bytes | memoryview | mmap.mmap) -> ExpNote:
+    p = msgpack.unpackb(data, strict_map_key=False)
+    if p.get('ver') != SNAPSHOT_VER:
+        raise ValueError(f'Note snapshot version {p.get("ver")} != {SNAPSHOT_VER}')
+    c = p['cam_config']
+    cam_config = CamConfig(
+        groups={i: CamGroup(g) for i, g in c['groups'].items()},
+        rois={i: tuple(r) for i, r in c['rois'].items()},
+        led_colors=c['led_colors'],
+        headers_in_note=c['headers_in_note'],
+        enabled_cameras=c['enabled_cameras'],
+    )
+    df = pd.DataFrame(p['cols'])
+    df['daet'] = [DAET.intern(*d) for d in p['daets']]
+    df['task_type'] = classify_tasks(df['Experiment'])
+    return ExpNote.fromRows(
+        df, p['path'], p['animal'], p['date'], p['data_path'], cam_config,
+        header_key=p['header_key'], skip_markers=p['skip_markers'],
+        video_extension=p['video_extension'],
+    )
 
 class NoteCache:
-    """handles note serialization for worker access"""
+    """handles note serialization for worker access.
+    notes are written once per content key (see note_key) and reused after that"""
     
     def __init__(self, cache_dir: Path | None = None):
         self.cache_dir = cache_dir or Path.home() / '.ammonkey' / 'dask_cache'
         self.cache_dir.mkdir(parents=True, exist_ok=True)
     
     def save_note(self, note: ExpNote) -> Path:
-        """serialize note to cache file"""
-        # use hash of daets to ensure uniqueness for filtered notes
-        daet_hash = hash(tuple(str(d) for d in note.daets))
-        cache_name = f"{note.animal}_{note.date}_{abs(daet_hash) % 100000:05d}.pkl"
-        cache_path = self.cache_dir / cache_name
-        
-        with open(cache_path, 'wb') as f:
-            pickle.dump(note, f)
-        
+        """snapshot note to cache file, unless the same snapshot is already there"""
+        cache_path = self.cache_dir / f"{note.animal}_{note.date}_{note_key(note)}{SNAPSHOT_EXT}"
+        if cache_path.exists():
+            os.utime(cache_path)    # in use, keep it out of cleanup()
+            return cache_path
+
+        tmp = cache_path.with_name(f'{cache_path.name}.{os.getpid()}.tmp')
+        tmp.write_bytes(encode_note(note))
+        os.replace(tmp, cache_path)     # readers never see a partial file
+        lg.debug(f'NoteCache: wrote {cache_path.name}')
         return cache_path
     
     def load_note(self, cache_path: Path) -> ExpNote:
-        """load note from cache file"""
-        with open(cache_path, 'rb') as f:
-            return pickle.load(f)
+        """load note from cache file. old .pkl caches still load"""
+        if Path(cache_path).suffix == '.pkl':
+            with open(cache_path, 'rb') as f:
+                return pickle.load(f)
+        with open(cache_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            return decode_note(m)
     
     def cleanup(self, older_than_days: int = 7) -> None:
         """remove old cache files"""
         import time
         cutoff = time.time() - (older_than_days * 24 * 3600)
         
-        for cache_file in self.cache_dir.glob('*.pkl'):
-            if cache_file.stat().st_mtime < cutoff:
-                cache_file.unlink()
\ No newline at end of file
+        for pattern in ('*.pkl', f'*{SNAPSHOT_EXT}', '*.tmp'):
+            for cache_file in self.cache_dir.glob(pattern):
+                if cache_file.stat().st_mtime < cutoff:
+                    cache_file.unlink()
\ No newline at end of file
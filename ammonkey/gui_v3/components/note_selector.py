@@ -1,5 +1,6 @@
 
 from typing import Callable
+from pathlib import Path
 import logging
 import flet as ft
 
@@ -30,6 +31,7 @@ class ColNoteSelector(ft.Column):
         self.task_chips_map: dict[Task, ft.Chip] = {}
         self.daet_checkboxes: dict[DAET, ft.Checkbox] = {}
         self.daet_entries_map: dict[DAET, ft.Container] = {}
+        self.stat_checkers: dict[Path, StatusChecker] = {}  # per day, refreshed incrementally on revisit
         self.unlock = unlocker_func
         
         if lf.note is not None:
@@ -39,7 +41,7 @@ class ColNoteSelector(ft.Column):
 
     def assemble(self) -> None:
         self.selected_daets: set[DAET] = set(lf.note.daets)
-        self.stat_checker = StatusChecker(lf.note)
+        self.stat_checker = self._get_stat_checker(lf.note)
 
         # self.task_chips_map
         self._init_task_chips()
@@ -77,6 +79,15 @@ class ColNoteSelector(ft.Column):
             ft.Row([self.confirm_button, self.lock_switch], alignment=ft.MainAxisAlignment.SPACE_BETWEEN)
         ]
 
+    def _get_stat_checker(self, note: ExpNote) -> StatusChecker:
+        sc = self.stat_checkers.get(note.data_path)
+        if sc is None:
+            sc = StatusChecker(note)
+            self.stat_checkers[note.data_path] = sc
+        else:
+            sc.refresh(note)
+        return sc
+
     def clear_daets(self) -> None:
         self.controls.clear()
         self.task_chips_map.clear()
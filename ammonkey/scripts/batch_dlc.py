@@ -14,7 +14,7 @@ Mel
 from ammonkey import (
     dataSetup,
     ExpNote, DAET, Path,
-    Task, iter_notes, 
+    Task, NoteCatalog,
     initDlc, createProcessor_Pull,
     createProcessor_BBT, createProcessor_Brkm, createProcessor_TS,
     createProcessor_Pull_Hand,
@@ -22,12 +22,13 @@ from ammonkey import (
 )
 from ammonkey.dask.dask_factory import create_dlc_tasks
 from ammonkey.dask.dask_scheduler import DaskScheduler
+from ammonkey.core.pipelineState import Stage, StageStatus, queryState
+from ammonkey.core.dlcManifest import MANIFEST_NAME
 import re
 from ammonkey.utils.silence import silence
 import logging
 from tqdm import tqdm
 import os
-import itertools
 from typing import Iterator
 
 lg = set_colored_logger(__name__)
@@ -52,22 +53,27 @@ cutoff_date = 20250225
 USE_DASK = True
 
 def cleanSkipFile(p:str | Path):
+    '''drop a legacy .skipDLC from a folder without any h5. folders with a skip
+    manifest are left alone, DLCModel decides per video from that'''
     P = Path(p)
     SD = P / '.skipDLC'
-    flag = False
-    for i in P.rglob('*.h5'):
-        flag = True
+    if not SD.exists() or (P / MANIFEST_NAME).exists():
+        return
 
-    if not flag and SD.exists():
+    if not any(P.rglob('*.h5')):
         os.remove(str(SD))
         lg.warning(f'Cleaned skipDLC in {P.parent.name} {P.name}')
 
 def is_processed_by_model(
         re_model: re.Pattern | str, 
         synced_vid_dir: Path | str, 
-        target_h5_count: int = 8
+        target_h5_count: int,     # filtered h5 of a full merge, see determine_h5_count
 ) -> bool:
     synced_vid_dir = Path(synced_vid_dir)
+    recorded = queryState(daets=[synced_vid_dir.name], stage=Stage.DLC, status=StageStatus.DONE)
+    if recorded and any(re.search(re_model, r.model_set) and r.under(synced_vid_dir) and not r.missing()
+                        for r in recorded):
+        return True
     cleanSkipFile(synced_vid_dir)
     """if all(
         [
@@ -84,7 +90,7 @@ def is_processed_by_model(
         if not re.search(re_model, model_dir.name):
             continue
         h5_count = 0
-        for _ in model_dir.glob('*.h5'):
+        for _ in model_dir.glob('*_filtered.h5'):   # filtered only, also counts merges without the raw h5
             h5_count += 1
         if h5_count != target_h5_count:
             return False
@@ -94,7 +100,7 @@ def is_processed_by_model(
     return False
 
 def determine_h5_count(groups: list) -> int:
-    return len(groups) * 4
+    return len(groups) * 2
 
 def scan_dlc_unprocessed(note_iterator: Iterator[ExpNote]) -> list[DAET]:
     need_dlc:list[DAET] = []
@@ -165,9 +171,11 @@ def execute_batch_dlc(note_iterator: Iterator[ExpNote], need_dlc: list[DAET]) ->
                 lg.info(dlc_results)
 
 def main() -> None:
-    notes_iterator = iter_notes(Path(p))
-    ni0, ni1, ni2 = itertools.tee(notes_iterator, 3)
-    need_dlc = scan_dlc_unprocessed(ni0)
+    # two passes over the catalog instead of tee-ing one iterator, so notes are not
+    # all buffered; the second pass only reloads dates that need dlc (parse is cached)
+    catalog = NoteCatalog(p)
+    need_dlc = scan_dlc_unprocessed(catalog.iter_notes())
+    ni1 = catalog.only({daet.date for daet in need_dlc}).iter_notes()
 
     print('='*20, 'Need dlc:', '='*20)
     for daet in need_dlc:
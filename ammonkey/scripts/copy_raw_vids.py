@@ -1,6 +1,6 @@
 from pathlib import Path
 from ammonkey import DAET
-import shutil
+from ammonkey.core.fileOp import materialize
 
 PathLike = Path | str
 
@@ -18,13 +18,14 @@ def copy_raw_vids(sync_dir: PathLike, ani_dir: PathLike,
             continue
 
         raw_vid_dir = ani_dir / daet_dir.name / 'videos-raw'
+        raw_vid_dir.mkdir(parents=True, exist_ok=True)
 
         for s in ['L', 'R']:
             ss = daet_dir / s
             for vid in ss.glob('*.mp4'):
                 # FIXME we have weird bugs here. it skipped TS-6, -9 but copied for other daets.
                 # print(f'{vid} -> {raw_vid_dir}')
-                print(shutil.copy2(vid, raw_vid_dir))
+                print(vid.name, materialize(vid, raw_vid_dir / vid.name, overwrite=True))
 
 if __name__ == '__main__':
     sd = r'P:\projects\monkeys\Chronic_VLL\DATA\FUSILLO\2025\09\20250908\SynchronizedVideos'
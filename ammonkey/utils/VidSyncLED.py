@@ -4,11 +4,14 @@ import time
 pstart_time = time.time()
 # print('VidSyncLEDv2 running. Importing dependencies...')
 
+from collections import deque
 from pathlib import Path
 import cv2, subprocess, json, os
 import numpy as np
 import matplotlib.pyplot as plt
 
+from ammonkey.utils import vid_meta
+
 CHECK_FURTHEST = 4000
 debug = False
 show_plt = False
@@ -22,16 +25,15 @@ if debug or show_plt:
     print(f'Alt: debug {debug}, show intensity plot {show_plt}')
 # print('Sync ready.\n')
 
+HSV_RANGES = {
+    "Y": ([20, 100, 100], [30, 255, 255]),   
+    "G": ([36, 100, 100], [77, 255, 255]),
+    "B": ([100, 80, 150], [130, 255, 255])    
+}
+
 def get_video_info(path):
-    cmd = [ffprobe_path, '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=nb_frames,r_frame_rate', '-of', 'csv=p=0', path]
-    try:
-        frame_rate, nb_frames = subprocess.check_output(cmd).decode().strip().split(',')
-        if nb_frames == 'N/A': raise NotImplementedError(f"nb_frames_str returns N/A. {nb_frames}")
-        fps = eval(frame_rate)
-        return int(nb_frames), fps
-    except Exception as e:
-        # print(nb_frames, frame_rate)
-        raise RuntimeError(f"ffprobe failed: {e}")
+    # cached per (path, size, mtime); repeated calls on the same file do not re-probe
+    return vid_meta.get_video_info(path, ffprobe_path)
     
 def find_start_frame(path: str, roi: list[int]|tuple[int,...], threshold: int, LED: str, 
                   out_path: str = 'Detection Output', 
@@ -50,6 +52,25 @@ def find_start_frame(path: str, roi: list[int]|tuple[int,...], threshold: int, L
     return:
         start_frame
     """
+    start_frame, max_values, onset = scan_start_frame(
+        path, roi, threshold, LED, led_persist_sec, led_persist_tolerance, led_duration_range)
+    if start_frame is None:
+        return -1
+    if save_detection:
+        save_detection_result(path, tuple(int(v) for v in roi), threshold, LED, max_values, start_frame,
+                              out_path, onset)
+    return start_frame + 1
+
+def scan_start_frame(path: str, roi: list[int]|tuple[int,...], threshold: int, LED: str,
+                  led_persist_sec: float = 0.033, 
+                  led_persist_tolerance: float = 0.0,
+                  led_duration_range: tuple[float, float] = (1.0, 1.0),
+                  furthest: int = 3000) -> tuple[int | None, np.ndarray, np.ndarray | None]:
+    """
+    detection part of find_start_frame (full-frame cv2 loop), no plotting.
+    returns the same as scan_start_frame_ffpipe: (0-based onset frame or None,
+    brightness trace, BGR ROI of the onset frame, None if it is no longer held).
+    """
     roi = tuple(roi)
     x, y, w, h = roi
     cap = cv2.VideoCapture(path)
@@ -72,22 +93,14 @@ def find_start_frame(path: str, roi: list[int]|tuple[int,...], threshold: int, L
     if tolerance_frames < 0:
         tolerance_frames = 0
 
-    hsv_ranges = {
-        "Y": ([20, 100, 100], [30, 255, 255]),   
-        "G": ([36, 100, 100], [77, 255, 255]),
-        "B": ([100, 80, 150], [130, 255, 255])    
-    }
-    
-    lower, upper = hsv_ranges.get(LED, ([0,0,0], [0,0,0]))
+    lower, upper = HSV_RANGES.get(LED, ([0,0,0], [0,0,0]))
     lower = np.array(lower, dtype=np.uint8)
     upper = np.array(upper, dtype=np.uint8)
 
     max_values = []
     start_frame = None
-    detection_frame = None
     head = False
-
-    furthest = 3000
+    held = deque(maxlen=LED_BATCH)     # ROI of the latest frames, for the onset image
 
     frame_count = 0 # will add 1 when returning !!
     while cap.isOpened():
@@ -96,6 +109,7 @@ def find_start_frame(path: str, roi: list[int]|tuple[int,...], threshold: int, L
             break
 
         roi_area = frame[y:y+h, x:x+w]
+        held.append(roi_area.copy())
         hsv = cv2.cvtColor(roi_area, cv2.COLOR_BGR2HSV)
         mask = cv2.inRange(hsv, lower, upper)
         
@@ -123,8 +137,6 @@ def find_start_frame(path: str, roi: list[int]|tuple[int,...], threshold: int, L
                         head = True
                     elif not head:
                         start_frame = potential_start
-                        detection_frame = frame.copy()
-                        cv2.rectangle(detection_frame, (x, y), (x+w, y+h), (0, 255, 0), 2)
                         break
         else:
             # only reset if we haven't started counting or if we're beyond tolerance
@@ -147,40 +159,232 @@ def find_start_frame(path: str, roi: list[int]|tuple[int,...], threshold: int, L
         if frame_count % 500 == 1:
             print(frame_count, end=' | ')
         if frame_count > furthest:
-            plt.figure(figsize=(12, 6))
-            plt.plot(max_values, '.-', 
-                    color='green' if LED == 'G' else (0.84, 0.69, 0.59),
-                    label='Brightness')
-            # plt.show()
-            # raise ValueError(f'No lit frame detected in {path} within {furthest} frames!')
             print(f'[WARNING] No lit frame found in {path} within {furthest} frames!')
             break
 
     cap.release()
 
-    # visualize
-    if detection_frame is not None:
-        plt.figure(figsize=(12, 6))
-        plt.plot(max_values, '.-', 
-                color='green' if LED == 'G' else (0.84, 0.69, 0.59),
-                label='Brightness')
-
-        plt.axhline(threshold, color='red', linestyle='--', label='Threshold')
-        if start_frame is not None:
-            plt.axvline(start_frame, color='blue', linestyle='--', label='Start Frame')
-            print(f'From {os.path.basename(path)} detected LED lit at frame {start_frame}')
-        color = (0, 255, 0) if LED == 'G' else (214, 177, 150)
-
-        cv2.rectangle(frame, (x, y), (x+w, y+h), color, 2)
-        cv2.imwrite(os.path.join(out_path,f'detection_result_{os.path.basename(path).split(".")[0]}_{start_frame+1}.jpg'), frame)
-        plt.title(f"Brightness Analysis ({LED} LED)")
-        plt.xlabel("Frame Number")
-        plt.ylabel("Brightness Value")
-        plt.legend()
-        plt.savefig(os.path.join(out_path,f'brightness_plot_{os.path.basename(path).split(".")[0]}_{start_frame+1}.jpg'))
-        plt.close()
-
-    return start_frame+1 if start_frame is not None else -1
+    onset = None
+    if start_frame is not None:
+        print(f'From {os.path.basename(path)} detected LED lit at frame {start_frame}')
+        first_held = frame_count - len(held) + 1
+        onset = held[start_frame - first_held] if start_frame >= first_held else None
+    return start_frame, np.asarray(max_values, dtype=np.uint8), onset
+
+# ---------------------------------------------------------------------------
+# decode-once engine: ffmpeg crops the ROI, numpy does the rest in batches
+# ---------------------------------------------------------------------------
+LED_BATCH = 256     # frames per numpy block
+ROI_PAD = 4         # px kept around the ROI so chroma at the edges matches a full decode
+
+def get_video_geometry(path) -> tuple[int, int]:
+    '''(width, height) of the first video stream'''
+    meta = vid_meta.probe(path, ffprobe_path)
+    return meta.width, meta.height
+
+def _persistence_frames(fps: float, led_persist_sec: float, led_persist_tolerance: float,
+                        led_duration_range: tuple[float, float]) -> tuple[int, int, int]:
+    '''(min_frames, max_frames, tolerance_frames), same rounding and safety checks as find_start_frame'''
+    required_frames = int(led_persist_sec * fps)
+    tolerance_frames = max(int(required_frames * led_persist_tolerance), 0)
+    min_frames = int(led_persist_sec * fps * led_duration_range[0])
+    max_frames = int(led_persist_sec * fps * led_duration_range[1])
+    if min_frames <= 0:
+        min_frames = 1
+    if max_frames <= min_frames:
+        max_frames = min_frames + 1
+    return min_frames, max_frames, tolerance_frames
+
+def roi_brightness(block: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> np.ndarray:
+    '''
+    per-frame max of the colour-gated V channel for a (N, h, w, 3) BGR block.
+    the block is viewed as one tall (N*h, w) image so cvtColor/inRange run once per batch.
+    '''
+    n, h, w, _ = block.shape
+    hsv = cv2.cvtColor(block.reshape(n * h, w, 3), cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, lower, upper)
+    v = np.where(mask > 0, hsv[:, :, 2], 0)
+    return v.reshape(n, h * w).max(axis=1)
+
+def scan_led_onset(max_values: np.ndarray, threshold: int, min_frames: int, max_frames: int,
+                   led_persist_tolerance: float = 0.0, tolerance_frames: int = 0) -> int | None:
+    '''
+    persistence/tolerance pass over a brightness trace. returns the 0-based onset frame
+    (what find_start_frame stores as start_frame) or None.
+
+    zero tolerance (the configured default) is a pure run-length pass: first run of lit
+    frames that is long enough and does not start at frame 0 (LED already on at the head).
+    non-zero tolerance keeps the stateful loop of find_start_frame, with the window counts
+    served from a prefix sum instead of re-summing max_values on every frame.
+    '''
+    lit = np.asarray(max_values) >= threshold
+    if not lit.size:
+        return None
+
+    if led_persist_tolerance == 0:
+        edges = np.diff(np.concatenate(([0], lit.view(np.int8), [0])))
+        starts = np.flatnonzero(edges == 1)
+        lengths = np.flatnonzero(edges == -1) - starts
+        hits = np.flatnonzero((lengths >= min_frames) & (starts != 0))
+        return int(starts[hits[0]]) if hits.size else None
+
+    below = np.concatenate(([0], np.cumsum(~lit)))     # below[b+1] - below[a] = count in [a, b]
+    consecutive_count = 0
+    potential_start = None
+    head = False
+    for i, is_lit in enumerate(lit.tolist()):
+        if is_lit:
+            if consecutive_count == 0:
+                potential_start = i
+            consecutive_count += 1
+            if consecutive_count >= min_frames:
+                window_size = min(consecutive_count, max_frames)
+                frames_below = below[i + 1] - below[i - window_size + 1]
+                if frames_below <= int(window_size * led_persist_tolerance):
+                    if potential_start == 0:
+                        head = True
+                    elif not head:
+                        return potential_start
+        else:
+            if consecutive_count > 0:
+                window_start = potential_start or 0
+                tolerance_check = min(tolerance_frames, int(consecutive_count * led_persist_tolerance))
+                if below[i + 1] - below[window_start] > tolerance_check:
+                    consecutive_count = 0
+                    potential_start = None
+            head = False
+    return None
+
+def find_start_frame_ffpipe(path: str, roi: list[int]|tuple[int,...], threshold: int, LED: str, 
+                  out_path: str = 'Detection Output', 
+                  led_persist_sec: float = 0.033, 
+                  led_persist_tolerance: float = 0.0,
+                  led_duration_range: tuple[float, float] = (1.0, 1.0),
+                  save_detection: bool = True,
+                  furthest: int = 3000) -> int:
+    """
+    drop-in for find_start_frame that decodes each frame once in ffmpeg and only pipes the ROI out.
+    same params and return value (1-based start frame, -1 if none within `furthest` frames).
+    """
+    start_frame, max_values, onset = scan_start_frame_ffpipe(
+        path, roi, threshold, LED, led_persist_sec, led_persist_tolerance, led_duration_range, furthest)
+    if start_frame is None:
+        return -1
+    if save_detection:
+        save_detection_result(path, tuple(int(v) for v in roi), threshold, LED, max_values, start_frame,
+                              out_path, onset)
+    return start_frame + 1
+
+def scan_start_frame_ffpipe(path: str, roi: list[int]|tuple[int,...], threshold: int, LED: str,
+                  led_persist_sec: float = 0.033, 
+                  led_persist_tolerance: float = 0.0,
+                  led_duration_range: tuple[float, float] = (1.0, 1.0),
+                  furthest: int = 3000) -> tuple[int | None, np.ndarray, np.ndarray | None]:
+    """
+    detection only, no plotting: returns (0-based onset frame or None, brightness trace,
+    BGR ROI of the onset frame as decoded by the scan, None if it is no longer held).
+    """
+    x, y, w, h = (int(v) for v in roi)
+    _, fps = get_video_info(path)
+    min_frames, max_frames, tolerance_frames = _persistence_frames(
+        fps, led_persist_sec, led_persist_tolerance, led_duration_range)
+
+    lower, upper = HSV_RANGES.get(LED, ([0,0,0], [0,0,0]))
+    lower = np.array(lower, dtype=np.uint8)
+    upper = np.array(upper, dtype=np.uint8)
+
+    # crop on even coords with a small margin, cut the exact ROI in numpy afterwards
+    vid_w, vid_h = get_video_geometry(path)
+    x0, y0 = max(0, x - ROI_PAD) & ~1, max(0, y - ROI_PAD) & ~1
+    x1, y1 = min(vid_w, x + w + ROI_PAD), min(vid_h, y + h + ROI_PAD)
+    x1 += (x1 - x0) % 2 if x1 < vid_w else 0
+    y1 += (y1 - y0) % 2 if y1 < vid_h else 0
+    cw, ch = x1 - x0, y1 - y0
+    if cw <= 0 or ch <= 0 or w <= 0 or h <= 0:
+        raise ValueError(f"ROI {roi} is outside of {path} ({vid_w}x{vid_h})")
+
+    cmd = [ffmpeg_path, '-v', 'error', '-i', path, '-an', '-sn',
+           '-frames:v', str(furthest + 1),
+           '-vf', f'crop={cw}:{ch}:{x0}:{y0}',
+           '-f', 'rawvideo', '-pix_fmt', 'bgr24', 'pipe:1']
+    frame_bytes = cw * ch * 3
+    max_values = np.empty(0, dtype=np.uint8)
+    start_frame = None
+    held = np.empty((0, h, w, 3), dtype=np.uint8)   # ROI of the last two batches, from frame held_start
+    held_start = 0
+
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        while start_frame is None:
+            buf = proc.stdout.read(frame_bytes * LED_BATCH)   #type:ignore
+            n = len(buf) // frame_bytes
+            if n == 0:
+                break
+            block = np.frombuffer(buf, dtype=np.uint8, count=n * frame_bytes).reshape(n, ch, cw, 3)
+            block = np.ascontiguousarray(block[:, y - y0:y - y0 + h, x - x0:x - x0 + w])
+            held_start = max_values.size - min(held.shape[0], LED_BATCH)
+            held = np.concatenate((held[-LED_BATCH:], block))
+            max_values = np.concatenate((max_values, roi_brightness(block, lower, upper)))
+            start_frame = scan_led_onset(max_values, threshold, min_frames, max_frames,
+                                         led_persist_tolerance, tolerance_frames)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        _, err = proc.communicate()
+
+    if not max_values.size:
+        raise RuntimeError(f"ffmpeg decoded no frames from {path}: {err.decode(errors='ignore').strip()}")
+    if start_frame is None:
+        print(f'[WARNING] No lit frame found in {path} within {furthest} frames!')
+    else:
+        print(f'From {os.path.basename(path)} detected LED lit at frame {start_frame}')
+    onset = held[start_frame - held_start].copy() if start_frame is not None and start_frame >= held_start else None
+    return start_frame, max_values, onset
+
+def led_pool_job(ffmpeg: str, ffprobe: str, engine: str, *args, **kwargs) -> tuple[int | None, np.ndarray, np.ndarray | None]:
+    """
+    process pool entry: the detection-only scan of LED_ENGINES[engine], the caller plots.
+    spawned workers re-import this module with the default tool paths, so the caller's
+    ffmpeg/ffprobe are passed along explicitly.
+    """
+    global ffmpeg_path, ffprobe_path
+    ffmpeg_path, ffprobe_path = ffmpeg, ffprobe
+    return LED_SCANS[engine](*args, **kwargs)
+
+def save_detection_result(path: str, roi: tuple[int, ...], threshold: int, LED: str,
+                          max_values, start_frame: int, out_path: str,
+                          onset: np.ndarray | None = None) -> None:
+    '''
+    brightness plot + onset frame, same file names as find_start_frame.
+    onset: the ROI of the onset frame the scan decoded. not re-read from the video,
+    seeking with CAP_PROP_POS_FRAMES isn't frame exact on these files
+    '''
+    name = os.path.basename(path).split(".")[0]
+
+    if onset is not None:
+        cv2.imwrite(os.path.join(out_path, f'detection_result_{name}_{start_frame+1}.jpg'), onset)
+
+    plt.figure(figsize=(12, 6))
+    plt.plot(max_values, '.-', 
+            color='green' if LED == 'G' else (0.84, 0.69, 0.59),
+            label='Brightness')
+    plt.axhline(threshold, color='red', linestyle='--', label='Threshold')
+    plt.axvline(start_frame, color='blue', linestyle='--', label='Start Frame')
+    plt.title(f"Brightness Analysis ({LED} LED)")
+    plt.xlabel("Frame Number")
+    plt.ylabel("Brightness Value")
+    plt.legend()
+    plt.savefig(os.path.join(out_path, f'brightness_plot_{name}_{start_frame+1}.jpg'))
+    plt.close()
+
+LED_ENGINES = {
+    'cv2': find_start_frame,            # legacy full-frame loop
+    'ffpipe': find_start_frame_ffpipe,  # ROI-only pipe + vectorized scan
+}
+LED_SCANS = {   # the same engines without plotting, for led_pool_job
+    'cv2': scan_start_frame,
+    'ffpipe': scan_start_frame_ffpipe,
+}
 
 # not used
 FFMPEG_DEFAULTS = {
@@ -4,7 +4,7 @@ import argparse
 def main():
     parser = argparse.ArgumentParser(description='Run utility functions.')
     parser.add_argument('-u', '--util', type=str, required=True, help='Name of the utility to run')
-    args = parser.parse_args()
+    args, remaining = parser.parse_known_args()
 
     if args.util == 'av':
         from ammonkey.utils.ani_video_uiget import main as ani_video_uiget_main
@@ -18,6 +18,9 @@ def main():
     elif args.util == 'ggl-sync':
         from ammonkey.utils.google_notes_wizard import main as google_notes_wizard_main
         google_notes_wizard_main()
+    elif args.util == 'archive-report' or args.util == 'status':
+        from ammonkey.utils.archive_report import main as archive_report_main
+        archive_report_main(remaining)
     else:
         print(f'Unknown utility: {args.util}')
 
@@ -0,0 +1,221 @@
+'''
+Archive-wide processing status: one table of DAET x stage x model set.
+
+Dates are checked in parallel with a StatusChecker each. Per-date rows are
+cached (diskcache, ~/.ammonkey/archive_report) together with the mtimes of
+every directory they were read from and of the note, and the date's last
+update in the pipeline state db. a rerun only stats directories (the note is
+not even opened), and rescans the dates where something changed.
+
+Usage eg
+    ammonkey -u archive-report pici --start 2025 --end 2025 --out status.csv
+    ammonkey -u archive-report pici --start 2025 --task pull --pending anipose
+
+    from ammonkey.utils.archive_report import archive_report, pending
+    df = archive_report(r'P:/.../DATA_RAW/Pici', start='2025')
+    pending(df, 'anipose', task='PULL')
+'''
+
+import os
+import argparse
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+from diskcache import Cache
+from tqdm import tqdm
+
+from ..core.fileOp import getDataPath
+from ..core.noteCatalog import NoteCatalog, NoteHandle
+from ..core.pipelineState import queryState
+from ..core.statusChecker import StatusChecker
+
+lg = logging.getLogger(__name__)
+
+CACHE_DIR = Path.home() / '.ammonkey' / 'archive_report'
+REPORT_WORKERS = 8
+STAGES = ['sync', 'dlc', 'anipose']
+COLUMNS = ['date', 'animal', 'daet', 'experiment', 'task', 'task_type',
+           'stage', 'model_set', 'done', 'detail']
+_REPORT_VER = 2     # bump when the row or cache entry layout changes
+
+_cache: Cache | None = None
+
+
+def _get_cache() -> Cache:
+    global _cache
+    if _cache is None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _cache = Cache(str(CACHE_DIR))
+    return _cache
+
+
+def _mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return -1
+
+
+def _unchanged(mtimes: dict[str, int]) -> bool:
+    return all(_mtime(p) == m for p, m in mtimes.items())
+
+
+def _state_stamps(animal: str) -> dict[str, tuple[int, float]]:
+    '''date -> (rows, last finished) of the animal's pipeline state rows. empty when the db is off'''
+    stamps: dict[str, tuple[int, float]] = {}
+    for r in queryState(animal=animal) or []:
+        n, last = stamps.get(r.date, (0, 0.0))
+        stamps[r.date] = (n + 1, max(last, r.finished or 0.0))
+    return stamps
+
+
+def daet_rows(sc: StatusChecker) -> list[dict]:
+    '''rows of one note. void entries are left out, calib entries only get a sync row'''
+    note = sc.note
+    rows = []
+    for daet in note.daets:
+        if note.is_daet_void(daet):
+            continue
+        task_type = daet.task_type
+        base = {
+            'date': daet.date, 'animal': daet.animal, 'daet': str(daet),
+            'experiment': daet.experiment, 'task': daet.task,
+            'task_type': task_type.name if task_type else '',
+        }
+        done, text = sc.check_sync_single_daet(daet)
+        rows.append({**base, 'stage': 'sync', 'model_set': '', 'done': done, 'detail': text})
+        if daet.isCalib:
+            continue
+
+        dlc_sets = sc.dlc_msn.get(daet) or []
+        for ms in dlc_sets:
+            rows.append({**base, 'stage': 'dlc', 'model_set': ms, 'done': True, 'detail': ''})
+        if not dlc_sets:
+            rows.append({**base, 'stage': 'dlc', 'model_set': '', 'done': False,
+                         'detail': 'No combined DLC results found'})
+
+        ani_sets = sc.ani_sets_single_daet(daet)
+        for ms, finished in ani_sets.items():
+            rows.append({**base, 'stage': 'anipose', 'model_set': ms, 'done': finished,
+                         'detail': '' if finished else 'WIP'})
+        if not ani_sets:
+            rows.append({**base, 'stage': 'anipose', 'model_set': '', 'done': False,
+                         'detail': 'No anipose model set found'})
+    return rows
+
+
+def _date_rows(handle: NoteHandle, use_cache: bool, stamp: tuple[int, float] | None = None) -> list[dict]:
+    '''stamp: the date's pipeline state (rows, last finished), part of the cache key'''
+    key = str(getDataPath(handle.path))
+    xlsx = str(handle.xlsx)
+    if use_cache:
+        hit = _get_cache().get(key)
+        if hit is not None and hit[0] == _REPORT_VER and hit[1] == stamp and _unchanged(hit[2]):
+            return hit[3]
+
+    mtimes = {xlsx: _mtime(xlsx), key: _mtime(key)}    # before reading, so changes meanwhile rescan
+    sc = StatusChecker(handle.note)
+    rows = daet_rows(sc)
+    if use_cache:
+        mtimes.update(sc.dir_mtimes())
+        _get_cache().set(key, (_REPORT_VER, stamp, mtimes, rows))
+    return rows
+
+
+def archive_report(animal_dir: str | Path, start: str | int | None = None, end: str | int | None = None,
+                   max_workers: int = REPORT_WORKERS, use_cache: bool = True) -> pd.DataFrame:
+    '''
+    status table of all notes under DATA_RAW/<animal> within [start, end]
+    ('yyyy', 'yyyymm' or 'yyyymmdd'). dates whose note fails to load are logged and skipped.
+    '''
+    catalog = NoteCatalog(animal_dir, start, end)
+    stamps = _state_stamps(catalog.animal) if use_cache else {}
+
+    def one(handle: NoteHandle) -> list[dict]:
+        try:
+            return _date_rows(handle, use_cache, stamps.get(handle.date))
+        except Exception as e:
+            lg.error(f'archive_report: failed {handle.date}: {e}')
+            return []
+        finally:
+            handle.release()
+
+    rows: list[dict] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for date_rows in tqdm(pool.map(one, catalog.handles), total=len(catalog), desc='dates'):
+            rows.extend(date_rows)
+
+    df = pd.DataFrame(rows, columns=COLUMNS)
+    df['stage'] = pd.Categorical(df['stage'], categories=STAGES, ordered=True)
+    return df.sort_values(['date', 'daet', 'stage', 'model_set'], ignore_index=True)
+
+
+def pending(df: pd.DataFrame, stage: str, task: str | None = None) -> list[str]:
+    '''daets with no finished model set (or no success) for stage, optionally of one task type'''
+    sub = df[df['stage'] == stage]
+    if task:
+        sub = sub[sub['task_type'].str.lower() == task.lower()]
+    done = sub.groupby('daet', sort=True)['done'].any()
+    return done[~done].index.tolist()
+
+
+def save_report(df: pd.DataFrame, out: str | Path) -> Path:
+    '''.parquet (needs pyarrow or fastparquet) or anything else as csv'''
+    out = Path(out)
+    if out.suffix.lower() == '.parquet':
+        df.to_parquet(out, index=False)
+    else:
+        df.to_csv(out, index=False)
+    return out
+
+
+def clear_cache() -> None:
+    _get_cache().clear()
+
+
+def _resolve_animal_dir(animal: str) -> Path:
+    from ..core.config import Config
+    for name, path in Config.animal_paths.items():
+        if name.lower() == animal.lower():
+            return Path(path)
+    return Path(animal)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog='ammonkey -u archive-report',
+                                     description='Processing status of all notes of an animal.')
+    parser.add_argument('animal', help='animal name from the config, or a DATA_RAW/<animal> path')
+    parser.add_argument('--start', help='yyyy, yyyymm or yyyymmdd (inclusive)')
+    parser.add_argument('--end', help='yyyy, yyyymm or yyyymmdd (inclusive)')
+    parser.add_argument('--task', help='only this task type in --pending, eg. pull')
+    parser.add_argument('--pending', choices=STAGES, help='list daets not done for this stage')
+    parser.add_argument('--out', help='write the table to .csv or .parquet')
+    parser.add_argument('--workers', type=int, default=REPORT_WORKERS)
+    parser.add_argument('--no-cache', action='store_true', help='rescan every date')
+    args = parser.parse_args(argv)
+
+    df = archive_report(_resolve_animal_dir(args.animal), args.start, args.end,
+                        max_workers=args.workers, use_cache=not args.no_cache)
+    if df.empty:
+        print('No notes found.')
+        return
+
+    summary = (df.groupby(['stage', 'daet'], observed=True)['done'].any()
+                 .groupby('stage', observed=True).agg(['sum', 'count']))
+    for stage, (n_done, n_all) in summary.iterrows():
+        print(f'{stage:<8} {n_done}/{n_all} daets done')
+
+    if args.pending:
+        todo = pending(df, args.pending, args.task)
+        print(f'\n{len(todo)} daets pending {args.pending}' + (f' ({args.task})' if args.task else '') + ':')
+        for d in todo:
+            print(f'\t{d}')
+
+    if args.out:
+        print(f'\nSaved {save_report(df, args.out)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,8 @@
 '''util function to recover raw videos from sync dir to anipose videos_raw dir'''
 
 from pathlib import Path
-import shutil
+
+from ammonkey.core.fileOp import materialize
 
 from ammonkey.utils.ol_logging import set_colored_logger
 lg = set_colored_logger(__name__)
@@ -39,9 +40,9 @@ def recover_raw_vids(ani_daet_dir: Path) -> list[Path]:
             continue
         else:
             lg.info(f'Copying to {dest}')
-        shutil.copy(video, dest)
+        mode = materialize(video, dest)
         copied_videos.append(dest)
-        lg.info(f'Copied to {dest}')
+        lg.info(f'Copied to {dest} ({mode})')
 
     return copied_videos
 
@@ -4,12 +4,12 @@ pass animal dir, create a csv file with all valid daets
 e.g. P:/projects/monkeys/Remyelination/DATA/Pepe
 '''
 
-import csv
 from typing import Iterator
 from rich import print
 from pathlib import Path
 
-from ammonkey import ExpNote, DAET
+from ammonkey import ExpNote
+from ammonkey.core.daet import DAET, daet_frame
 
 def iter_date_from_animal_dir(animal_dir: Path) -> Iterator[Path]:
     for year in animal_dir.iterdir():
@@ -26,38 +26,24 @@ def iter_date_from_animal_dir(animal_dir: Path) -> Iterator[Path]:
 def main() -> None:
     path = Path(r'P:/projects/monkeys/Remyelination/DATA_RAW/Pepe')
 
-    rows: list[dict] = []
+    daets: list[DAET] = []
     for day in iter_date_from_animal_dir(path):
         try:
             note = ExpNote(day)
             valid_daets = note.getValidDaets()
-            note.dupWithWhiteList(valid_daets)
             print(f'{day} [dim]{note.getAllTaskTypes()}[/dim]')
-            
-            # make rows for this note
-            for daet in valid_daets:
-                rows.append({
-                    'daet': str(daet),
-                    'date': daet.date,
-                    'animal': daet.animal,
-                    'exp': daet.experiment,
-                    'trial': daet.task,
-                    'task-type': daet.task_type.name if daet.task_type else 'Unknown',
-                })
+            daets.extend(valid_daets)
 
         except FileNotFoundError as e:
             print(f'{day}  [dim red] Exists but failed to load[/dim red] ([dim]{e}[/dim])')
 
-    # sort by daet before writing
-    rows.sort(key=lambda r: r['daet'])
-    
-    # write to csv
-    with open('pepe-daets.csv', 'w', newline='') as csvfile:
-        fieldnames = ['daet', 'date', 'animal', 'exp', 'trial', 'task-type']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+    # the whole table at once, from the DAET fields
+    df = daet_frame(sorted(daets, key=str))
+    df['task-type'] = df['task_type'].cat.rename_categories(lambda t: t.name).astype(object).fillna('Unknown')
+    df = df.rename(columns={'experiment': 'exp', 'task': 'trial'})
+
+    df.to_csv('pepe-daets.csv', index=False,
+              columns=['daet', 'date', 'animal', 'exp', 'trial', 'task-type'])
 
     print('[bold green]OK[/bold green]')
 
@@ -0,0 +1,150 @@
+'''
+Persistent ffprobe metadata cache.
+
+One ffprobe call per file collects everything the pipeline asks about a video
+(frames, fps, duration, codec, size, audio). Results live in a local diskcache
+store keyed by the absolute path and validated against (size, mtime), so a file
+that was replaced or touched is probed again while unchanged files on the share
+never spawn ffprobe twice.
+
+Usage eg
+    from ammonkey.utils import vid_meta
+    meta = vid_meta.probe(path, ffprobe=Config.ffprobe_path)
+    metas = vid_meta.probe_many(paths, ffprobe=Config.ffprobe_path)   # concurrent
+'''
+
+import os, json, subprocess, logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from fractions import Fraction
+from pathlib import Path
+
+from diskcache import Cache
+
+lg = logging.getLogger(__name__)
+
+ffprobe_path = r'C:\ffmpeg\bin\ffprobe.exe'     # default when callers pass no ffprobe
+CACHE_DIR = Path.home() / '.ammonkey' / 'vid_meta'
+PROBE_WORKERS = 8       # concurrent ffprobe processes in probe_many, mostly waiting on the share
+
+_cache: Cache | None = None
+
+
+@dataclass(frozen=True)
+class VidMeta:
+    path: str
+    frames: int | None          # nb_frames from the header, None if the container does not store it
+    fps: float
+    duration: float | None      # seconds, container duration
+    codec: str
+    width: int
+    height: int
+    audio_codec: str | None     # None if there is no audio stream
+    audio_rate: int | None
+
+    @property
+    def has_audio(self) -> bool:
+        return self.audio_codec is not None
+
+
+def _get_cache() -> Cache:
+    global _cache
+    if _cache is None:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        _cache = Cache(str(CACHE_DIR))
+    return _cache
+
+
+def _identity(path: str) -> tuple[str, int, int]:
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+def _run_ffprobe(path: str, ffprobe: str) -> dict:
+    cmd = [
+        ffprobe, '-v', 'error',
+        '-show_entries',
+        'stream=codec_type,codec_name,nb_frames,r_frame_rate,width,height,sample_rate:format=duration',
+        '-of', 'json',
+        path,
+    ]
+    return json.loads(subprocess.check_output(cmd, stdin=subprocess.DEVNULL))
+
+
+def _parse(path: str, info: dict) -> VidMeta:
+    streams = info.get('streams', [])
+    video = next(s for s in streams if s.get('codec_type') == 'video')
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+
+    nb_frames = video.get('nb_frames')
+    duration = info.get('format', {}).get('duration')
+    return VidMeta(
+        path=path,
+        frames=int(nb_frames) if nb_frames not in (None, 'N/A') else None,
+        fps=float(Fraction(video['r_frame_rate'])),
+        duration=float(duration) if duration not in (None, 'N/A') else None,
+        codec=video.get('codec_name', ''),
+        width=int(video['width']),
+        height=int(video['height']),
+        audio_codec=audio.get('codec_name') if audio else None,
+        audio_rate=int(audio['sample_rate']) if audio and audio.get('sample_rate') else None,
+    )
+
+
+def probe(path: str | Path, ffprobe: str | None = None, use_cache: bool = True) -> VidMeta:
+    '''
+    metadata of one video. served from the cache when (path, size, mtime)
+    match a previous probe. use_cache=False always probes and stores nothing,
+    for transient files (e.g. partial outputs). raises RuntimeError on failure.
+    '''
+    path = str(path)
+    try:
+        key, size, mtime = _identity(path)
+    except OSError as e:
+        raise RuntimeError(f"ffprobe failed on {path}: {e}")
+
+    if use_cache:
+        hit = _get_cache().get(key)
+        if hit is not None and hit[0] == size and hit[1] == mtime:
+            return VidMeta(**hit[2])
+
+    try:
+        meta = _parse(path, _run_ffprobe(path, ffprobe or ffprobe_path))
+    except Exception as e:
+        raise RuntimeError(f"ffprobe failed on {path}: {e}")
+
+    if use_cache:
+        _get_cache().set(key, (size, mtime, asdict(meta)))
+    return meta
+
+
+def probe_many(paths: list[str] | list[Path], ffprobe: str | None = None,
+               max_workers: int = PROBE_WORKERS) -> dict[str, VidMeta | Exception]:
+    '''
+    probe a batch concurrently. cached files return without a subprocess.
+    returns {path: VidMeta} in input order, failures as their exception.
+    '''
+    def _one(p):
+        try:
+            return probe(p, ffprobe)
+        except Exception as e:
+            return e
+
+    paths = [str(p) for p in paths]
+    if not paths:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(paths)))) as pool:
+        return dict(zip(paths, pool.map(_one, paths)))
+
+
+def get_video_info(path: str | Path, ffprobe: str | None = None,
+                   use_cache: bool = True) -> tuple[int, float]:
+    '''(nb_frames, fps), the pair the sync modules work with'''
+    meta = probe(path, ffprobe, use_cache)
+    if meta.frames is None:
+        raise RuntimeError(f"ffprobe failed on {path}: nb_frames returns N/A")
+    return meta.frames, meta.fps
+
+
+def clear_cache() -> None:
+    _get_cache().clear()
@@ -20,6 +20,7 @@ import subprocess
 import matplotlib.pyplot as plt
 from typing import Any, cast
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 ffmpeg_path = r'C:\ffmpeg\bin\ffmpeg.exe'
 DEBUG = False
@@ -46,6 +47,10 @@ THRES_PEAK = 2.0
 DEFAULT_HOP = 128
 DEFAULT_BAND = (2000, 8000)   # frequency band for high_rms feature, Hz
 PEAK_MIN_SEP_SEC = 0.2        # min separation between top and runner up peak
+# bounded lag matching. a max lag (s) swaps each probe matcher for its bounded
+# variant, which only evaluates lags within ±max_lag. COARSE_FACTOR > 1 adds a
+# decimated first pass and refines exactly around its peak only.
+COARSE_FACTOR = 1
 
 
 # features: 1D envelope at hop spacing
@@ -57,9 +62,11 @@ def _feat_rms_diff(audio: np.ndarray, sr: int, hop: int = DEFAULT_HOP) -> np.nda
     return np.maximum(np.diff(e, prepend=e[0]), 0)
 
 
-def _feat_spectral_flux(audio: np.ndarray, sr: int, hop: int = DEFAULT_HOP) -> np.ndarray:
+def _feat_spectral_flux(audio: np.ndarray, sr: int, hop: int = DEFAULT_HOP,
+                        S: np.ndarray | None = None) -> np.ndarray:
     '''sum of positive STFT magnitude differences across frequency bins.'''
-    S = np.abs(librosa.stft(audio, hop_length=hop))
+    if S is None:
+        S = _stft_mag(audio, hop)
     return np.sum(np.maximum(np.diff(S, axis=1, prepend=S[:, :1]), 0), axis=0)
 
 
@@ -76,9 +83,19 @@ def _feat_high_rms(audio: np.ndarray, sr: int, hop: int = DEFAULT_HOP,
     filtered = scipy.signal.filtfilt(b, a, audio)
     return librosa.feature.rms(y=filtered, hop_length=hop)[0]
 
-def _feat_onset(audio: np.ndarray, sr: int, hop: int = DEFAULT_HOP) -> np.ndarray:
+def _feat_onset(audio: np.ndarray, sr: int, hop: int = DEFAULT_HOP,
+                S: np.ndarray | None = None) -> np.ndarray:
     '''librosa onset strength envelope. spectral flux with log compression and smoothing.'''
-    return librosa.onset.onset_strength(y=audio, sr=sr, hop_length=hop)
+    if S is None:
+        return librosa.onset.onset_strength(y=audio, sr=sr, hop_length=hop)
+    # same chain librosa runs internally from y: |stft|^2 -> mel -> dB -> onset
+    mel = librosa.feature.melspectrogram(S=S ** 2, sr=sr, fmax=0.5 * sr)
+    return librosa.onset.onset_strength(S=librosa.power_to_db(mel), sr=sr, hop_length=hop)
+
+
+def _stft_mag(audio: np.ndarray, hop: int) -> np.ndarray:
+    '''librosa default STFT (n_fft 2048, centered) magnitude.'''
+    return np.abs(librosa.stft(audio, hop_length=hop))
 
 
 _FEATURES = {
@@ -87,6 +104,36 @@ _FEATURES = {
     'high_rms': _feat_high_rms,
     'onset': _feat_onset,
 }
+# features that accept a precomputed STFT magnitude via S=
+_STFT_FEATURES = {'flux', 'onset'}
+
+
+class FeatureCache:
+    '''
+    lazy per signal feature store. the STFT magnitude is computed once per hop
+    and shared by the STFT based features; every envelope is memoized per
+    (feature, hop). build one for the reference and reuse it for all targets.
+    '''
+    def __init__(self, audio: np.ndarray, sr: int):
+        self.audio = audio
+        self.sr = sr
+        self._stft: dict[int, np.ndarray] = {}
+        self._env: dict[tuple[str, int], np.ndarray] = {}
+
+    def stft(self, hop: int = DEFAULT_HOP) -> np.ndarray:
+        if hop not in self._stft:
+            self._stft[hop] = _stft_mag(self.audio, hop)
+        return self._stft[hop]
+
+    def get(self, feat_name: str, hop: int = DEFAULT_HOP) -> np.ndarray:
+        key = (feat_name, hop)
+        if key not in self._env:
+            fn = _FEATURES[feat_name]
+            if feat_name in _STFT_FEATURES:
+                self._env[key] = fn(self.audio, self.sr, hop, S=self.stft(hop))
+            else:
+                self._env[key] = fn(self.audio, self.sr, hop)
+        return self._env[key]
 
 
 # matchers: pair of envelopes -> correlation array (scipy 'full' convention)
@@ -109,17 +156,82 @@ def _match_gcc_phat(ref_env: np.ndarray, tgt_env: np.ndarray) -> np.ndarray:
     return np.concatenate((cc[-(len(ref_env) - 1):], cc[:len(tgt_env)]))
 
 
+def _xcorr_window(t: np.ndarray, r: np.ndarray, max_lag: int) -> np.ndarray:
+    '''
+    c[k] = sum_n t[n+k] * r[n] for k in [-max_lag, max_lag], via overlap save:
+    r is cut into blocks, each block is correlated against its padded target
+    segment, and the block spectra are summed before a single inverse FFT.
+    lags without overlap are 0. index max_lag is lag 0.
+    '''
+    L = max_lag
+    B = max(2 * L, 1024)
+    nfft = 1 << (B + 2 * L - 1).bit_length()
+    n_blocks = -(-len(r) // B)
+    # pad target with L zeros in front, enough behind for the last block
+    tp = np.zeros(n_blocks * B + 2 * L)
+    m = min(len(t), len(tp) - L)
+    tp[L:L + m] = t[:m]
+    rp = np.zeros(n_blocks * B)
+    rp[:len(r)] = r
+    seg = np.lib.stride_tricks.sliding_window_view(tp, B + 2 * L)[::B][:n_blocks]
+    R = np.fft.rfft(rp.reshape(n_blocks, B), nfft, axis=1)
+    T = np.fft.rfft(seg, nfft, axis=1)
+    return np.fft.irfft((T * np.conj(R)).sum(axis=0), nfft)[:2 * L + 1]
+
+
+def _match_xcorr_bounded(ref_env: np.ndarray, tgt_env: np.ndarray,
+                         max_lag: int) -> np.ndarray:
+    '''
+    xcorr_norm restricted to lags within ±max_lag envelope samples. returns
+    2*max_lag+1 values, lag 0 at index max_lag. same values as xcorr_norm on
+    those lags, unless the coarse pass (COARSE_FACTOR > 1) is on: then only
+    the neighbourhood of the coarse peak is exact, the rest is the coarse
+    correlation interpolated and rescaled.
+    '''
+    r = (ref_env - ref_env.mean()) / (ref_env.std() + 1e-12)
+    t = (tgt_env - tgt_env.mean()) / (tgt_env.std() + 1e-12)
+    D = COARSE_FACTOR
+    if D <= 1 or max_lag < 4 * D:
+        return _xcorr_window(t, r, max_lag)
+
+    # coarse: block mean decimation, correlate over ±max_lag/D
+    def _dec(x):
+        x = x[:len(x) // D * D].reshape(-1, D).mean(axis=1)
+        return (x - x.mean()) / (x.std() + 1e-12)
+    Lc = -(-max_lag // D)
+    coarse = _xcorr_window(_dec(t), _dec(r), Lc) * D
+    lags = np.arange(-max_lag, max_lag + 1)
+    corr = np.interp(lags, np.arange(-Lc, Lc + 1) * D, coarse)
+
+    # fine: exact values within ±2D of the coarse peak
+    peak = (int(np.argmax(coarse)) - Lc) * D
+    for k in range(max(-max_lag, peak - 2 * D), min(max_lag, peak + 2 * D) + 1):
+        if k >= 0:
+            n = min(len(t) - k, len(r))
+            corr[k + max_lag] = np.dot(t[k:k + n], r[:n]) if n > 0 else 0.0
+        else:
+            n = min(len(t), len(r) + k)
+            corr[k + max_lag] = np.dot(t[:n], r[-k:-k + n]) if n > 0 else 0.0
+    return corr
+
+
 _MATCHERS = {
     'xcorr_norm': _match_xcorr_norm,
     'gcc_phat':   _match_gcc_phat,
+    'xcorr_bounded': _match_xcorr_bounded,
 }
+# matchers that take max_lag (envelope samples) and return a ±max_lag window
+_BOUNDED_MATCHERS = {'xcorr_bounded'}
+# full matcher -> bounded variant, used when a max lag is given
+_BOUNDED_VARIANT = {'xcorr_norm': 'xcorr_bounded'}
 
 
 # helpers
 # ──────────────────────────────────────────────────────────────────────────
 
-def _lag_to_frames(argmax: int, ref_len: int, sr: int, hop: int, fps: float) -> int:
-    lag_samples = argmax - (ref_len - 1)
+def _lag_to_frames(argmax: int, zero_idx: int, sr: int, hop: int, fps: float) -> int:
+    '''zero_idx: index of lag 0 in the correlation (len(ref) - 1 for scipy 'full').'''
+    lag_samples = argmax - zero_idx
     return int(round(lag_samples * (hop / sr) * fps))
 
 
@@ -162,64 +274,102 @@ def extract_audio(video_path: str, sample_rate: int = 48000,
     extracts a short segment of audio from the video using ffmpeg.
     - duration: seconds to extract.
     - sample_rate: target audio rate in Hz.
+
+    ffmpeg resamples and downmixes, then writes raw f32le PCM to stdout which
+    is read straight into numpy. no temp file, so concurrent calls are safe.
+    the returned array is a read-only view on the pipe buffer.
     '''
     if not os.path.exists(video_path):
         raise FileNotFoundError(f'extract_audio: cannot find {video_path}')
  
-    temp_audio = "mky_temp_audio.wav"
     cmd = [
-        ffmpeg_path, "-y", "-i", video_path,
+        ffmpeg_path, "-i", video_path,
         "-ss", str(start),
         "-ac", "1",
         "-ar", str(sample_rate),
         "-t", str(duration),
-        "-vn", "-loglevel", "error", temp_audio
+        "-vn", "-loglevel", "error",
+        "-f", "f32le", "-acodec", "pcm_f32le", "pipe:1"
     ]
     try:
-        result = subprocess.run(cmd, stdout=subprocess.DEVNULL)
+        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
     except Exception:
         raise RuntimeError("audio extraction failed. ffmpeg may not be configured correctly")
     if result.stderr:
-        lg.error(result.stderr)
-    audio, _ = librosa.load(temp_audio, sr=sample_rate)
-    os.remove(temp_audio)
+        lg.error(result.stderr.decode(errors='ignore').strip())
+    if result.returncode != 0 or not result.stdout:
+        raise RuntimeError(f'audio extraction failed for {os.path.basename(video_path)} (rc={result.returncode})')
+    audio = np.frombuffer(result.stdout, dtype='<f4')
     lg.debug(f'extracted audio from {os.path.basename(video_path)}')
-    # return the requested rate. librosa.load is typed as int | float in
-    # stubs but with sr=sample_rate it always returns exactly sample_rate.
     return audio, sample_rate
 
 
+def extract_audio_many(video_paths: list[str], sample_rate: int = 48000,
+                       duration: float = 30, start: float = 0,
+                       max_workers: int | None = None) -> list[tuple[np.ndarray, int] | Exception]:
+    '''
+    extract_audio for several videos at once, one ffmpeg process per video.
+    results keep input order; a failed extraction is returned as its exception.
+    '''
+    def _one(path: str) -> tuple[np.ndarray, int] | Exception:
+        try:
+            return extract_audio(path, sample_rate=sample_rate, duration=duration, start=start)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(video_paths) or 1) as pool:
+        return list(pool.map(_one, video_paths))
+
+
 # core sync
 # ──────────────────────────────────────────────────────────────────────────
 
-def find_best_sync_offset(ref_audio: np.ndarray, target_audio: np.ndarray,
+def find_best_sync_offset(ref_audio: np.ndarray | FeatureCache,
+                          target_audio: np.ndarray | FeatureCache,
                           sr: int, fps: float = 119.88,
-                          hop_length: int = DEFAULT_HOP) -> tuple[int, int]:
+                          hop_length: int = DEFAULT_HOP,
+                          max_lag_sec: float | None = None) -> tuple[int, int]:
     '''
     finds frame offset of target relative to reference. each probe runs
     independently and reports its own self confidence via top2 peak ratio.
     probes below THRES_PEAK are dropped, then the remaining lags must form
     a cluster of at least MIN_AGREEMENT within ±AGREEMENT_TOL_FRAMES.
 
+    either signal may be passed as a FeatureCache so its envelopes are
+    reused across calls (e.g. one reference against many targets).
+    max_lag_sec bounds the searched offset: probes with a bounded variant
+    (see _BOUNDED_VARIANT) only evaluate lags within ±max_lag_sec.
+
     returns (frame_offset, agreement_count). raises ValueError on rejection.
     '''
+    ref = ref_audio if isinstance(ref_audio, FeatureCache) else FeatureCache(ref_audio, sr)
+    tgt = target_audio if isinstance(target_audio, FeatureCache) else FeatureCache(target_audio, sr)
     lags: list[int] = []
     detail: list[str] = []
     dropped: list[str] = []
     min_sep = max(10, int(PEAK_MIN_SEP_SEC * sr / hop_length))
+    max_lag = None if max_lag_sec is None else max(1, int(max_lag_sec * sr / hop_length))
 
     for feat_name, match_name in PROBES:
+        if max_lag is not None:
+            match_name = _BOUNDED_VARIANT.get(match_name, match_name)
         tag = f'{feat_name}/{match_name}'
         try:
-            ref_env = _FEATURES[feat_name](ref_audio, sr, hop_length)
-            tgt_env = _FEATURES[feat_name](target_audio, sr, hop_length)
-            corr = _MATCHERS[match_name](ref_env, tgt_env)
+            ref_env = ref.get(feat_name, hop_length)
+            tgt_env = tgt.get(feat_name, hop_length)
+            if match_name in _BOUNDED_MATCHERS:
+                lag_bound = max_lag if max_lag is not None else len(ref_env) - 1
+                corr = _MATCHERS[match_name](ref_env, tgt_env, lag_bound)
+                zero_idx = lag_bound
+            else:
+                corr = _MATCHERS[match_name](ref_env, tgt_env)
+                zero_idx = len(ref_env) - 1
             top2 = _peak_top2_ratio(corr, min_sep)
             if top2 < THRES_PEAK:
                 dropped.append(f'{tag}(top2={top2:.2f})')
                 continue
             argmax = int(np.argmax(corr))
-            frame_offset = _lag_to_frames(argmax, len(ref_env), sr, hop_length, fps)
+            frame_offset = _lag_to_frames(argmax, zero_idx, sr, hop_length, fps)
             lags.append(frame_offset)
             detail.append(f'{tag}={frame_offset}(top2={top2:.1f})')
         except Exception as e:
@@ -256,11 +406,13 @@ def sync_videos(video_paths: list[str],
                 fps: float = 119.88,
                 duration: float = 30,
                 start: float = 0,
+                max_lag_sec: float | None = None,
                 **kwargs) -> dict[str, tuple[str, np.ndarray, int]]:
     '''
     synchronizes a set of videos by audio. returns a dict with key 'reference'
     for the first video and each subsequent video path mapping to a tuple of
     (path, audio, frame_offset). frame_offset is None on sync failure.
+    max_lag_sec: optional bound on camera start offsets, see find_best_sync_offset.
 
     extra kwargs (e.g. manual_fallback) are accepted but ignored, for
     backward compatibility with older call sites.
@@ -274,15 +426,22 @@ def sync_videos(video_paths: list[str],
     probe_summary = ' '.join(f'{f}/{m}' for f, m in PROBES)
     lg.info(f'syncing {len(video_paths)} videos | probes: {probe_summary}')
 
-    ref_audio, sr = extract_audio(video_paths[0], duration=duration, start=start)
+    # ffmpeg runs out of process, so threads are enough to overlap the extractions
+    extracted = extract_audio_many(video_paths, duration=duration, start=start)
+    for ext in extracted:
+        if isinstance(ext, Exception):
+            raise ext
+    ref_audio, sr = cast(tuple[np.ndarray, int], extracted[0])
     sync_results: dict[str, Any] = {"reference": (video_paths[0], ref_audio, 0)}
+    ref_feats = FeatureCache(ref_audio, sr)    # reference envelopes shared by all targets
 
     n_ok = 0
-    for video in video_paths[1:]:
+    for video, ext in zip(video_paths[1:], extracted[1:]):
         name = os.path.basename(video)
-        target_audio, _ = extract_audio(video, duration=duration, start=start)
+        target_audio, _ = cast(tuple[np.ndarray, int], ext)
         try:
-            frame_offset, agreement = find_best_sync_offset(ref_audio, target_audio, sr, fps)
+            frame_offset, agreement = find_best_sync_offset(ref_feats, target_audio, sr, fps,
+                                                              max_lag_sec=max_lag_sec)
             label = _agreement_label(agreement, len(PROBES))
             msg = f'{name}: offset={frame_offset} frames, {label} confidence ({agreement}/{len(PROBES)})'
             if label == 'high':
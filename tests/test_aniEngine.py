@@ -0,0 +1,58 @@
+import os
+import pytest
+
+from ammonkey.core import aniEngine
+from ammonkey.core.aniEngine import threadPlan, threadEnv
+
+
+def test_thread_plan_fits_budget():
+    assert threadPlan(25, 32) == (16, 2)    # more daets than slots: 2 threads each
+    assert threadPlan(4, 32) == (4, 8)      # few daets share out the whole budget
+    assert threadPlan(3, 1) == (1, 1)
+    for n in (1, 7, 25, 100):
+        workers, per = threadPlan(n, 24)
+        assert workers <= n and workers * per <= 24
+
+
+def test_thread_env_scoped_to_pool(monkeypatch):
+    monkeypatch.setenv('OMP_NUM_THREADS', '4')
+    monkeypatch.delenv('NUMBA_NUM_THREADS', raising=False)
+    with aniEngine._environ(threadEnv(3)):
+        assert os.environ['OMP_NUM_THREADS'] == os.environ['NUMBA_NUM_THREADS'] == '3'
+    assert os.environ['OMP_NUM_THREADS'] == '4' and 'NUMBA_NUM_THREADS' not in os.environ
+
+
+def test_no_work_needs_no_anipose(tmp_path):
+    assert aniEngine.triangulateDaets(tmp_path / 'config.toml', []) == {}
+
+
+def test_daemonic_process_runs_serially(tmp_path, monkeypatch):
+    import sys, types
+    class Daemon:
+        daemon = True
+    class CameraGroup:
+        load = staticmethod(lambda path: f'loaded {path}')
+    original = vars(CameraGroup)['load']
+    cameras = types.ModuleType('aniposelib.cameras')
+    cameras.CameraGroup = CameraGroup
+    monkeypatch.setitem(sys.modules, 'aniposelib', types.ModuleType('aniposelib'))
+    monkeypatch.setitem(sys.modules, 'aniposelib.cameras', cameras)
+
+    def no_pool(*a, **k):
+        raise AssertionError('daemonic processes are not allowed to have children')
+    seen = []
+    def triangulate(cfg, d):
+        seen.append((os.environ['OMP_NUM_THREADS'], getattr(CameraGroup.load, 'shared', False)))
+        return d, not d.endswith('bad'), 'no pose-3d csv'
+    monkeypatch.setattr(aniEngine, 'aniposeAvailable', lambda: True)
+    monkeypatch.setattr(aniEngine.mp, 'current_process', lambda: Daemon())
+    monkeypatch.setattr(aniEngine, 'ProcessPoolExecutor', no_pool)
+    monkeypatch.setattr(aniEngine, '_triangulateDaet', triangulate)
+    monkeypatch.setenv('OMP_NUM_THREADS', '64')
+
+    dirs = [tmp_path / 'good', tmp_path / 'bad']
+    assert aniEngine.triangulateDaets(tmp_path / 'config.toml', dirs, total_threads=6) == \
+        {dirs[0]: True, dirs[1]: False}
+    assert seen == [('6', True), ('6', True)]   # whole budget, shared calibration
+    assert vars(CameraGroup)['load'] is original and aniEngine._calib is None
+    assert os.environ['OMP_NUM_THREADS'] == '64'
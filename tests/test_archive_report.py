@@ -0,0 +1,96 @@
+import pytest
+import pandas as pd
+from pathlib import Path
+
+from ammonkey.core import expNote, pipelineState
+from ammonkey.core.expNote import ExpNote
+from ammonkey.core.noteCatalog import NoteHandle
+from ammonkey.core.pipelineState import PipelineState, Stage, StageStatus
+from ammonkey.utils import archive_report as ar
+
+MS = 'Pull-LR-20250801_1234'
+
+
+@pytest.fixture
+def archive(tmp_path: Path, monkeypatch) -> Path:
+    """Two days of Pull + TS. Only 20250301 Pull has anipose output."""
+    monkeypatch.setattr(expNote, 'NOTE_CACHE_DIR', tmp_path / 'note_cache')
+    monkeypatch.setattr(expNote, '_note_cache', None)
+    monkeypatch.setattr(pipelineState, 'STATE_ENABLED', False)
+    monkeypatch.setattr(ar, 'CACHE_DIR', tmp_path / 'report_cache')
+    monkeypatch.setattr(ar, '_cache', None)
+
+    animal_dir = tmp_path / 'DATA_RAW' / 'Pici'
+    for date in ('20250301', '20250302'):
+        day = animal_dir / '2025' / '03' / date
+        day.mkdir(parents=True)
+        pd.DataFrame({
+            'Experiment': ['Pull', 'TS'],
+            'Task': ['1', '2'],
+            'Camera files \n(1 LR)': [1, 3],
+            'Camera files \n(2 LL)': [2, 4],
+            'Camera files (3 RR)': [1, 3],
+            'Camera files (4 RL)': [2, 4],
+        }).to_excel(day / f'Pici_{date}.xlsx', index=False)
+
+    note = ExpNote(animal_dir / '2025' / '03' / '20250301')
+    pull = note.daets[0]
+    (note.getDaetDlcRoot(pull) / MS).mkdir(parents=True)
+    csv_dir = note.getAniRoot() / MS / str(pull) / 'pose-3d'
+    csv_dir.mkdir(parents=True)
+    (csv_dir / f'{pull}.csv').touch()
+    return animal_dir
+
+
+def test_report_table_and_pending(archive: Path):
+    df = ar.archive_report(archive, start='2025', max_workers=2)
+    assert list(df.columns) == ar.COLUMNS
+    assert df['daet'].nunique() == 4
+    done = df[df['done']]
+    assert set(zip(done['stage'], done['model_set'])) == {('dlc', MS), ('anipose', MS)}
+    assert ar.pending(df, 'anipose', task='pull') == ['20250302-Pici-Pull-1']
+    assert len(ar.pending(df, 'sync')) == 4
+
+
+def test_report_cache_follows_directories(archive: Path, monkeypatch):
+    ar.archive_report(archive)
+    calls = []
+    real = ar.daet_rows
+    monkeypatch.setattr(ar, 'daet_rows', lambda sc: calls.append(sc.note.date) or real(sc))
+
+    ar.archive_report(archive)
+    assert calls == []
+
+    note = ExpNote(archive / '2025' / '03' / '20250302')
+    csv_dir = note.getAniRoot() / MS / str(note.daets[0]) / 'pose-3d'
+    csv_dir.mkdir(parents=True)
+    (csv_dir / 'x.csv').touch()
+    df = ar.archive_report(archive)
+    assert calls == ['20250302']
+    assert ar.pending(df, 'anipose', task='pull') == []
+
+
+def test_cached_dates_skip_the_note(archive: Path, monkeypatch):
+    ar.archive_report(archive)
+    monkeypatch.setattr(NoteHandle, 'note', property(lambda h: pytest.fail(f'opened {h.date}')))
+    assert len(ar.archive_report(archive)) == 12
+
+
+def test_report_cache_follows_state_db(archive: Path, tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(pipelineState, 'STATE_ENABLED', True)
+    monkeypatch.setattr(pipelineState, '_state', PipelineState(tmp_path / 'state.db'))
+    ar.archive_report(archive)
+    calls = []
+    real = ar.daet_rows
+    monkeypatch.setattr(ar, 'daet_rows', lambda sc: calls.append(sc.note.date) or real(sc))
+
+    pipelineState.recordStage('20250302-Pici-TS-2', Stage.SYNC, StageStatus.FAILED)
+    ar.archive_report(archive)
+    ar.archive_report(archive)
+    assert calls == ['20250302']
+
+
+def test_save_csv(archive: Path, tmp_path: Path):
+    df = ar.archive_report(archive)
+    out = ar.save_report(df, tmp_path / 'status.csv')
+    assert len(pd.read_csv(out)) == len(df)
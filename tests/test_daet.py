@@ -50,6 +50,10 @@ class TestDAET:
         # The set should only contain one item because the two objects are equal
         assert len(daet_set) == 1
         assert hash(sample_daet) == hash(daet_copy)
+        # md5 of the fields, the same in every process whatever PYTHONHASHSEED
+        import hashlib
+        key = "'20250728'-'Pici'-'BRKM'-'1'"
+        assert hash(sample_daet) == hash(int(hashlib.md5(key.encode()).hexdigest(), 16))
 
     def test_info_property(self, sample_daet):
         """Tests the multi-line info string property."""
@@ -107,4 +111,48 @@ class TestDAET:
     def test_task_type_property(self, experiment_str, expected_task):
         """Tests the logic for identifying the task type from the experiment string."""
         daet = DAET('20250728', 'Pici', experiment_str, '1')
-        assert daet.task_type is expected_task
\ No newline at end of file
+        assert daet.task_type is expected_task
+
+    def test_classify_tasks_matches_task_match(self):
+        """The vectorized classifier agrees with Task.match, first task in task_match order wins."""
+        from ammonkey.core.daet import classify_tasks
+        names = ['some_bbt_test', 'brnk test', 'TS pull', 'Touch Screen', 'x', 'TS pull', '']
+        types = classify_tasks(pd.Series(names, index=range(10, 17)))
+        assert list(types.index) == list(range(10, 17))
+        assert [None if pd.isna(t) else t for t in types] == [Task.match(n) for n in names]
+        assert types[12] is Task.PULL
+
+    def test_daet_table(self):
+        """Bulk split of DAET strings follows fromString."""
+        from ammonkey.core.daet import daet_table
+        strs = ['20250403-Pici-TS-pull-1', '20250404-Pepe-calib-2']
+        df = daet_table(strs)
+        for s, row in zip(strs, df.itertuples()):
+            d = DAET.fromString(s)
+            assert (row.daet, row.date, row.animal, row.experiment, row.task, row.task_type) == \
+                (s, d.date, d.animal, d.experiment, d.task, d.task_type)
+        with pytest.raises(ValueError):
+            daet_table(['20250403-Pici-TS'])
+
+    def test_daet_frame_matches_daet_table(self):
+        """The table built from DAET fields equals the one split from their strings."""
+        from ammonkey.core.daet import daet_frame, daet_table
+        daets = [DAET.fromString(s) for s in ('20250403-Pici-TS-pull-1', '20250404-Pepe-calib-2', '20250405-Pepe-x-3')]
+        pd.testing.assert_frame_equal(daet_frame(daets), daet_table(str(d) for d in daets))
+        assert list(daet_frame([]).columns) == list(daet_table([]).columns)
+
+    def test_from_string_interns(self):
+        """Equal DAETs from the factories are the same object, also after pickling."""
+        import pickle
+        a = DAET.fromString('20250403-Pici-TS-1')
+        row = pd.Series({'Experiment': ' TS ', 'Task': '1'})
+        assert DAET.fromRow(row, '20250403', 'Pici') is a
+        assert pickle.loads(pickle.dumps(a)) is a
+        plain = DAET('20250403', 'Pici', 'TS', '1')
+        assert plain is not a and plain == a and hash(plain) == hash(a)
+
+    def test_is_immutable(self, sample_daet):
+        with pytest.raises(AttributeError):
+            sample_daet.task = '2'
+        with pytest.raises(AttributeError):
+            sample_daet.extra = 1
\ No newline at end of file
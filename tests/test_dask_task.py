@@ -0,0 +1,122 @@
+import os
+import pytest
+import pandas as pd
+from pathlib import Path
+
+from ammonkey.core import expNote
+from ammonkey.core.daet import Task
+from ammonkey.core.expNote import ExpNote
+from ammonkey.dask.dask_task import NoteCache, note_key
+
+
+@pytest.fixture
+def note(tmp_path: Path, monkeypatch) -> ExpNote:
+    monkeypatch.setattr(expNote, 'NOTE_CACHE_DIR', tmp_path / 'note_cache')
+    monkeypatch.setattr(expNote, '_note_cache', None)
+    session = tmp_path / 'Pici' / '2025' / '07' / '20250728'
+    session.mkdir(parents=True)
+    pd.DataFrame({
+        'Experiment': ['TS', 'TS', 'BBT', 'calib'],
+        'Task': ['1', '1', '2', '3'],
+        'Camera files \n(1 LR)': [1, 3, 5, 7],
+        'Camera files \n(2 LL)': [2, 4, '-', 8],
+        'Camera files (3 RR)': [1, 3, 5, 7],
+        'Camera files (4 RL)': [2, 4, 6, 8],
+        'VOID': [None, None, 'T', None],
+    }).to_excel(session / 'Pici_20250728.xlsx', index=False)
+    return ExpNote(session)
+
+
+def test_snapshot_roundtrip(note: ExpNote, tmp_path: Path):
+    cache = NoteCache(tmp_path / 'dask_cache')
+    loaded = cache.load_note(cache.save_note(note))
+
+    assert loaded.daets == note.daets
+    assert (loaded.animal, loaded.date, loaded.data_path) == (note.animal, note.date, note.data_path)
+    assert loaded.cam_config == note.cam_config
+    for daet in note.daets:
+        assert loaded.getVidSetIdx(daet) == note.getVidSetIdx(daet)
+        assert loaded.is_daet_void(daet) == note.is_daet_void(daet)
+        assert loaded.getRow(daet)['is_calib'] == note.getRow(daet)['is_calib']
+    assert loaded.getValidDaets() == note.getValidDaets()
+    assert loaded.daets_by_task == note.daets_by_task
+
+
+def test_snapshot_key_is_stable_and_reused(note: ExpNote, tmp_path: Path):
+    cache = NoteCache(tmp_path / 'dask_cache')
+    path = cache.save_note(note)
+    before = path.stat().st_mtime_ns
+    os.utime(path, ns=(before - 10**9, before - 10**9))
+
+    again = ExpNote(note.path)
+    assert note_key(again) == note_key(note)
+    assert cache.save_note(again) == path and len(list(cache.cache_dir.iterdir())) == 1
+    assert path.stat().st_mtime_ns > before - 10**9     # reuse keeps it out of cleanup
+
+    ts = note.applyTaskFilter(Task.TS)
+    ts_path = cache.save_note(ts)
+    assert ts_path != path
+    assert cache.load_note(ts_path).daets == ts.daets
+
+    pd.read_excel(note.xlsx_path).assign(Task=['1', '1', '2', '4']).to_excel(note.xlsx_path, index=False)
+    assert note_key(ExpNote(note.path)) != note_key(note)
+
+
+def test_sync_pipeline_is_per_daet(note: ExpNote, monkeypatch):
+    from ammonkey.core import pipelineState
+    from ammonkey.dask.dask_factory import create_full_pipeline, create_sync_pipeline
+    from ammonkey.dask.dask_task import DaskType
+    monkeypatch.setattr(pipelineState, 'STATE_ENABLED', False)
+    note.data_path.mkdir(parents=True, exist_ok=True)
+    valid = note.getValidDaets()
+
+    tasks = create_sync_pipeline(note)
+    detect = [t for t in tasks if t.type == DaskType.SYNC_DETECT]
+    video = [t for t in tasks if t.type == DaskType.SYNC_VIDEO]
+    assert [t.get_daets() for t in detect] == [[d] for d in valid]
+    for det, vid in zip(detect, video):
+        assert vid.get_daets() == det.get_daets() and vid.dependencies == [det.id]
+    assert len({t.note_cache_path for t in tasks}) == 1
+
+    whole = create_sync_pipeline(note, per_daet=False)
+    assert [t.type for t in whole].count(DaskType.SYNC_DETECT) == 1
+
+    full = create_full_pipeline(note, 'TS-LR')
+    dlc = [t for t in full if t.type == DaskType.DLC_SINGLE and t.get_daets()[0] in valid]
+    assert dlc and all(t.dependencies == [f'sync_detect_{t.get_daets()[0]}', f'sync_video_{t.get_daets()[0]}']
+                       for t in dlc)
+
+
+def test_dlc_bundles_group_units_by_model(note: ExpNote, tmp_path: Path, monkeypatch):
+    from ammonkey.core import pipelineState
+    from ammonkey.core.camConfig import CamGroup
+    from ammonkey.core.dlc import DLCModel, create_processor
+    from ammonkey.dask import dask_factory
+    from ammonkey.dask.dask_task import DaskType
+    monkeypatch.setattr(pipelineState, 'STATE_ENABLED', False)
+    left = DLCModel('TS-L', tmp_path / 'l' / 'config.yaml', short='TS-L')
+    right = DLCModel('TS-R', tmp_path / 'r' / 'config.yaml', short='TS-R')
+    wiring = {CamGroup.LEFT: left, CamGroup.RIGHT: right}
+    monkeypatch.setattr(dask_factory, 'dp_factory', {'TS-LR': create_processor(wiring)})
+
+    other_day = note.path.parent / '20250729'
+    other_day.mkdir()
+    pd.read_excel(note.xlsx_path).to_excel(other_day / 'Pici_20250729.xlsx', index=False)
+    notes = [note, ExpNote(other_day)]
+    for n in notes:
+        n.sync_path.mkdir(parents=True)
+
+    tasks = dask_factory.create_dlc_bundles(notes, 'TS-LR')
+    bundles = [t for t in tasks if t.type == DaskType.DLC_BUNDLE]
+    merges = [t for t in tasks if t.type == DaskType.DLC_MERGE]
+    assert {b.params['model']['name'] for b in bundles} == {'TS-L', 'TS-R'}
+    for b in bundles:   # every non-calib valid daet of both days, in its model's group dir
+        group = 'L' if b.params['model']['name'] == 'TS-L' else 'R'
+        assert len(b.params['units']) == 4
+        assert all(Path(u['vid_path']).name == group for u in b.params['units'])
+    assert [m.params['note_date'] for m in merges] == ['20250728', '20250729']
+    assert all(sorted(m.dependencies) == sorted(b.id for b in bundles) for m in merges)
+
+    chunked = dask_factory.create_dlc_bundles(notes, 'TS-LR', units_per_task=3)
+    assert sorted(len(t.params['units']) for t in chunked if t.type == DaskType.DLC_BUNDLE) == [1, 1, 3, 3]
+    assert len({t.id for t in chunked}) == len(chunked)
@@ -0,0 +1,98 @@
+import pytest
+import pandas as pd
+from pathlib import Path
+
+from ammonkey.core import expNote, pipelineState
+from ammonkey.core.ani import AniposeProcessor, CalibLib
+from ammonkey.core.camConfig import CamGroup
+from ammonkey.core.daet import DAET
+from ammonkey.core.dlc import DLCModel, DLCProcessor
+from ammonkey.core.expNote import ExpNote
+from ammonkey.core.pipelineState import PipelineState, Stage, StageStatus
+
+D1 = DAET('20250728', 'Pici', 'TS', '1')
+
+
+@pytest.fixture
+def state(tmp_path: Path, monkeypatch) -> PipelineState:
+    st = PipelineState(tmp_path / 'state.db')
+    monkeypatch.setattr(pipelineState, '_state', st)
+    monkeypatch.setattr(expNote, 'NOTE_CACHE_DIR', tmp_path / 'note_cache')
+    monkeypatch.setattr(expNote, '_note_cache', None)
+    return st
+
+
+@pytest.fixture
+def processor(tmp_path: Path, state) -> DLCProcessor:
+    session = tmp_path / 'Pici' / '2025' / '07' / '20250728'
+    session.mkdir(parents=True)
+    pd.DataFrame({
+        'Experiment': ['TS'],
+        'Task': ['1'],
+        'Camera files \n(1 LR)': [1],
+        'Camera files \n(2 LL)': [2],
+        'Camera files (3 RR)': [1],
+        'Camera files (4 RL)': [2],
+    }).to_excel(session / 'Pici_20250728.xlsx', index=False)
+    models = {CamGroup.LEFT: DLCModel('TS-LJan30', tmp_path / 'l.yaml', short='TS-L'),
+              CamGroup.RIGHT: DLCModel('TS-RJan30', tmp_path / 'r.yaml', short='TS-R')}
+    note = ExpNote(session)
+    note.sync_path.mkdir(parents=True)
+    return DLCProcessor(note, models, run_date='20250801')
+
+
+def make_tree(model: DLCModel, vid_dir: Path) -> Path:
+    tree = model._getPeedTree(vid_dir)
+    tree.mkdir(parents=True)
+    (tree / f'{vid_dir.name}DLC_filtered.h5').touch()
+    return tree
+
+
+def test_pinned_run_date(tmp_path: Path):
+    model = DLCModel('TS-LJan30', tmp_path / 'l.yaml', short='TS-L')
+    pinned = model.pinned('20250801')
+    assert pinned.final_folder_name == f'TS-L-20250801 [{model.md5_short}]'
+    assert pinned == model and hash(pinned) == hash(model)
+    assert DLCModel.fromDict(pinned.toDict()).run_date == '20250801'
+
+
+def test_output_trees_prefer_reported_then_run_then_latest(processor: DLCProcessor):
+    (l_model, l_dir), (r_model, r_dir) = processor.workUnits(D1)
+    assert processor.outputTrees(D1) is None
+
+    old_r = make_tree(r_model.pinned('20250601'), r_dir)
+    newer_r = make_tree(r_model.pinned('20250701'), r_dir)
+    this_l = make_tree(l_model, l_dir)
+    assert processor.outputTrees(D1) == [this_l, newer_r]
+    assert processor.outputTrees(D1, {r_dir: old_r}) == [this_l, old_r]
+
+
+def test_merge_records_result(processor: DLCProcessor, state: PipelineState):
+    assert not processor.mergeSingleDaet(D1)    # nothing to merge
+    assert state.get(D1, Stage.DLC, processor.final_dlc_folder_name).status == StageStatus.FAILED
+
+    for model, vid_dir in processor.workUnits(D1):
+        make_tree(model, vid_dir)
+    assert processor.mergeSingleDaet(D1)
+    done = state.query(daets=[D1], stage=Stage.DLC, status=StageStatus.DONE)
+    assert [r.model_set for r in done] == ['TS-LR-20250801_' + done[0].model_set[-4:]]
+    assert len(list(Path(done[0].outputs[0]).glob('*.h5'))) == 2
+
+
+def test_merge_keeps_unfiltered_for_anipose(tmp_path: Path, processor: DLCProcessor):
+    for model, vid_dir in processor.workUnits(D1):
+        tree = model._getPeedTree(vid_dir)
+        tree.mkdir(parents=True)
+        for post in ('', '_filtered'):
+            (tree / f'{D1}-cam{vid_dir.name}DLC_resnet50_{model.id_output}_1000{post}.h5').write_bytes(b'h5')
+    assert processor.mergeSingleDaet(D1)
+
+    (tmp_path / 'calibs').mkdir()
+    (tmp_path / 'calibs' / 'calibration_20250728.toml').touch()
+    (tmp_path / 'config.toml').touch()
+    ap = AniposeProcessor(processor.note, processor.final_dlc_folder_name,
+                          config_file=tmp_path / 'config.toml', calib_lib=CalibLib(tmp_path / 'calibs'))
+    ap.ani_root_path.mkdir(parents=True)
+    ap.setupSingleDaet(D1, use_filtered=False)
+    staged = sorted(p.name for p in (ap.ani_root_path / str(D1) / 'pose-2d-filtered').iterdir())
+    assert staged == [f'{D1}-camL.h5', f'{D1}-camR.h5']
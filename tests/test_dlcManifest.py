@@ -0,0 +1,76 @@
+import os
+import pytest
+from pathlib import Path
+
+from ammonkey.core.dlc import DLCModel
+from ammonkey.core.dlcManifest import SkipManifest, MANIFEST_NAME
+
+
+def make_model(root: Path, name: str) -> DLCModel:
+    model = DLCModel(name, root / name / 'config.yaml', short=name)
+    model.model_path.mkdir(parents=True)
+    (model.model_path / 'snapshot-1000.index').touch()
+    model.cfg_path.touch()
+    return model
+
+
+def analyze(model: DLCModel, video: Path) -> None:
+    """What DLC leaves next to a video."""
+    for suffix in ('.h5', '.csv', '_filtered.h5'):
+        (video.parent / f'{video.stem}DLC_resnet50_{model.id_output}_1000{suffix}').touch()
+
+
+@pytest.fixture
+def folder(tmp_path: Path) -> Path:
+    d = tmp_path / '20250728-Pici-BBT-1' / 'L'
+    d.mkdir(parents=True)
+    for cam in ('cam1', 'cam2'):
+        (d / f'{cam}.mp4').write_bytes(cam.encode() * 100)
+    return d
+
+
+def test_per_video_per_model(tmp_path: Path, folder: Path):
+    model, other = make_model(tmp_path, 'BBT-L'), make_model(tmp_path, 'TS-L')
+    videos = sorted(folder.glob('*.mp4'))
+    for v in videos:
+        analyze(model, v)
+    SkipManifest.load(folder).record(model, videos, model.snapshot)
+
+    rec = SkipManifest.load(folder).data['models'][f'{model.md5:032x}']['videos']['cam1.mp4']
+    assert rec['outputs'] == sorted(f'cam1DLC_resnet50_{model.id_output}_1000{s}'
+                                    for s in ('.h5', '.csv', '_filtered.h5'))
+    assert model.should_skip(folder) and model.should_skip(folder / '.skipDLC')
+    assert not other.should_skip(folder)
+
+    (folder / 'cam3.mp4').write_bytes(b'new')
+    assert [v.name for v in model.pendingVideos(folder)] == ['cam3.mp4']
+    assert model.should_skip(folder / 'cam1.mp4')
+
+    st = os.stat(videos[0])     # copied: same content, new mtime
+    os.utime(videos[0], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert SkipManifest.load(folder).isDone(model, videos[0], model.snapshot)
+
+    videos[1].write_bytes(b're-exported')
+    manifest = SkipManifest.load(folder)
+    assert not manifest.isDone(model, videos[1], model.snapshot)
+    assert {p.name for p in manifest.staleOutputs(model, videos[1])} == \
+        {n.replace('cam1', 'cam2') for n in rec['outputs']}
+
+    (model.model_path / 'snapshot-2000.index').touch()
+    assert len(model.pendingVideos(folder)) == 3
+
+
+def test_missing_outputs_and_legacy_folders(tmp_path: Path, folder: Path):
+    model = make_model(tmp_path, 'BBT-L')
+    cam1, cam2 = sorted(folder.glob('*.mp4'))
+
+    analyze(model, cam1)        # analyzed before the manifest existed
+    assert model.pendingVideos(folder) == [cam2]
+
+    analyze(model, cam2)
+    SkipManifest.load(folder).record(model, [cam1, cam2], model.snapshot)
+    next(folder.glob(f'cam2DLC*{model.id_output}*_1000.h5')).unlink()
+    assert model.pendingVideos(folder) == [cam2]
+
+    (folder / MANIFEST_NAME).write_text('{not json')
+    assert SkipManifest.load(folder).data['models'] == {}
@@ -0,0 +1,114 @@
+import json
+import threading
+import pytest
+from pathlib import Path
+
+from ammonkey.core import pipelineState
+from ammonkey.core.dlc import DLCModel
+from ammonkey.core.dlcServer import DLCServer
+from ammonkey.core.pipelineState import PipelineState, Stage, StageStatus
+
+DAET = '20250728-Pici-BBT-1'
+
+
+class EchoBackend:
+    """Writes DLC-named outputs for every video instead of running a network."""
+    def __init__(self):
+        self.loaded, self.released, self.analyzed = [], [], []
+        self.threads = set()
+
+    def load(self, model):
+        self.loaded.append(model.name)
+        return {'model': model.name}
+
+    def analyze(self, session, model, videos):
+        self.threads.add(threading.get_ident())
+        if videos[0].parent.name == 'bad':
+            raise RuntimeError('corrupt video')
+        self.analyzed.append((session['model'], videos[0].parent.name))
+        for video in videos:
+            for ext in ('.h5', '.csv'):
+                (video.parent / f'{video.stem}DLC_resnet50_{model.id_output}_1000{ext}').touch()
+
+    def release(self, session):
+        self.released.append(session['model'])
+
+
+def make_model(root: Path, name: str) -> DLCModel:
+    model = DLCModel(name, root / name / 'config.yaml', short=name)
+    model.model_path.mkdir(parents=True)
+    (model.model_path / 'snapshot-1000.index').touch()
+    model.cfg_path.touch()
+    return model
+
+
+@pytest.fixture
+def state(tmp_path: Path, monkeypatch) -> PipelineState:
+    st = PipelineState(tmp_path / 'state.db')
+    monkeypatch.setattr(pipelineState, '_state', st)
+    return st
+
+
+@pytest.fixture
+def vid_dirs(tmp_path: Path) -> list[Path]:
+    dirs = []
+    for group in ('L', 'R', 'bad'):
+        d = tmp_path / 'SynchronizedVideos' / DAET / group
+        d.mkdir(parents=True)
+        (d / f'{DAET}-cam{group}.mp4').write_bytes(b'v')
+        dirs.append(d)
+    return dirs
+
+
+def test_outputs_and_one_load_per_model(tmp_path: Path, state, vid_dirs):
+    left, right, bad = vid_dirs
+    model = make_model(tmp_path, 'BBT-L')
+    backend = EchoBackend()
+    server = DLCServer(backend)
+
+    assert server.run(model, [left, right, bad]) == {left: True, right: True, bad: False}
+    assert backend.loaded == ['BBT-L'] and server.loaded == [model.md5]
+    assert backend.threads and threading.get_ident() not in backend.threads
+
+    tree = model._getPeedTree(left)
+    assert (left / '.skipDLC').exists() and not (bad / '.skipDLC').exists()
+    assert len(list(tree.glob('*.h5'))) == 2        # both L and R, peed into one folder
+    assert json.loads((tree / 'inherit.json').read_text())['model_hash'] == model.md5
+    assert state.get(DAET, Stage.DLC_RUN, model.stateKey('L')).done
+    failed = state.get(DAET, Stage.DLC_RUN, model.stateKey('bad'))
+    assert failed.status == StageStatus.FAILED and failed.message == 'corrupt video'
+
+    assert server.submit(model, left).result() is True      # skipped as marked
+    assert len(backend.analyzed) == 2
+    server.stop()
+    assert backend.released == ['BBT-L'] and not server.running
+
+
+def test_lru_evicts_least_recent(tmp_path: Path, state, vid_dirs):
+    left = vid_dirs[0]
+    models = [make_model(tmp_path, n) for n in ('BBT-L', 'TS-L', 'Brkm-L')]
+    backend = EchoBackend()
+    server = DLCServer(backend, max_models=2)
+
+    for name in ('BBT-L', 'TS-L', 'BBT-L', 'Brkm-L', 'BBT-L'):
+        model = next(m for m in models if m.name == name)
+        assert server.submit(model, left, override_exist=True).result()
+    assert backend.loaded == ['BBT-L', 'TS-L', 'Brkm-L']
+    assert backend.released == ['TS-L']
+    assert server.loaded == [models[2].md5, models[0].md5]
+    server.stop()
+
+
+def test_rerun_analyzes_only_new_videos(tmp_path: Path, state, vid_dirs):
+    left = vid_dirs[0]
+    model = make_model(tmp_path, 'BBT-L')
+    backend = EchoBackend()
+    server = DLCServer(backend)
+    assert server.submit(model, left).result()
+
+    (left / f'{DAET}-camL2.mp4').write_bytes(b'v2')
+    assert server.submit(model, left).result()
+    assert server.submit(model, left).result()
+    assert backend.analyzed == [('BBT-L', 'L'), ('BBT-L', 'L')]
+    assert model.pendingVideos(left) == []
+    server.stop()
@@ -4,8 +4,16 @@ import pytest
 import pandas as pd
 from pathlib import Path
 from ammonkey.core.daet import DAET, Task
+from ammonkey.core import expNote
 from ammonkey.core.expNote import ExpNote
 
+@pytest.fixture(autouse=True)
+def isolated_note_cache(tmp_path: Path, monkeypatch):
+    """Keeps the parsed-note cache out of the home directory."""
+    monkeypatch.setattr(expNote, 'NOTE_CACHE_DIR', tmp_path / 'note_cache')
+    monkeypatch.setattr(expNote, '_note_cache', None)
+
+
 # This is the central fixture that builds a temporary, fake experiment directory.
 # All tests will use this fixture to get a clean, predictable environment.
 @pytest.fixture
@@ -145,6 +153,20 @@ class TestExpNote:
         assert len(ts_df) == 3 # 'TS', 'TS', 'TS_VOID'
         assert all(ts_df['Experiment'].str.contains('TS'))
 
+    def test_task_type_column(self, exp_note_setup: Path):
+        """task_type is computed once per note and drives the task filters."""
+        notes = ExpNote(exp_note_setup)
+        types = notes.df['task_type'].astype(object).where(notes.df['task_type'].notna(), None)
+        assert types.tolist() == [d.task_type for d in notes.df['daet']]
+        assert set(notes.getAllTaskTypes()) == {Task.TS, Task.BBT, Task.BRKM, Task.PULL}
+        assert not notes.has_calib     # 'PULL_calib' is a pull by task_match order
+        assert [d.experiment for d in notes.daets_by_task[Task.TS]] == ['TS', 'TS', 'TS_VOID']
+
+        only_bbt = notes.applyTaskFilter([Task.BBT, Task.CALIB])
+        assert [d.experiment for d in only_bbt.daets] == ['BBT']
+        assert list(only_bbt.daets_by_task) == [Task.BBT]
+        assert len(notes.applyTaskFilter(Task.TS, exclude=True).daets) == 4
+
     def test_duplication_with_whitelist(self, exp_note_setup: Path):
         """Tests creating a new ExpNote instance with only a whitelist of DAETs."""
         notes = ExpNote(exp_note_setup)
@@ -157,6 +179,29 @@ class TestExpNote:
         assert new_note.daets[1] == whitelist[1]
         assert new_note.animal == notes.animal # Make sure other properties are intact
 
+    @pytest.mark.filterwarnings('error::FutureWarning')   # int task column renamed to str
+    def test_views_share_rows_and_compose(self, exp_note_setup: Path, monkeypatch):
+        """Filtered notes are views: no re-parse, shared row records, stacked masks."""
+        notes = ExpNote(exp_note_setup)
+        monkeypatch.setattr(ExpNote, '_loadDataFrame', lambda *a: pytest.fail('re-parsed the note'))
+
+        ts = notes.applyTaskFilter(Task.TS)
+        assert ts.is_view and not notes.is_view
+        assert [d.experiment for d in ts.daets] == ['TS', 'TS', 'TS_VOID']
+        first = notes.daets[0]
+        assert ts._index()[first] is notes._index()[first]
+        assert ts.getRow(first).equals(notes.getRow(first))
+
+        ts_valid = ts.dupWithBlackList([first]).dupWithWhiteList(notes.getValidDaets())
+        assert ts_valid.daets == [notes.daets[1]]
+        assert not ts_valid.hasDaet(first) and ts_valid.getValidDaets() == [notes.daets[1]]
+        with pytest.raises(KeyError):
+            ts_valid.is_daet_void(notes.daets[2])
+        assert len(notes.daets) == 7
+
+        ts.renameDuplicateDaets()   # in-place edits detach the view from its parent
+        assert not ts.is_view and notes.daets[0].task == '1 (1)'
+
     def test_summary(self, exp_note_setup: Path):
         """Tests the summary dictionary generation."""
         notes = ExpNote(exp_note_setup)
@@ -164,4 +209,81 @@ class TestExpNote:
         assert summary['total_entries'] == 7
         assert summary['void_entries'] == 1
         assert summary['calibration_entries'] == 1
-        assert summary['processable_entries'] == 5
\ No newline at end of file
+        assert summary['processable_entries'] == 5
+
+    def test_indexed_lookups_match_dataframe(self, exp_note_setup: Path):
+        """Tests that the DAET index agrees with a plain DataFrame scan."""
+        notes = ExpNote(exp_note_setup)
+        for daet in notes.daets:
+            row = notes.df[notes.df['daet'] == daet].iloc[0]
+            assert notes.getRow(daet).equals(row)
+            assert notes.is_daet_void(daet) == row['is_void']
+        assert notes.getRow(DAET('20250728', 'Pici', 'nope', '0')) is None
+
+    def test_valid_daets_follow_df_changes(self, exp_note_setup: Path):
+        """Tests that memoized valid DAETs are recomputed for filtered copies."""
+        notes = ExpNote(exp_note_setup)
+        assert notes.getValidDaets() is not notes.getValidDaets()  # callers get copies
+        new_note = notes.dupWithBlackList([notes.daets[0]])
+        assert notes.daets[0] not in new_note.getValidDaets()
+        assert len(new_note.getValidDaets()) == len(notes.getValidDaets()) - 1
+        assert not new_note.hasDaet(notes.daets[0])
+
+    def test_video_index_refresh(self, exp_note_setup: Path):
+        """Tests that cached cam folder listings pick up new files after a refresh."""
+        notes = ExpNote(exp_note_setup)
+        daet = notes.daets[0]
+        assert notes.getVidPath(daet, 2) is None
+        (exp_note_setup / 'cam3' / 'C00003.mp4').touch()
+        (exp_note_setup / 'cam3' / 'C0003.mp4').touch()
+        notes.refreshVideoIndex()
+        assert notes.getVidPath(daet, 2).name == 'C0003.mp4'
+
+    def test_cam_folder_scan_matches_padded_names(self, exp_note_setup: Path):
+        """Clip names are matched like C{n:04d} / C{n:05d}, whatever the number of digits."""
+        cam = exp_note_setup / 'cam1'
+        for name in ('C00012.mp4', 'C123456.mp4', 'C000007.mp4', 'C12345.mp4'):
+            (cam / name).touch()
+        files = ExpNote(exp_note_setup)._scanCamFolder(cam)
+        assert {n: p.name for n, p in files.items()} == {
+            1: 'C0001.mp4', 12: 'C00012.mp4', 12345: 'C12345.mp4', 123456: 'C123456.mp4'}
+
+    def test_single_pass_read_matches_read_excel(self, exp_note_setup: Path):
+        """Tests the openpyxl loader against pandas.read_excel with junk above the header."""
+        import openpyxl
+        notes = ExpNote(exp_note_setup, use_cache=False)
+        xlsx = next(exp_note_setup.glob('*.xlsx'))
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.append(['Junk', None, 3.5])
+        ws.append([])
+        ws.append(['Experiment', 'Task', 'Camera files \n(1 LR)', None, 'VOID'])
+        ws.append(['TS', 1, 1.0, 'x', None])
+        ws.append(['BBT', '2', '-', None, 'T'])
+        ws.append([None, None, None, None, None, 'stray'])
+        wb.save(xlsx)
+
+        expected = pd.read_excel(xlsx, header=None)
+        header_row = expected[expected.apply(
+            lambda r: r.astype(str).str.contains('Experiment', na=False).any(), axis=1)].index[0]
+        expected = pd.read_excel(xlsx, header=header_row)
+        pd.testing.assert_frame_equal(notes._readSheet(xlsx), expected)
+
+    def test_parsed_note_cache(self, exp_note_setup: Path, monkeypatch):
+        """Tests that repeat opens skip Excel parsing until the xlsx changes."""
+        import os
+        first = ExpNote(exp_note_setup)
+        parsed = []
+        real_parse = ExpNote._parseXlsx
+        monkeypatch.setattr(ExpNote, '_parseXlsx', lambda self, p: parsed.append(p) or real_parse(self, p))
+
+        second = ExpNote(exp_note_setup)
+        assert parsed == []
+        assert second.daets == first.daets
+        pd.testing.assert_frame_equal(second.df, first.df)
+
+        xlsx = next(exp_note_setup.glob('*.xlsx'))
+        st = os.stat(xlsx)
+        os.utime(xlsx, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        ExpNote(exp_note_setup)
+        assert len(parsed) == 1
@@ -0,0 +1,54 @@
+import errno
+import pytest
+from pathlib import Path
+
+from ammonkey.core import fileOp
+from ammonkey.core.fileOp import materialize
+
+
+@pytest.fixture
+def src(tmp_path: Path, monkeypatch) -> Path:
+    monkeypatch.setattr(fileOp, '_unsupported', set())
+    f = tmp_path / 'a.h5'
+    f.write_bytes(b'pose' * 100)
+    return f
+
+
+def test_link_first_and_replace_not_write(src: Path, tmp_path: Path):
+    dst = tmp_path / 'out' / 'a.h5'
+    dst.parent.mkdir()
+    assert materialize(src, dst) == 'hardlink'
+    assert dst.stat().st_ino == src.stat().st_ino
+    with pytest.raises(FileExistsError):
+        materialize(src, dst)
+
+    other = tmp_path / 'b.h5'
+    other.write_bytes(b'other')
+    materialize(other, dst, overwrite=True)
+    assert src.read_bytes() == b'pose' * 100 and dst.read_bytes() == b'other'
+
+
+def test_refused_mode_is_remembered(src: Path, tmp_path: Path, monkeypatch):
+    calls = []
+    def refuse(s, d):
+        calls.append(d.name)
+        raise OSError(errno.EXDEV, 'cross-device link')
+    monkeypatch.setitem(fileOp.MATERIALIZERS, 'hardlink', refuse)
+
+    assert materialize(src, tmp_path / 'b.h5', modes=('hardlink', 'copy')) == 'copy'
+    assert materialize(src, tmp_path / 'c.h5', modes=('hardlink', 'copy')) == 'copy'
+    assert calls == ['b.h5']
+    assert (tmp_path / 'c.h5').read_bytes() == src.read_bytes()
+
+    with pytest.raises(FileNotFoundError):
+        materialize(tmp_path / 'missing.h5', tmp_path / 'd.h5')
+
+
+def test_copyH5_only_filtered(tmp_path: Path):
+    from ammonkey.core.dlcCollector import copyH5
+    src, dst = tmp_path / 'sep', tmp_path / 'merged'
+    src.mkdir(); dst.mkdir()
+    for name in ('cam1DLC_x.h5', 'cam1DLC_x_filtered.h5'):
+        (src / name).write_bytes(b'h5')
+    assert copyH5(src, dst) == ['cam1DLC_x_filtered.h5']
+    assert sorted(copyH5(src, dst, filtered_only=False)) == ['cam1DLC_x.h5', 'cam1DLC_x_filtered.h5']
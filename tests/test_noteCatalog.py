@@ -0,0 +1,60 @@
+import pytest
+import pandas as pd
+from pathlib import Path
+
+from ammonkey.core import expNote
+from ammonkey.core.expNote import ExpNote
+from ammonkey.core.noteCatalog import NoteCatalog
+
+DATES = ['20250130', '20250203', '20250228', '20250301', '20260105']
+
+
+@pytest.fixture(autouse=True)
+def isolated_note_cache(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(expNote, 'NOTE_CACHE_DIR', tmp_path / 'note_cache')
+    monkeypatch.setattr(expNote, '_note_cache', None)
+
+
+@pytest.fixture
+def archive(tmp_path: Path) -> Path:
+    """DATA_RAW/Pici with a few dated notes, one date folder without a note."""
+    animal_dir = tmp_path / 'Pici'
+    for date in DATES:
+        day = animal_dir / date[:4] / date[4:6] / date
+        day.mkdir(parents=True)
+        pd.DataFrame({
+            'Experiment': ['TS', 'BBT'],
+            'Task': ['1', '2'],
+            'Camera files \n(1 LR)': [1, 3],
+            'Camera files \n(2 LL)': [2, 4],
+            'Camera files (3 RR)': [1, 3],
+            'Camera files (4 RL)': [2, 4],
+        }).to_excel(day / f'Pici_{date}.xlsx', index=False)
+    (animal_dir / '2025' / '03' / '20250302').mkdir()
+    (animal_dir / '2025' / '03' / 'notes').mkdir()
+    return animal_dir
+
+
+class TestNoteCatalog:
+
+    def test_scan_is_sorted_and_lazy(self, archive: Path):
+        cat = NoteCatalog(archive)
+        assert cat.dates == DATES
+        assert not any(h.loaded for h in cat)
+        note = cat.handles[0].note
+        assert isinstance(note, ExpNote) and note.date == DATES[0]
+        assert cat.handles[0].loaded and not cat.handles[1].loaded
+
+    def test_date_ranges(self, archive: Path):
+        assert NoteCatalog(archive, start='202502', end='2025').dates == DATES[1:4]
+        assert NoteCatalog(archive / '2026').dates == ['20260105']
+        cat = NoteCatalog(archive)
+        assert cat.between('20250201', '20250228').dates == DATES[1:3]
+        assert cat.only({'20250301', '19990101'}).dates == ['20250301']
+
+    def test_iter_notes_in_order(self, archive: Path):
+        cat = NoteCatalog(archive)
+        notes = list(cat.iter_notes(max_workers=3, prefetch=2))
+        assert [n.date for n in notes] == DATES
+        assert not any(h.loaded for h in cat)
+        assert all(len(n.daets) == 2 for n in notes)
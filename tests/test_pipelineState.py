@@ -0,0 +1,151 @@
+import pytest
+import pandas as pd
+from pathlib import Path
+
+from ammonkey.core import expNote, pipelineState
+from ammonkey.core.daet import DAET, Task
+from ammonkey.core.expNote import ExpNote
+from ammonkey.core.pipelineState import PipelineState, Stage, StageRecord, StageStatus
+from ammonkey.core.statusChecker import StatusChecker
+from ammonkey.core.sync import VidSynchronizer
+
+D1 = DAET('20250728', 'Pici', 'TS', '1')
+D2 = DAET('20250728', 'Pici', 'BBT', '2')
+D3 = DAET('20250729', 'Pici', 'TS', '1')
+
+
+@pytest.fixture
+def state(tmp_path: Path, monkeypatch) -> PipelineState:
+    """Fresh db, also served by getState() to the writer/reader hooks."""
+    st = PipelineState(tmp_path / 'state.db')
+    monkeypatch.setattr(pipelineState, '_state', st)
+    monkeypatch.setattr(expNote, 'NOTE_CACHE_DIR', tmp_path / 'note_cache')
+    monkeypatch.setattr(expNote, '_note_cache', None)
+    return st
+
+
+def test_record_roundtrip_and_upsert(state: PipelineState):
+    state.markRunning(D1, Stage.DLC_RUN, 'L/TS-L [1234]', input_hash='abc')
+    running = state.get(D1, Stage.DLC_RUN, 'L/TS-L [1234]')
+    assert running.status == StageStatus.RUNNING and running.finished is None
+
+    state.markDone(D1, Stage.DLC_RUN, 'L/TS-L [1234]', outputs=[Path('a/b.h5')])
+    done = state.get(str(D1), Stage.DLC_RUN, 'L/TS-L [1234]')
+    assert done.done and done.started == running.started and done.finished
+    assert done.input_hash == 'abc' and done.outputs == [str(Path('a/b.h5'))]
+    assert (done.animal, done.date) == ('Pici', '20250728')
+
+    assert state.isDone(D1, Stage.DLC_RUN, 'L/TS-L [1234]', input_hash='abc')
+    assert not state.isDone(D1, Stage.DLC_RUN, 'L/TS-L [1234]', input_hash='changed')
+    assert not state.isDone(D1, Stage.DLC_RUN, 'R/TS-R [1234]')
+
+
+def test_query_filters(state: PipelineState):
+    state.markDone(D1, Stage.SYNC)
+    state.markFailed(D2, Stage.SYNC, message='boom')
+    state.markDone(D3, Stage.SYNC)
+    state.markDone(D1, Stage.DLC, 'TS-LR-20250801_1234')
+    state.markDone(D2, Stage.DLC, 'TS_LR-20250801_1234')    # '_' must not act as a wildcard
+
+    assert state.doneDaets(Stage.SYNC, animal='Pici', date='20250728') == {str(D1)}
+    assert [r.message for r in state.query(stage=Stage.SYNC, status=StageStatus.FAILED)] == ['boom']
+    assert {r.daet for r in state.query(stage=Stage.DLC, model_prefix='TS-LR-')} == {str(D1)}
+    assert state.query(daets=[]) == []
+    assert len(state.query(daets=[D1, D3])) == 3
+
+    assert state.forget(D1, Stage.DLC) == 1
+    assert state.get(D1, Stage.DLC, 'TS-LR-20250801_1234') is None
+
+
+def test_hash_inputs_follows_files(tmp_path: Path):
+    f = tmp_path / 'a.h5'
+    f.write_bytes(b'x')
+    h = pipelineState.hashInputs([f])
+    assert pipelineState.hashInputs([str(f)]) == h
+    f.write_bytes(b'xy')
+    assert pipelineState.hashInputs([f]) != h
+
+
+def test_hooks_never_raise(tmp_path: Path, monkeypatch):
+    class Broken:
+        def record(self, *a, **k):
+            raise RuntimeError('db locked')
+        def query(self, **k):
+            raise RuntimeError('db locked')
+    monkeypatch.setattr(pipelineState, '_state', Broken())
+    pipelineState.recordStage(D1, Stage.SYNC, StageStatus.DONE)
+    assert pipelineState.queryState(stage=Stage.SYNC) is None
+
+
+def make_note(tmp_path: Path) -> ExpNote:
+    session = tmp_path / 'Pici' / '2025' / '07' / '20250728'
+    session.mkdir(parents=True)
+    pd.DataFrame({
+        'Experiment': ['TS', 'BBT'],
+        'Task': ['1', '2'],
+        'Camera files \n(1 LR)': [1, 3],
+        'Camera files \n(2 LL)': [2, 4],
+        'Camera files (3 RR)': [1, 3],
+        'Camera files (4 RL)': [2, 4],
+    }).to_excel(session / 'Pici_20250728.xlsx', index=False)
+    return ExpNote(session)
+
+
+def test_record_under_root_and_missing(tmp_path: Path):
+    out = tmp_path / 'data' / 'a.mp4'
+    out.parent.mkdir()
+    out.touch()
+    rec = StageRecord(str(D1), Stage.SYNC, '', 'Pici', '20250728', StageStatus.DONE,
+                      None, None, None, [str(out)], None, None)
+    assert rec.under(tmp_path / 'data') and not rec.under(tmp_path / 'other')
+    assert rec.missing() == []
+    out.unlink()
+    assert rec.missing() == [str(out)]
+    assert not StageRecord(str(D1), Stage.SYNC, '', 'Pici', '20250728', StageStatus.DONE,
+                           None, None, None, [], None, None).under(tmp_path)
+
+
+def test_status_checker_checks_recorded_stages_against_files(tmp_path: Path, state: PipelineState):
+    note = make_note(tmp_path)
+    video = note.sync_path / str(D1) / 'L' / f'{D1}-cam1.mp4'
+    merged = note.getDaetDlcRoot(D1) / 'TS-LR-20250801_1234'
+    csv = note.getAniRoot() / 'TS-LR-20250801_1234' / str(D1) / 'pose-3d' / f'{D1}.csv'
+    for d in (video.parent, merged, csv.parent):
+        d.mkdir(parents=True)
+    video.touch()
+    csv.touch()
+
+    state.markDone(D1, Stage.SYNC, outputs=[video])
+    state.markDone(D1, Stage.DLC, 'TS-LR-20250801_1234', outputs=[merged])
+    state.markDone(D1, Stage.ANIPOSE, 'TS-LR-20250801_1234', outputs=[csv])
+    state.markDone(D2, Stage.SYNC, outputs=[tmp_path / 'elsewhere' / f'{D2}-cam1.mp4'])
+
+    sc = StatusChecker(note)
+    assert sc.check_sync_single_daet(D1) == (True, '--')
+    assert sc.check_sync_single_daet(D2)[0] is False        # row of another data root
+    assert sc.check_dlc_single_daet(D1) == (True, 'TS-LR-20250801_1234')
+    assert sc.check_ani_single_daet(D1) == (True, 'TS-LR-20250801_1234')
+    assert sc.check_ani_single_daet(D2)[0] is False
+    assert StatusChecker(note, use_state=False).check_sync_single_daet(D1)[0] is False
+
+    video.unlink()      # synced videos deleted, the done row stays
+    sc.refresh()
+    assert sc.check_sync_single_daet(D1)[0] is False
+
+
+def test_sync_skips_follow_markers(tmp_path: Path, state: PipelineState):
+    note = make_note(tmp_path)
+    vs = VidSynchronizer(note)
+    config = note.getDaetSyncRoot(D1) / 'sync_config_TS_1.json'
+    config.parent.mkdir(parents=True)
+    config.touch()
+    state.markDone(D1, Stage.SYNC_DETECT, outputs=[config])
+    state.markDone(D2, Stage.SYNC_DETECT, outputs=[tmp_path / 'x.json'])
+
+    # done rows alone skip nothing, the marker has to be there
+    assert vs._getTargetDaets(Task.ALL, True, daets=[D1, D2]) == [D1, D2]
+    (config.parent / '.skipDet').touch()
+    assert vs._getTargetDaets(Task.ALL, True, daets=[D1, D2]) == [D2]
+
+    config.unlink()     # marker kept but the recorded output is gone
+    assert vs._getTargetDaets(Task.ALL, True, daets=[D1, D2]) == [D1, D2]
@@ -0,0 +1,90 @@
+import os
+import pytest
+import pandas as pd
+from pathlib import Path
+
+from ammonkey.core import expNote, pipelineState
+from ammonkey.core.daet import DAET
+from ammonkey.core.expNote import ExpNote
+from ammonkey.core.statusChecker import StatusChecker
+
+TS = DAET('20250728', 'Pici', 'TS', '1')
+BBT = DAET('20250728', 'Pici', 'BBT', '2')
+MS = 'TS-LR-20250801_1234'
+
+
+@pytest.fixture
+def note(tmp_path: Path, monkeypatch) -> ExpNote:
+    """A day with TS fully processed and BBT only half synced, no state db."""
+    monkeypatch.setattr(expNote, 'NOTE_CACHE_DIR', tmp_path / 'note_cache')
+    monkeypatch.setattr(expNote, '_note_cache', None)
+    monkeypatch.setattr(pipelineState, 'STATE_ENABLED', False)
+
+    session = tmp_path / 'Pici' / '2025' / '07' / '20250728'
+    session.mkdir(parents=True)
+    pd.DataFrame({
+        'Experiment': ['TS', 'BBT'],
+        'Task': ['1', '2'],
+        'Camera files \n(1 LR)': [1, 3],
+        'Camera files \n(2 LL)': [2, 4],
+        'Camera files (3 RR)': [1, 3],
+        'Camera files (4 RL)': [2, 4],
+    }).to_excel(session / 'Pici_20250728.xlsx', index=False)
+    n = ExpNote(session)
+
+    all_groups = sorted(n.cam_config.evolved_groups, key=lambda g: g.value)
+    for daet, groups in ((TS, all_groups), (BBT, all_groups[:1])):
+        for g in groups:
+            d = n.getDaetSyncRoot(daet) / g.value
+            d.mkdir(parents=True)
+            for cam in n.cam_config.cams:
+                if cam.group == g:
+                    (d / f'{daet}-{cam.name}.mp4').touch()
+    (n.getDaetDlcRoot(TS) / MS).mkdir(parents=True)
+    (n.getDaetDlcRoot(TS) / 'separate').mkdir()
+    ani = n.getAniRoot() / MS / str(TS)
+    (ani / 'pose-3d').mkdir(parents=True)
+    (ani / 'pose-3d' / f'{TS}.csv').touch()
+    (ani / 'videos-combined').mkdir()
+    (ani / 'videos-combined' / f'{TS}.mp4').touch()
+    return n
+
+
+def test_checks_from_tree(note: ExpNote):
+    sc = StatusChecker(note)
+    assert sc.check_sync_single_daet(TS) == (True, '--')
+    stat, text = sc.check_sync_single_daet(BBT)
+    assert not stat and 'Sync dir missing' in text
+    assert sc.check_dlc_single_daet(TS) == (True, MS)
+    assert sc.check_dlc_single_daet(BBT)[0] is False
+    assert sc.check_ani_single_daet(TS) == (True, MS)
+    assert sc.check_ani_vid_combined_single_daet_single_ms(TS, MS) == (True, f'{TS}.mp4')
+    assert sc.check_ani_vid_3d_single_daet_single_ms(TS, MS) == (False, 'No videos-3d dir')
+    assert sc.check_ani_vid_combined_simple_all_ms() == {MS: True}
+
+
+def test_refresh_relists_only_changed_dirs(note: ExpNote):
+    sc = StatusChecker(note)
+    assert sc.sync_tree.refresh() == 0
+    assert sc.ani_tree.refresh() == 0
+
+    missing = next(d for d in note.getDaetSyncVidDirs(BBT) if not d.exists())
+    missing.mkdir()
+    for cam in note.cam_config.cams:
+        if cam.group.value == missing.name:
+            (missing / f'{BBT}-{cam.name}.mp4').touch()
+    st = os.stat(missing)
+    os.utime(missing, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))   # coarse mtime filesystems
+
+    assert sc.check_sync_single_daet(BBT)[0] is False
+    sc.refresh()
+    assert sc.sync_tree.listed == 2     # the BBT daet dir and its new group dir
+    assert sc.check_sync_single_daet(BBT) == (True, '--')
+
+
+def test_missing_roots(tmp_path: Path, note: ExpNote):
+    import shutil
+    shutil.rmtree(note.getAniRoot())
+    sc = StatusChecker(note)
+    assert sc.ani_msn == {}
+    assert sc.check_ani_single_daet(TS) == (False, 'Empty anipose root dir')
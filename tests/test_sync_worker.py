@@ -0,0 +1,151 @@
+import pytest
+from pathlib import Path
+
+from ammonkey.core import sync_worker
+from ammonkey.core.config import Config
+
+
+@pytest.fixture(autouse=True)
+def tools(monkeypatch):
+    monkeypatch.setattr(Config, 'ffmpeg_path', 'ffmpeg')
+    monkeypatch.setattr(Config, 'ffprobe_path', 'ffprobe')
+
+
+def test_build_cmd_argv():
+    assert sync_worker._build_cmd('in.mp4', 'out.mp4', 1.5, 300, (1920, 1080), gpu=True) == [
+        'ffmpeg', '-y', '-i', 'in.mp4', '-ss', '1.500000', '-frames:v', '300',
+        '-vf', 'hwupload_cuda,scale_cuda=1920:1080',
+        '-c:v', 'h264_nvenc', '-preset', 'fast', '-movflags', '+faststart', '-b:v', '5M',
+        'out.mp4',
+    ]
+    cpu = sync_worker._build_cmd('in.mp4', 'out.mp4', 0, 300, (1280, 720), gpu=False)
+    assert cpu[cpu.index('-vf') + 1] == 'scale=1280:720'
+    assert cpu[cpu.index('-c:v') + 1] == 'libx264' and '-an' not in cpu
+
+    # an override picks the codec, and with it the filter, whatever the gpu hint
+    over = sync_worker._build_cmd('in.mp4', 'out.mp4', 0, 300, (1280, 720), gpu=False,
+                                  quality_override=['-c:v', 'hevc_nvenc', '-cq', '19'])
+    assert over[over.index('-vf') + 1].startswith('hwupload_cuda')
+    assert over[over.index('-cq'):-1] == ['-cq', '19', '-movflags', '+faststart']
+    with pytest.raises(ValueError):
+        sync_worker._build_cmd('in.mp4', 'out.mp4', 0, 300, (1280, 720), gpu=False,
+                               quality_override=['-c:v', 'libx264', '-vf', 'evil'])
+
+
+def test_build_copy_cmd_argv():
+    assert sync_worker._build_copy_cmd('in.mp4', 'out.mp4', 2.0, 300) == [
+        'ffmpeg', '-y', '-ss', '2.000100', '-i', 'in.mp4',
+        '-map', '0:v:0', '-map', '0:a?', '-frames:v', '300', '-c', 'copy',
+        '-avoid_negative_ts', 'make_zero', '-movflags', '+faststart', 'out.mp4',
+    ]
+
+
+def test_build_multi_cmd_argv():
+    jobs = [{'input_path': 'a.mp4', 'output_path': 'L/a.mp4', 'start_frame': 10, 'fps': 119.88},
+            {'input_path': 'b.mp4', 'output_path': 'R/b.mp4', 'start_frame': 0, 'fps': 119.88}]
+    cmd = sync_worker._build_multi_cmd(jobs, 300, (1920, 1080), gpu=False)
+    assert cmd[:7] == ['ffmpeg', '-y', '-nostdin', '-i', 'a.mp4', '-i', 'b.mp4']
+    assert cmd[cmd.index('-filter_complex') + 1] == (
+        '[0:v]trim=start_frame=10:end_frame=310,setpts=PTS-STARTPTS,scale=1920:1080[v0];'
+        '[1:v]trim=start_frame=0:end_frame=300,setpts=PTS-STARTPTS,scale=1920:1080[v1]')
+    enc = ['-c:v', 'libx264', '-preset', 'fast', '-movflags', '+faststart', '-crf', '18']
+    tail = cmd[cmd.index('-filter_complex') + 2:]
+    assert tail == [
+        '-map', '[v0]', '-r', '119.880000',
+        '-map', '0:a?', '-af', 'atrim=start=0.083417:duration=2.502503,asetpts=PTS-STARTPTS', *enc, 'L/a.mp4',
+        '-map', '[v1]', '-r', '119.880000',
+        '-map', '1:a?', '-af', 'atrim=start=0.000000:duration=2.502503,asetpts=PTS-STARTPTS', *enc, 'R/b.mp4',
+    ]
+
+
+def concurrent_jobs(tmp_path: Path, override=None) -> list[dict]:
+    return [dict(input_path=f'{c}.mp4', output_path=str(tmp_path / f'{c}.mp4'), start_time=0.0,
+                 output_frames=10, output_size=(1920, 1080), quality_override=override)
+            for c in ('cam1', 'cam2')]
+
+
+def test_concurrent_without_nvenc_stays_on_cpu(tmp_path: Path, monkeypatch):
+    cmds = []
+    def fake_run(cmd, tag, on_start=None):
+        cmds.append(cmd)
+        Path(cmd[-1]).touch()
+    monkeypatch.setattr(sync_worker, '_run_logged', fake_run)
+
+    sync_worker._encode_concurrent(concurrent_jobs(tmp_path), max_nvenc=0, max_cpu=2)
+    assert len(cmds) == 2 and all(c[c.index('-c:v') + 1] == 'libx264' for c in cmds)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['cam1.mp4', 'cam2.mp4']
+
+    with pytest.raises(ValueError, match='max_nvenc'):
+        sync_worker._encode_concurrent(concurrent_jobs(tmp_path, ['-c:v', 'h264_nvenc']),
+                                       max_nvenc=0, max_cpu=2)
+
+
+def test_multi_without_nvenc_goes_straight_to_cpu(tmp_path: Path, monkeypatch):
+    cmds = []
+    def fake_run(cmd, tag, on_start=None):
+        cmds.append(cmd)
+        for arg in cmd:
+            if arg.endswith('.partial.mp4'):
+                Path(arg).touch()
+    monkeypatch.setattr(sync_worker, '_run_logged', fake_run)
+    jobs = [{**j, 'start_frame': 0, 'fps': 120.0} for j in concurrent_jobs(tmp_path)]
+
+    sync_worker._encode_multi(jobs, 10, (1920, 1080), None, max_nvenc=0)
+    assert len(cmds) == 1 and 'h264_nvenc' not in cmds[0]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['cam1.mp4', 'cam2.mp4']
+
+    with pytest.raises(ValueError, match='max_nvenc'):
+        sync_worker._encode_multi(jobs, 10, (1920, 1080), ['-c:v', 'h264_nvenc'], max_nvenc=0)
+
+
+def probe_json(start_time: str, packets: list[tuple[str, str]]) -> bytes:
+    import json
+    return json.dumps({
+        'streams': [{'width': 1920, 'height': 1080, 'start_time': start_time}],
+        'packets': [{'pts_time': t, 'flags': f} for t, f in packets],
+    }).encode()
+
+
+def test_probe_keyframe_relative_to_stream_start(monkeypatch):
+    # stream starts at 0.5 s: frame 120 @ 120 fps is pts 1.5, a keyframe; frame 121 is not
+    out = probe_json('0.500000', [('1.491667', '__'), ('1.500000', 'K_'), ('1.508333', '__')])
+    cmds = []
+    def fake_check_output(cmd):
+        cmds.append(cmd)
+        return out
+    monkeypatch.setattr(sync_worker.subprocess, 'check_output', fake_check_output)
+
+    assert sync_worker._probe_keyframe('in.mp4', 120, 120.0) == ((1920, 1080), pytest.approx(1.0))
+    assert cmds[0][cmds[0].index('-read_intervals') + 1] == '0.000000%+2'
+    assert sync_worker._probe_keyframe('in.mp4', 121, 120.0) == ((1920, 1080), None)
+    # without the start_time offset, pts 1.5 would have matched frame 180
+    assert sync_worker._probe_keyframe('in.mp4', 180, 120.0)[1] is None
+
+    # no start_time from ffprobe counts as 0, packets without pts are skipped
+    out = probe_json('N/A', [('N/A', 'K_'), ('0.250000', 'K_')])
+    assert sync_worker._probe_keyframe('in.mp4', 30, 120.0)[1] == pytest.approx(0.25)
+
+
+def test_stream_copy_falls_back_and_cleans_up(tmp_path: Path, monkeypatch):
+    out = tmp_path / 'cam1.partial.mp4'
+    runs = []
+    def fake_run(cmd, **kwargs):
+        runs.append(cmd)
+        out.write_bytes(b'copied')
+    monkeypatch.setattr(sync_worker.subprocess, 'run', fake_run)
+    monkeypatch.setattr(sync_worker, '_probe_keyframe', lambda path, start, fps: ((1920, 1080), 1.0))
+
+    monkeypatch.setattr(sync_worker, 'get_video_info', lambda path, use_cache=True: (299, 120.0))
+    assert not sync_worker._try_stream_copy('in.mp4', out, 120, 120.0, 300, (1920, 1080))
+    assert runs and not out.exists()        # wrong frame count: output removed
+
+    monkeypatch.setattr(sync_worker, 'get_video_info', lambda path, use_cache=True: (300, 120.0))
+    assert sync_worker._try_stream_copy('in.mp4', out, 120, 120.0, 300, (1920, 1080))
+    assert out.read_bytes() == b'copied'
+    assert runs[-1] == sync_worker._build_copy_cmd('in.mp4', str(out), 1.0, 300)
+
+    runs.clear()
+    assert not sync_worker._try_stream_copy('in.mp4', out, 120, 120.0, 300, (1280, 720))
+    monkeypatch.setattr(sync_worker, '_probe_keyframe', lambda path, start, fps: ((1920, 1080), None))
+    assert not sync_worker._try_stream_copy('in.mp4', out, 121, 120.0, 300, (1920, 1080))
+    assert runs == []                       # resize or no keyframe: never copied
@@ -0,0 +1,60 @@
+import os
+
+import pytest
+
+from ammonkey.utils import vid_meta
+
+PROBE_JSON = {
+    'streams': [
+        {'codec_type': 'video', 'codec_name': 'h264', 'nb_frames': '1200',
+         'r_frame_rate': '120000/1001', 'width': 1920, 'height': 1080},
+        {'codec_type': 'audio', 'codec_name': 'aac', 'sample_rate': '48000'},
+    ],
+    'format': {'duration': '10.010000'},
+}
+
+
+@pytest.fixture
+def probes(tmp_path, monkeypatch):
+    """Fresh cache dir, ffprobe replaced by a call recorder."""
+    monkeypatch.setattr(vid_meta, 'CACHE_DIR', tmp_path / 'cache')
+    monkeypatch.setattr(vid_meta, '_cache', None)
+    calls = []
+
+    def fake_run(path, ffprobe):
+        calls.append(path)
+        return PROBE_JSON
+    monkeypatch.setattr(vid_meta, '_run_ffprobe', fake_run)
+    return calls
+
+
+def test_probe_parses_and_caches(tmp_path, probes):
+    vid = tmp_path / 'a.mp4'
+    vid.write_bytes(b'x')
+    meta = vid_meta.probe(vid)
+    assert (meta.frames, meta.width, meta.height, meta.codec) == (1200, 1920, 1080, 'h264')
+    assert meta.fps == 120000 / 1001
+    assert meta.has_audio and meta.audio_rate == 48000
+    assert vid_meta.probe(vid) == meta
+    assert len(probes) == 1
+
+
+def test_changed_file_is_reprobed(tmp_path, probes):
+    vid = tmp_path / 'a.mp4'
+    vid.write_bytes(b'x')
+    vid_meta.probe(vid)
+    vid.write_bytes(b'xy')
+    st = os.stat(vid)
+    os.utime(vid, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    vid_meta.probe(vid)
+    assert len(probes) == 2
+
+
+def test_probe_many_keeps_order_and_errors(tmp_path, probes):
+    paths = [tmp_path / f'{i}.mp4' for i in range(5)]
+    for p in paths[:4]:
+        p.write_bytes(b'x')
+    out = vid_meta.probe_many(paths)
+    assert list(out) == [str(p) for p in paths]
+    assert all(isinstance(m, vid_meta.VidMeta) for m in list(out.values())[:4])
+    assert isinstance(out[str(paths[4])], RuntimeError)
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from ammonkey.utils import vid_sync_aud_new as vsa
+
+SR = 24000
+
+
+def clicks(n_sec=4.0, seed=0):
+    """Sparse click train over light noise."""
+    rng = np.random.default_rng(seed)
+    n = int(n_sec * SR)
+    sig = rng.normal(0, 0.01, n)
+    for pos in rng.choice(np.arange(1000, n - 1000), 12, replace=False):
+        sig[pos:pos + 200] += rng.normal(0, 0.8, 200) * np.hanning(200)
+    return sig.astype(np.float32)
+
+
+@pytest.mark.parametrize('feat', sorted(vsa._FEATURES))
+def test_cache_matches_direct_features(feat):
+    audio = clicks()
+    cache = vsa.FeatureCache(audio, SR)
+    direct = vsa._FEATURES[feat](audio, SR, vsa.DEFAULT_HOP)
+    np.testing.assert_array_equal(cache.get(feat), direct)
+    assert cache.get(feat) is cache.get(feat)
+
+
+def test_cached_reference_gives_same_offset():
+    base = clicks(seed=1)
+    ref, tgt = base[1600:], base[:-1600]
+    plain = vsa.find_best_sync_offset(ref, tgt, SR, fps=100)
+    cached = vsa.find_best_sync_offset(vsa.FeatureCache(ref, SR), tgt, SR, fps=100)
+    assert plain == cached
+
+
+@pytest.mark.parametrize('n_ref,n_tgt,max_lag', [(5000, 5000, 300), (4000, 5200, 50), (900, 700, 2000)])
+def test_bounded_xcorr_matches_full_window(n_ref, n_tgt, max_lag):
+    rng = np.random.default_rng(n_ref)
+    ref, tgt = rng.random(n_ref), rng.random(n_tgt)
+    full = vsa._match_xcorr_norm(ref, tgt)
+    zero = n_ref - 1
+    bounded = vsa._match_xcorr_bounded(ref, tgt, max_lag)
+    for k in range(-max_lag, max_lag + 1):
+        i = zero + k
+        expect = full[i] if 0 <= i < len(full) else 0.0
+        assert bounded[k + max_lag] == pytest.approx(expect, abs=1e-6)
+
+
+@pytest.mark.parametrize('coarse', [1, 4])
+def test_bounded_offset_matches_full(coarse, monkeypatch):
+    monkeypatch.setattr(vsa, 'COARSE_FACTOR', coarse)
+    base = clicks(seed=1)
+    ref, tgt = base[1600:], base[:-1600]
+    full = vsa.find_best_sync_offset(ref, tgt, SR, fps=100)
+    bounded = vsa.find_best_sync_offset(ref, tgt, SR, fps=100, max_lag_sec=1.0)
+    assert full[0] == bounded[0]
@@ -0,0 +1,161 @@
+import numpy as np
+import pytest
+
+from ammonkey.utils.VidSyncLED import (
+    HSV_RANGES, roi_brightness, scan_led_onset, _persistence_frames,
+)
+
+
+def loop_reference(max_values, threshold, min_frames, max_frames, tol, tolerance_frames):
+    """Detection part of the per-frame loop in find_start_frame, replayed over a trace."""
+    max_values = list(max_values)
+    consecutive_count = 0
+    potential_start = None
+    head = False
+    for frame_count, current_max in enumerate(max_values):
+        if current_max >= threshold:
+            if consecutive_count == 0:
+                potential_start = frame_count
+            consecutive_count += 1
+            if consecutive_count >= min_frames:
+                window_size = min(consecutive_count, max_frames)
+                start_idx = frame_count - window_size + 1
+                frames_below = sum(1 for i in range(start_idx, frame_count + 1)
+                                   if max_values[i] < threshold)
+                if frames_below <= int(window_size * tol):
+                    if potential_start == 0:
+                        head = True
+                    elif not head:
+                        return potential_start
+        else:
+            if consecutive_count > 0:
+                window_start = max(0, potential_start) if potential_start else 0
+                current_frames_below = sum(1 for i in range(window_start, frame_count + 1)
+                                           if max_values[i] < threshold)
+                tolerance_check = min(tolerance_frames, int(consecutive_count * tol))
+                if current_frames_below > tolerance_check:
+                    consecutive_count = 0
+                    potential_start = None
+            if head:
+                head = False
+    return None
+
+
+@pytest.mark.parametrize("tol, duration_range", [
+    (0.0, (1.0, 1.0)),
+    (0.0, (1.0, 3.0)),
+    (0.2, (1.0, 1.0)),
+    (0.5, (1.0, 2.0)),
+])
+def test_scan_matches_frame_loop(tol, duration_range):
+    """The vectorized scan must agree with the legacy loop on noisy traces."""
+    rng = np.random.default_rng(0)
+    min_frames, max_frames, tolerance_frames = _persistence_frames(119.88, 0.033, tol, duration_range)
+    for _ in range(300):
+        p_lit = rng.uniform(0.05, 0.8)
+        trace = np.where(rng.random(rng.integers(1, 200)) < p_lit, 220, 100).astype(np.uint8)
+        if rng.random() < 0.3:
+            trace[:rng.integers(1, 10)] = 220   # LED already on at the head
+        expected = loop_reference(trace, 175, min_frames, max_frames, tol, tolerance_frames)
+        assert scan_led_onset(trace, 175, min_frames, max_frames, tol, tolerance_frames) == expected
+
+
+def test_scan_skips_head_run():
+    trace = np.array([200] * 5 + [0] * 3 + [200] * 5, dtype=np.uint8)
+    assert scan_led_onset(trace, 175, 3, 4) == 8
+    assert scan_led_onset(np.zeros(10, dtype=np.uint8), 175, 3, 4) is None
+
+
+def test_roi_brightness_matches_per_frame():
+    cv2 = pytest.importorskip('cv2')
+    rng = np.random.default_rng(1)
+    block = rng.integers(0, 256, size=(7, 9, 11, 3), dtype=np.uint8)
+    lower, upper = (np.array(b, dtype=np.uint8) for b in HSV_RANGES['G'])
+    expected = []
+    for frame in block:
+        hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+        mask = cv2.inRange(hsv, lower, upper)
+        expected.append(np.max(cv2.bitwise_and(hsv[:, :, 2], hsv[:, :, 2], mask=mask)))
+    assert roi_brightness(block, lower, upper).tolist() == expected
+
+
+def test_scan_keeps_decoded_onset_frame(monkeypatch, tmp_path):
+    from ammonkey.utils import VidSyncLED
+    frames = np.zeros((20, 10, 10, 3), dtype=np.uint8)
+    frames[:, 2:6, 2:6, 0] = np.arange(20, dtype=np.uint8)[:, None, None]   # tag each frame
+    frames[7:, 2:6, 2:6, 1] = 255                                           # green LED from frame 7
+
+    class FakeProc:
+        def __init__(self, cmd, **kwargs):
+            import io
+            self.stdout = io.BytesIO(frames.tobytes())
+        def poll(self):
+            return 0
+        def communicate(self):
+            return b'', b''
+
+    monkeypatch.setattr(VidSyncLED, 'LED_BATCH', 4)     # onset confirmed a batch after it started
+    monkeypatch.setattr(VidSyncLED.subprocess, 'Popen', FakeProc)
+    monkeypatch.setattr(VidSyncLED, 'get_video_info', lambda path: (20, 120.0))
+    monkeypatch.setattr(VidSyncLED, 'get_video_geometry', lambda path: (10, 10))
+
+    start, trace, onset = VidSyncLED.scan_start_frame_ffpipe('cam1.mp4', [2, 2, 4, 4], 175, 'G')
+    assert start == 7 and trace.size == 12
+    assert np.array_equal(onset, frames[7, 2:6, 2:6])
+
+    VidSyncLED.save_detection_result('missing/cam1.mp4', (2, 2, 4, 4), 175, 'G', trace, start,
+                                     str(tmp_path), onset)
+    assert {p.name for p in tmp_path.iterdir()} == {'detection_result_cam1_8.jpg', 'brightness_plot_cam1_8.jpg'}
+
+
+ROI = [24, 16, 16, 16]
+LIT_FROM = 17
+
+
+@pytest.fixture
+def lit_clip(tmp_path):
+    """40 dark frames at 120 fps, green LED in ROI from frame LIT_FROM on."""
+    cv2 = pytest.importorskip('cv2')
+    path = tmp_path / 'cam1.mp4'
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), 120.0, (64, 48))
+    if not writer.isOpened():
+        pytest.skip('no mp4 writer in this cv2 build')
+    for i in range(40):
+        frame = np.full((48, 64, 3), 30, dtype=np.uint8)
+        if i >= LIT_FROM:
+            frame[16:32, 24:40] = (0, 255, 0)
+        writer.write(frame)
+    writer.release()
+    return path
+
+
+def test_pool_job_runs_cv2_scan(lit_clip, monkeypatch, tmp_path):
+    from ammonkey.utils import VidSyncLED
+    monkeypatch.setattr(VidSyncLED, 'get_video_info', lambda path: (40, 120.0))
+    monkeypatch.setattr(VidSyncLED, 'ffmpeg_path', VidSyncLED.ffmpeg_path)
+    monkeypatch.setattr(VidSyncLED, 'ffprobe_path', VidSyncLED.ffprobe_path)
+
+    start, trace, onset = VidSyncLED.led_pool_job('ffmpeg', 'ffprobe', 'cv2', str(lit_clip), ROI, 175, 'G')
+    assert start == LIT_FROM and trace.size == LIT_FROM + 3    # 0.033 s @ 120 fps = 3 lit frames
+    assert onset.shape == (16, 16, 3) and onset[..., 1].min() > 200
+
+    out = tmp_path / 'out'
+    out.mkdir()
+    assert VidSyncLED.find_start_frame(str(lit_clip), ROI, 175, 'G', str(out)) == LIT_FROM + 1
+    assert {p.name for p in out.iterdir()} == {'detection_result_cam1_18.jpg', 'brightness_plot_cam1_18.jpg'}
+
+
+def test_engines_agree_on_encoded_clip(lit_clip, monkeypatch):
+    """cv2 and ffpipe decode the same mp4 and must report the same start frame."""
+    import shutil
+    from ammonkey.utils import VidSyncLED
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        pytest.skip('ffmpeg not on PATH')
+    monkeypatch.setattr(VidSyncLED, 'ffmpeg_path', ffmpeg)
+    monkeypatch.setattr(VidSyncLED, 'get_video_info', lambda path: (40, 120.0))
+    monkeypatch.setattr(VidSyncLED, 'get_video_geometry', lambda path: (64, 48))
+
+    starts = {name: VidSyncLED.LED_ENGINES[name](str(lit_clip), ROI, 175, 'G', save_detection=False)
+              for name in ('cv2', 'ffpipe')}
+    assert starts == {'cv2': LIT_FROM + 1, 'ffpipe': LIT_FROM + 1}